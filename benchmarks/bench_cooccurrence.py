@@ -0,0 +1,89 @@
+"""
+Compare the dict of dicts of sparql_calls.query_cpt_cooc_scores with
+CooccurrenceMatrix on random cooccurrence scores, and the load times of
+the .npz and the memory-mapped packed files.
+
+Usage:
+    python benchmarks/bench_cooccurrence.py [n_pairs] [n_queries]
+"""
+import random
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+from pp_api.cooccurrence import CooccurrenceMatrix
+
+
+def allocated(func):
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size / 2 ** 20
+
+
+def timed(label, func):
+    start = perf_counter()
+    result = func()
+    print('{:<32} {:10.1f} ms'.format(label, (perf_counter() - start) * 1000))
+    return result
+
+
+def main(n_pairs=1000000, n_queries=100000):
+    n_uris = max(10, n_pairs // 20)
+    uris = ['http://example.org/concept/{}'.format(i) for i in range(n_uris)]
+    rng = np.random.default_rng(0)
+    rows = rng.integers(n_uris, size=n_pairs)
+    cols = rng.integers(n_uris, size=n_pairs)
+    scores = rng.random(n_pairs)
+
+    def build_dict():
+        dist_mx = dict()
+        for i, j, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+            dist_mx.setdefault(uris[i], {})[uris[j]] = score
+            dist_mx.setdefault(uris[j], {})[uris[i]] = score
+        return dist_mx
+
+    dist_mx = timed('build dict of dicts', build_dict)
+    cooc = timed('build CooccurrenceMatrix',
+                 lambda: CooccurrenceMatrix.from_arrays(rows, cols, scores, uris))
+    # The uri strings are shared by both and not counted
+    print('{:<32} {:10.1f} MB'.format('memory of dict of dicts',
+                                      allocated(build_dict)[1]))
+    print('{:<32} {:10.1f} MB'.format(
+        'memory of matrix arrays',
+        (cooc.indptr.nbytes + cooc.indices.nbytes + cooc.data.nbytes) / 2 ** 20))
+
+    rnd = random.Random(0)
+    q1 = [uris[rnd.randrange(n_uris)] for _ in range(n_queries)]
+    q2 = [uris[rnd.randrange(n_uris)] for _ in range(n_queries)]
+    expected = timed('dict lookups', lambda: [
+        dist_mx.get(a, {}).get(b, 0.) for a, b in zip(q1, q2)])
+    ids1, ids2 = cooc.ids(q1), cooc.ids(q2)
+    result = timed('scores_by_id (batch)', lambda: cooc.scores_by_id(ids1, ids2))
+    assert np.allclose(expected, result)
+    timed('neighbours (k=10) x 1000', lambda: [cooc.neighbours(uri) for uri in q1[:1000]])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        npz_path = os.path.join(tmp_dir, 'cooc.npz')
+        packed_path = os.path.join(tmp_dir, 'cooc.pack')
+        timed('save .npz', lambda: cooc.save(npz_path))
+        timed('save packed', lambda: cooc.save_packed(packed_path))
+        timed('load .npz', lambda: CooccurrenceMatrix.load(npz_path))
+        packed = timed('load packed (mmap)',
+                       lambda: CooccurrenceMatrix.load_packed(packed_path))
+        print('{:<32} {:10.1f} MB'.format(
+            'memory of packed load', allocated(
+                lambda: CooccurrenceMatrix.load_packed(packed_path))[1]))
+        result = timed('ids + scores_by_id (packed)', lambda: packed.scores_by_id(
+            packed.ids(q1), packed.ids(q2)))
+        assert np.allclose(expected, result)
+        del packed
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,85 @@
+"""
+Compare the in-process LocalExtractor with the PoolParty extractor API.
+
+Usage:
+    python benchmarks/bench_local_extractor.py [n_repeats]
+
+With `server`, `pp_user`, `pp_password` and `chebi_pid` configured (as for
+the tests), the project is exported and both paths annotate the test
+documents. Otherwise only the local extractor is timed, on a synthetic
+thesaurus.
+"""
+import random
+import string
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import rdflib
+from decouple import config, UndefinedValueError
+from rdflib.namespace import RDF, SKOS
+
+from pp_api import PoolParty
+from pp_api.local_extractor import LocalExtractor
+
+
+DATA_DIR = Path(__file__).parent.parent / 'pp_api' / 'tests' / 'data'
+
+
+def synthetic_graph(n_concepts=20000, seed=0):
+    rnd = random.Random(seed)
+    graph = rdflib.Graph()
+    words = [''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 9)))
+             for _ in range(n_concepts)]
+    for i, word in enumerate(words):
+        cpt = rdflib.URIRef('http://example.org/cpt/{}'.format(i))
+        graph.add((cpt, RDF.type, SKOS.Concept))
+        graph.add((cpt, SKOS.prefLabel, rdflib.Literal(word, lang='en')))
+        graph.add((cpt, SKOS.altLabel,
+                   rdflib.Literal(word + ' ' + rnd.choice(words), lang='en')))
+        if i:
+            parent = rdflib.URIRef('http://example.org/cpt/{}'.format(rnd.randrange(i)))
+            graph.add((cpt, SKOS.broader, parent))
+    text = ' '.join(rnd.choice(words) for _ in range(50000))
+    return graph, [text]
+
+
+def timed(func, texts, n_repeats):
+    start = perf_counter()
+    for _ in range(n_repeats):
+        for text in texts:
+            func(text)
+    return (perf_counter() - start) / (n_repeats * len(texts))
+
+
+def main(n_repeats=5):
+    texts = [p.read_text() for p in sorted(DATA_DIR.glob('question_*.txt'))]
+    try:
+        pp = PoolParty(server=config('server'),
+                       auth_data=(config('pp_user'), config('pp_password')))
+        pid = config('chebi_pid')
+    except UndefinedValueError:
+        pp = None
+
+    start = perf_counter()
+    if pp is not None:
+        extractor = LocalExtractor.from_pp(pp, pid)
+    else:
+        graph, texts = synthetic_graph()
+        extractor = LocalExtractor(graph)
+        del graph
+    extractor.extract('warm up')
+    print('build: {:.2f} s'.format(perf_counter() - start))
+
+    local = timed(extractor.extract, texts, n_repeats)
+    print('local: {:.2f} ms per document'.format(local * 1000))
+    if pp is not None:
+        def http(text):
+            return pp.get_cpts_from_response(pp.extract(text, pid))
+        remote = timed(http, texts, n_repeats)
+        print('http:  {:.2f} ms per document ({:.1f}x)'.format(
+            remote * 1000, remote / local))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
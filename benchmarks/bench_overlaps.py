@@ -0,0 +1,52 @@
+"""
+Compare extractor_utils.remove_overlaps with resolve_overlaps and its
+streaming variant on many random spans.
+
+Usage:
+    python benchmarks/bench_overlaps.py [n_spans] [n_repeats]
+"""
+import random
+import sys
+from time import perf_counter
+
+from pp_api.extractor_utils import (
+    remove_overlaps, resolve_overlaps, iter_resolve_overlaps
+)
+
+
+def random_matches(n, seed=0):
+    rnd = random.Random(seed)
+    matches = []
+    for _ in range(n):
+        start = rnd.randrange(n * 10)
+        end = start + rnd.randint(1, 40)
+        matches.append((start, end, 'tag{}'.format(rnd.randrange(50)), 'text'))
+    # Ambiguous labels produce exact repetitions
+    return matches + matches[:n // 10]
+
+
+def timed(label, func, n_repeats):
+    start = perf_counter()
+    for _ in range(n_repeats):
+        result = func()
+    print('{:<28} {:8.2f} ms'.format(label, (perf_counter() - start) / n_repeats * 1000))
+    return result
+
+
+def main(n=50000, n_repeats=5):
+    matches = random_matches(n)
+    sorted_matches = sorted(matches, key=lambda m: (m[0], -m[1]))
+    print('{} spans'.format(len(matches)))
+    timed('remove_overlaps', lambda: remove_overlaps(matches), n_repeats)
+    timed('resolve_overlaps longest', lambda: resolve_overlaps(matches), n_repeats)
+    timed('resolve_overlaps nested',
+          lambda: resolve_overlaps(matches, policy='nested'), n_repeats)
+    timed('resolve_overlaps score',
+          lambda: resolve_overlaps(matches, policy='score',
+                                   score=lambda m: m[1] - m[0]), n_repeats)
+    timed('iter_resolve_overlaps (sorted)',
+          lambda: list(iter_resolve_overlaps(sorted_matches)), n_repeats)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,109 @@
+"""
+Compare reading term-concept cooccurrences as group_concat strings (the
+former query of sparql_calls.query_terms2cpts_cooc_scores) with the flat
+streamed rows, on synthetic SPARQL results.
+
+Usage:
+    python benchmarks/bench_terms2cpts.py [n_terms] [cpts_per_term]
+"""
+import json
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+
+from pp_api.cooccurrence import CooccurrenceMatrix
+from pp_api.sparql_calls import parse_sparql_stream, rows_to_arrays
+
+
+def chunked(data, size=2 ** 16):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+def make_results(n_terms, cpts_per_term, seed=0):
+    rnd = random.Random(seed)
+    n_cpts = max(cpts_per_term, n_terms // 10)
+    flat = []
+    for t in range(n_terms):
+        for c in rnd.sample(range(n_cpts), cpts_per_term):
+            flat.append(('term {}'.format(t),
+                         'http://example.org/concept/{}'.format(c),
+                         '{:.6f}'.format(rnd.random())))
+    grouped = dict()
+    for tv, cpt, score in flat:
+        grouped.setdefault(tv, ([], []))
+        grouped[tv][0].append(cpt)
+        grouped[tv][1].append(score)
+    grouped_json = json.dumps({
+        'head': {'vars': ['tv', 'cpts', 'c_scores']},
+        'results': {'bindings': [
+            {'tv': {'type': 'literal', 'value': tv},
+             'cpts': {'type': 'literal', 'value': '|'.join(cpts)},
+             'c_scores': {'type': 'literal', 'value': '|'.join(scores)}}
+            for tv, (cpts, scores) in grouped.items()
+        ]}
+    }).encode('utf-8')
+    flat_csv = ('tv,cpt,c_score\n' + ''.join(
+        '"{}",{},{}\n'.format(*row) for row in flat)).encode('utf-8')
+    return grouped_json, flat_csv, len(flat)
+
+
+def grouped_to_dict(data):
+    # As before: rdflib terms from JSON, split per row
+    cooc_dict = dict()
+    for text_value, cooc_cpts, t_scores in parse_sparql_stream(
+            chunked(data), format='json', terms=True):
+        cooc_cpts = cooc_cpts.split('|')
+        t_scores = list(map(float, t_scores.split('|')))
+        cooc_dict[text_value.toPython()] = dict(zip(cooc_cpts, t_scores))
+    return cooc_dict
+
+
+def flat_to_dict(data):
+    cooc_dict = dict()
+    for text_value, cpt, score in parse_sparql_stream(chunked(data)):
+        try:
+            cooc_dict[text_value][cpt] = float(score)
+        except KeyError:
+            cooc_dict[text_value] = {cpt: float(score)}
+    return cooc_dict
+
+
+def flat_to_matrix(data):
+    columns = ('tv', 'cpt', 'c_score')
+    arrays, uris = rows_to_arrays(parse_sparql_stream(chunked(data)), columns,
+                                  uri_columns=('tv', 'cpt'),
+                                  float_columns=('c_score',))
+    return CooccurrenceMatrix.from_arrays(arrays['tv'], arrays['cpt'],
+                                         arrays['c_score'], uris,
+                                         symmetric=False)
+
+
+def measure(label, func, data):
+    start = perf_counter()
+    result = func(data)
+    seconds = perf_counter() - start
+    # Again with tracing, which is too slow to time
+    del result
+    tracemalloc.start()
+    result = func(data)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{:<24} {:8.2f} s {:10.1f} MB result {:10.1f} MB peak'.format(
+        label, seconds, current / 2 ** 20, peak / 2 ** 20))
+    return result
+
+
+def main(n_terms=20000, cpts_per_term=50):
+    grouped_json, flat_csv, n_rows = make_results(n_terms, cpts_per_term)
+    print('{} rows; {:.1f} MB grouped JSON, {:.1f} MB flat CSV'.format(
+        n_rows, len(grouped_json) / 2 ** 20, len(flat_csv) / 2 ** 20))
+    expected = measure('group_concat -> dict', grouped_to_dict, grouped_json)
+    result = measure('flat rows -> dict', flat_to_dict, flat_csv)
+    assert result == expected
+    matrix = measure('flat rows -> matrix', flat_to_matrix, flat_csv)
+    assert len(matrix) == n_rows
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
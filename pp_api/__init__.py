@@ -3,3 +3,12 @@ from pp_api.sparql_calls import *
 from pp_api.gs_calls import *
 from pp_api.extractor_utils import *
 import pp_api.utils
+from pp_api.async_pp_calls import AsyncPoolParty
+from pp_api.async_gs_calls import AsyncGraphSearch
+from pp_api.cache import LRUCache, SqliteCache
+from pp_api.history import HistoryInvalidator
+from pp_api.local_extractor import LocalExtractor
+from pp_api.cooccurrence import CooccurrenceMatrix
+from pp_api.thesaurus_snapshot import ThesaurusSnapshot
+from pp_api.packed import read_packed, write_packed
+from pp_api.autocomplete import AutocompleteIndex
@@ -0,0 +1,149 @@
+"""
+asyncio counterpart of `pp_api.gs_calls`, built on aiohttp.
+"""
+import logging
+
+from pp_api.async_pp_calls import AsyncClient, AsyncPoolParty
+from pp_api.gs_calls import GraphSearch
+
+
+module_logger = logging.getLogger(__name__)
+
+
+class AsyncGraphSearch(AsyncClient):
+    """
+    asyncio version of `pp_api.gs_calls.GraphSearch`. The methods are
+    coroutines returning the parsed JSON body of the response.
+    """
+    # GraphSearch logging includes the response text
+    log_text = True
+
+    get_create_data = staticmethod(GraphSearch.get_create_data)
+    get_cpt_facets = staticmethod(GraphSearch.get_cpt_facets)
+    get_search_data = staticmethod(GraphSearch.get_search_data)
+    filter_full_text = staticmethod(GraphSearch.filter_full_text)
+    filter_cpt = staticmethod(GraphSearch.filter_cpt)
+    filter_author = staticmethod(GraphSearch.filter_author)
+    filter_id = staticmethod(GraphSearch.filter_id)
+    filter_date = staticmethod(GraphSearch.filter_date)
+
+    async def delete(self, search_space_id, id_=None, source=None):
+        if id_ is not None:
+            suffix = '/GraphSearch/api/content/delete/id'
+            data = {
+                'identifier': id_,
+                'searchSpaceId': search_space_id
+            }
+        elif source is not None:
+            suffix = '/GraphSearch/api/content/delete/source'
+            data = {
+                'identifier': source,
+            }
+        else:
+            assert 0
+        return await self.request('POST', suffix, json=data, read='text')
+
+    async def in_gs(self, uri, search_space_id):
+        """
+        Check if document with specified uri is contained in GS
+
+        :param uri: document uri
+        :param search_space_id:
+        :return: Boolean
+        """
+        id_filter = self.filter_id(id_=uri)
+        result = await self.search(search_space_id=search_space_id,
+                                   search_filters=id_filter)
+        return result['total'] > 0
+
+    async def _create(self, id_, title, author, date, search_space_id,
+                      text=None, update=False,
+                      text_limit=True, **kwargs):
+        suffix, data = self.get_create_data(
+            id_=id_, title=title, author=author, date=date,
+            search_space_id=search_space_id, text=text, update=update,
+            text_limit=text_limit, **kwargs
+        )
+        return await self.request('POST', suffix, json=data, read='text')
+
+    async def create_with_freqs(self, id_, title, author, date, cpts,
+                                search_space_id,
+                                image_url=None,
+                                text=None, update=False,
+                                **kwargs):
+        cpt_facets = self.get_cpt_facets(cpts)
+        return await self._create(
+            id_=id_, title=title, author=author, date=date,
+            text=text, facets=cpt_facets,
+            update=update, search_space_id=search_space_id,
+            dyn_txt_imageUrl=[image_url],
+            **kwargs
+        )
+
+    async def extract_and_create(self, pid, id_, title, author, date, text,
+                                 search_space_id,
+                                 image_url=None,
+                                 text_to_extract=None,
+                                 update=False,
+                                 lang='en', **kwargs):
+        """
+        Extract concepts from the text and create corresponding document with
+        concept frequencies. The extraction shares this client's session.
+
+        :return: extracted concepts
+        """
+        pp = AsyncPoolParty(server=self.server, auth_data=self.auth_data,
+                            session=await self.get_session(),
+                            timeout=self.timeout)
+        if text_to_extract is None:
+            text_to_extract = text
+        r = await pp.extract(
+            pid=pid, text=text_to_extract, lang=lang, **kwargs
+        )
+        cpts = pp.get_cpts_from_response(r)
+        await self.create_with_freqs(
+            id_=id_, title=title, author=author,
+            date=date, text=text, cpts=cpts, update=update,
+            search_space_id=search_space_id, image_url=image_url,
+            language=lang,
+            **kwargs
+        )
+        return cpts
+
+    async def extract_and_update(self, *args, **kwargs):
+        return await self.extract_and_create(*args, update=True, **kwargs)
+
+    async def search(self, search_space_id,
+                     search_filters=None, locale='en', count=10000,
+                     **kwargs):
+        """
+        :param search_space_id: ID of search space from GS admin->configuration
+        :param search_filters: the filters (usually prepared by other methods of GS
+        :param locale: language (default: 'en')
+        :param kwargs: other kwargs, see `GraphSearch.search()`
+        :return: parsed JSON results as returned by GS API call
+        """
+        data = self.get_search_data(search_space_id,
+                                    search_filters=search_filters,
+                                    locale=locale, count=count, **kwargs)
+        return await self.request('POST', '/GraphSearch/api/search', json=data)
+
+    async def get_fields(self):
+        return await self.request('GET', '/GraphSearch/admin/config/fields')
+
+    async def add_field(self, space_id, field, label):
+        data = {
+            'searchSpaceId': space_id,
+            'field': field,
+            'label': label
+        }
+        return await self.request('POST', '/GraphSearch/admin/suggest/add',
+                                  params=data, read='text')
+
+    async def remove_field(self, space_id, field):
+        data = {
+            'searchSpaceId': space_id,
+            'field': field
+        }
+        return await self.request('POST', '/GraphSearch/admin/suggest/delete',
+                                  params=data, read='text')
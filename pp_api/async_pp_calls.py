@@ -0,0 +1,434 @@
+"""
+asyncio counterpart of `pp_api.pp_calls`, built on aiohttp.
+
+The methods mirror those of `PoolParty`, but are coroutines and return the
+parsed JSON body (or raw bytes for exports) instead of a response object.
+The parsing helpers of `PoolParty` (e.g. `get_cpts_from_response`) accept
+the parsed JSON and are shared between both clients.
+"""
+import asyncio
+import logging
+from time import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from pp_api import utils as _utils
+from pp_api.pp_calls import PoolParty
+
+module_logger = logging.getLogger(__name__)
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise ImportError("""To use the asyncio clients, install the aiohttp module with\n
+        pip install aiohttp\n""")
+
+
+def encode_fields(data):
+    """
+    Flatten a parameter dictionary into (key, value) pairs the way `requests`
+    does: lists become repeated keys, None values are dropped and all other
+    values are converted to strings.
+
+    :param data: dict or None
+    :return: list of tuples
+    """
+    fields = []
+    for k, v in (data or {}).items():
+        if v is None:
+            continue
+        values = v if isinstance(v, (list, tuple)) else [v]
+        for x in values:
+            if not isinstance(x, (str, bytes)):
+                x = str(x)
+            fields.append((k, x))
+    return fields
+
+
+def client_timeout(timeout):
+    """
+    Convert a `requests`-style timeout (None, seconds or a
+    (connect, read) tuple) to an aiohttp.ClientTimeout.
+    """
+    _require_aiohttp()
+    if timeout is None:
+        return aiohttp.ClientTimeout(total=None)
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect,
+                                     sock_read=read)
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+async def check_status_and_raise(response, logger=None, data=None,
+                                 log_text=False):
+    """
+    Async counterpart of `pp_api.utils.check_status_and_raise` for aiohttp
+    responses: log the failed call and raise a ClientResponseError
+    enriched with the error message of our API.
+
+    :param response: aiohttp.ClientResponse
+    :param data: dictionary of call parameters, to include in log
+    :param log_text: If true, add the response text to the log
+    :return: None
+    """
+    if response.status < 299:
+        return None
+
+    text = await response.text()
+    extra = _utils.api_error_extra(_utils.parse_error_content(text))
+    logged = _utils.failed_request_log(
+        response.method, response.url, data=data,
+        text=(text if log_text else None), extra=extra
+    )
+    if logger:
+        logger.error(logged)
+
+    message = response.reason or ''
+    if extra:
+        message += "\n" + extra
+    raise aiohttp.ClientResponseError(
+        response.request_info, response.history,
+        status=response.status, message=message, headers=response.headers
+    )
+
+
+class AsyncClient:
+    """
+    Common connection handling of the asyncio clients: one pooled
+    aiohttp.ClientSession per client, created lazily inside the event loop.
+    """
+    log_text = False
+
+    def __init__(self, server, auth_data=None, session=None, timeout=None,
+                 limit=100):
+        _require_aiohttp()
+        if server.endswith("/"):
+            server = server[:-1]
+        self.server = server
+        if session is None and auth_data is None:
+            auth_data = _utils.get_auth_data()
+        self.auth_data = auth_data
+        self.session = session
+        self._own_session = session is None
+        self.timeout = timeout
+        self.limit = limit
+
+    async def get_session(self):
+        if self.session is None:
+            auth = (aiohttp.BasicAuth(*self.auth_data)
+                    if self.auth_data is not None else None)
+            self.session = aiohttp.ClientSession(
+                auth=auth,
+                connector=aiohttp.TCPConnector(limit=self.limit)
+            )
+        return self.session
+
+    async def close(self):
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        await self.get_session()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method, suffix, params=None, data=None, json=None,
+                      timeout=None, read='json', log_data=None, **kwargs):
+        """
+        Make a request against `self.server` and return the body.
+
+        :param method: HTTP method
+        :param suffix: path of the API call
+        :param params: query parameters
+        :param data: form parameters (dict) or prepared body
+        :param json: JSON body
+        :param timeout: overrides `self.timeout`
+        :param read: 'json', 'text' or 'bytes'
+        :param log_data: parameters to log on failure (default: data or params)
+        :return: body of the response
+        """
+        session = await self.get_session()
+        if isinstance(data, dict):
+            data = encode_fields(data)
+        if log_data is None:
+            log_data = json or params or data
+        timeout = self.timeout if timeout is None else timeout
+        async with session.request(
+                method, self.server + suffix,
+                params=encode_fields(params), data=data, json=json,
+                timeout=client_timeout(timeout), **kwargs) as r:
+            await check_status_and_raise(r, data=log_data,
+                                         log_text=self.log_text,
+                                         logger=module_logger)
+            if read == 'json':
+                return await r.json(content_type=None)
+            elif read == 'text':
+                return await r.text()
+            return await r.read()
+
+
+class AsyncPoolParty(AsyncClient):
+    """
+    asyncio version of `pp_api.pp_calls.PoolParty`.
+
+    Use it as an async context manager (or call `close()`), so the pooled
+    connections are released:
+
+        async with AsyncPoolParty(server, auth_data) as pp:
+            cpts = pp.get_cpts_from_response(await pp.extract(text, pid))
+    """
+
+    def __init__(self, server, auth_data=None, session=None, timeout=None,
+                 lang="en", limit=100):
+        super().__init__(server, auth_data=auth_data, session=session,
+                         timeout=timeout, limit=limit)
+        self.lang = lang
+
+    get_extract_timeout = staticmethod(PoolParty.get_extract_timeout)
+    get_extract_data = staticmethod(PoolParty.get_extract_data)
+    get_history_data = staticmethod(PoolParty.get_history_data)
+    get_cpts_from_response = staticmethod(PoolParty.get_cpts_from_response)
+    get_shadow_cpts_from_response = staticmethod(
+        PoolParty.get_shadow_cpts_from_response)
+    get_terms_from_response = staticmethod(PoolParty.get_terms_from_response)
+    get_sentiment_from_response = staticmethod(
+        PoolParty.get_sentiment_from_response)
+    get_cpt_path_from_response = staticmethod(
+        PoolParty.get_cpt_path_from_response)
+    get_suggestions_from_response = staticmethod(
+        PoolParty.get_suggestions_from_response)
+
+    async def extract(self, text, pid=None, lang=None, mb_time_factor=3,
+                      force_json=False, **kwargs):
+        """
+        Make extract call using project determined by pid.
+
+        :param text: text
+        :param pid: id of project
+        :param lang: language
+        :param mb_time_factor: timeout scale factor (relative to text size)
+        :param force_json: If True, text is sent in the "text" form field,
+            otherwise as a file upload in a field named "file".
+        :return: parsed JSON response
+        """
+        lang = self.lang if lang == None else lang
+        data = self.get_extract_data(pid, lang, **kwargs)
+        content = str(text).encode('utf8')
+        if self.timeout:
+            timeout = self.timeout
+        else:
+            timeout = self.get_extract_timeout(len(content), mb_time_factor)
+
+        if force_json:
+            data['text'] = content.decode('utf8')
+            body = data
+        else:
+            body = aiohttp.FormData(encode_fields(data))
+            body.add_field('file', content, filename='file')
+        start = time()
+        result = await self.request('POST', '/extractor/api/extract',
+                                    data=body, timeout=timeout,
+                                    log_data=data)
+        module_logger.debug('call took {:0.3f}'.format(time() - start))
+        return result
+
+    async def extract_many(self, texts, pid=None, lang=None, max_in_flight=32,
+                           return_exceptions=True, **kwargs):
+        """
+        Run `extract()` for many texts concurrently on the event loop.
+
+        :param texts: iterable of texts
+        :param max_in_flight: maximum number of concurrent requests
+        :param return_exceptions: If true, failures are returned in place
+            of the result instead of aborting the batch.
+        :return: list of parsed JSON responses (or exceptions), in input order
+        """
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def extract_one(text):
+            async with semaphore:
+                return await self.extract(text, pid, lang=lang, **kwargs)
+
+        return await asyncio.gather(*[extract_one(t) for t in texts],
+                                    return_exceptions=return_exceptions)
+
+    async def extract_shadow_cpts(self, text, shadow_cpts_corpus_id, pid,
+                                  **kwargs):
+        r = await self.extract(
+            text, pid, shadowConceptCorpusId=shadow_cpts_corpus_id, **kwargs
+        )
+        return self.get_shadow_cpts_from_response(r), r
+
+    async def extract_nif(self, text, pid, lang=None,
+                          include_terms=False, include_concepts=True,
+                          prefix='doc.lynx-project.com'):
+        data = {
+            'input': text,
+            'prefix': prefix,
+            'includeTerms': include_terms,
+            'includeConcepts': include_concepts,
+            'projectId': pid
+        }
+        if lang is not None:
+            data['lang'] = lang
+        return await self.request('POST', '/extractor/api/annotate/nif',
+                                  data=data, read='text')
+
+    async def get_pref_labels(self, uris, pid, lang=None):
+        lang = self.lang if lang == None else lang
+        data = {
+            'concepts': uris,
+            'projectId': pid,
+            'language': lang,
+        }
+        suffix = '/PoolParty/api/thesaurus/{}/concepts'.format(pid)
+        result = await self.request('GET', suffix, params=data)
+        return [x['prefLabel'] for x in result]
+
+    async def get_cpts_info(self, uris, pid, lang=None):
+        lang = self.lang if lang == None else lang
+        data = {
+            'concepts': uris,
+            'language': lang,
+            'properties': 'all'
+        }
+        suffix = '/PoolParty/api/thesaurus/{}/concepts'.format(pid)
+        return await self.request('GET', suffix, params=data)
+
+    async def get_cpt_path(self, cpt_uri, pid):
+        data = {
+            'concept': str(cpt_uri)
+        }
+        suffix = '/PoolParty/api/thesaurus/{pid}/getPaths'.format(pid=pid)
+        paths = await self.request('GET', suffix, params=data)
+        return self.get_cpt_path_from_response(paths)
+
+    async def get_projects(self):
+        return await self.request('GET', '/PoolParty/api/projects')
+
+    async def get_corpora(self, pid):
+        suffix = '/PoolParty/api/corpusmanagement/{pid}/corpora'.format(pid=pid)
+        result = await self.request('GET', suffix)
+        return result['jsonCorpusList']
+
+    async def export_project(self, pid):
+        suffix = '/PoolParty/api/projects/{pid}/export'.format(pid=pid)
+        data = {
+            'format': 'N3',
+            'exportModules': ['concepts']
+        }
+        return await self.request('GET', suffix, params=data, read='bytes')
+
+    async def get_autocomplete(self, query_str, pid, lang='en'):
+        data = {
+            'projectId': pid,
+            'searchString': query_str,
+            'language': lang
+        }
+        suggestions = await self.request('GET', '/extractor/api/suggest',
+                                         params=data)
+        return self.get_suggestions_from_response(suggestions)
+
+    async def get_onto(self, uri):
+        return await self.request('GET', '/PoolParty/api/schema/ontology',
+                                  params={'uri': uri})
+
+    async def get_history(self, pid, from_=None):
+        suffix = '/PoolParty/api/history/{pid}'.format(pid=pid)
+        data = self.get_history_data(from_)
+        return await self.request('GET', suffix, params=data)
+
+    async def get_schemes(self, pid):
+        suffix = '/PoolParty/api/thesaurus/{project}/schemes'.format(
+            project=pid)
+        return await self.request('GET', suffix)
+
+    async def add_new_concept(self, pid, pref_label, parent=None, suffix=None):
+        urlpath = '/PoolParty/api/thesaurus/{project}/createConcept'.format(
+            project=pid
+        )
+        if parent is None:
+            parent = (await self.get_schemes(pid))[0]['uri']
+        data = {
+            'prefLabel': pref_label,
+            'parent': parent
+        }
+        if suffix:
+            data["suffix"] = suffix
+        return await self.request('POST', urlpath, data=data)
+
+    async def add_label(self, pid, uri, label_value,
+                        label_type='skos:altLabel', lang=None):
+        suffix = '/PoolParty/api/thesaurus/{project}/addLiteral'.format(
+            project=pid
+        )
+        data = {
+            'concept': uri,
+            'label': label_value,
+            'property': label_type,
+            'language': lang
+        }
+        return await self.request('POST', suffix, data=data, read='text')
+
+    async def add_relation(self, pid, source_uri, target_uri,
+                           relation_type='skos:narrower'):
+        suffix = '/PoolParty/api/thesaurus/{project}/addRelation'.format(
+            project=pid
+        )
+        data = {
+            'sourceConcept': source_uri,
+            'targetConcept': target_uri,
+            'property': relation_type,
+        }
+        return await self.request('POST', suffix, data=data, read='text')
+
+    async def add_narrower(self, pid, broader_uri, narrower_uri):
+        return await self.add_relation(
+            pid=pid, source_uri=broader_uri, target_uri=narrower_uri,
+            relation_type='skos:narrower'
+        )
+
+    async def add_related(self, pid, source_uri, target_uri):
+        return await self.add_relation(
+            pid=pid, source_uri=source_uri, target_uri=target_uri,
+            relation_type='skos:related'
+        )
+
+    async def get_cpt_narrowers(self, pid, cpt_uri, transitive=True,
+                                lang=None):
+        suffix = '/PoolParty/api/thesaurus/{project}/narrowers'.format(
+            project=pid
+        )
+        data = {
+            'concept': cpt_uri,
+            'properties': 'all',
+            'transitive': transitive,
+        }
+        if lang is not None:
+            data['language'] = lang
+        return await self.request('GET', suffix, params=data)
+
+    async def get_childconcepts(self, pid, parent, properties=None,
+                                language=None, transitive=None,
+                                workflowStatus=None):
+        suffix = '/PoolParty/api/thesaurus/{project}/childconcepts'.format(
+            project=pid)
+        data = dict(parent=parent)
+        if properties == "all":
+            data["properties"] = properties
+        elif properties:
+            data["properties"] = list(properties)
+        if language:
+            data["language"] = language
+        if transitive:
+            data["transitive"] = True
+        if workflowStatus:
+            data["workflowStates"] = True
+        return await self.request('GET', suffix, params=data)
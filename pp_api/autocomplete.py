@@ -0,0 +1,262 @@
+"""
+Client-side autocomplete over the labels of a project, for typeahead
+suggestions without an HTTP call per keystroke.
+"""
+import bisect
+import logging
+import threading
+
+from pp_api.thesaurus_snapshot import ThesaurusSnapshot
+
+
+module_logger = logging.getLogger(__name__)
+
+
+class AutocompleteIndex:
+    """
+    Prefix index of the pref, alt and hidden labels of a project, per
+    language, answering like `PoolParty.get_autocomplete()`.
+
+        index = AutocompleteIndex.from_pp(pp, pid)
+        index.get_autocomplete('vien')   # [(prefLabel, uri)]
+        HistoryInvalidator(pp, pid, targets=[pp, index]).start()
+        index.refresh()                  # e.g. before serving a request
+
+    Every language has a sorted list of (lowercased label, uri), searched
+    with `bisect`. Changed concepts (see `invalidate_uris()`) are updated
+    in place by `refresh()`, by fetching only their labels.
+
+    Ranking of the matches of a query (`rank`):
+        'label': alphabetically by matching label, like the snapshot
+        'pref': concepts whose prefLabel matches first
+        'length': shortest matching label first, i.e. exact matches first
+        'weight': highest `weights[uri]` first, e.g. corpus frequencies
+        or a function (query, matching label, prefLabel, uri) -> sort key
+    """
+
+    RANKS = ('label', 'pref', 'length', 'weight')
+
+    def __init__(self, pp=None, pid=None, lang='en', rank='label',
+                 weights=None, fallback=True, limit=10, max_candidates=300):
+        """
+        Use `from_pp()`, `from_snapshot()` or add labels with `set_labels()`.
+
+        :param pp: PoolParty client for `refresh()` and the fallback
+        :param pid: id of project
+        :param lang: default language
+        :param rank: default ranking, see above
+        :param weights: dict uri -> weight for rank='weight'
+        :param fallback: If true, ask the server (`pp.get_autocomplete()`)
+            when the index has no match, e.g. for concepts added since the
+            last refresh.
+        :param limit: default number of suggestions
+        :param max_candidates: number of matches ranked at most, for ranks
+            other than 'label'; the others are ignored
+        """
+        if rank not in self.RANKS and not callable(rank):
+            raise ValueError('Unknown rank: {}'.format(rank))
+        self.pp = pp
+        self.pid = pid
+        self.lang = lang
+        self.rank = rank
+        self.weights = dict() if weights is None else weights
+        self.fallback = fallback
+        self.limit = limit
+        self.max_candidates = max_candidates
+        self.stale_uris = set()
+        self._rebuild = False
+        self._entries = dict()  # lang -> sorted list of (label, uri)
+        self._labels = dict()  # lang -> uri -> (prefLabel, labels)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_snapshot(cls, snapshot, pp=None, **kwargs):
+        """
+        :param snapshot: ThesaurusSnapshot of the project
+        """
+        kwargs.setdefault('pid', snapshot.pid)
+        kwargs.setdefault('lang', snapshot.lang)
+        index = cls(pp=pp, **kwargs)
+        index._load_snapshot(snapshot)
+        return index
+
+    @classmethod
+    def from_pp(cls, pp, pid, **kwargs):
+        """
+        Build the index from an export of the project `pid`.
+        """
+        kwargs.setdefault('lang', pp.lang)
+        snapshot = ThesaurusSnapshot.from_pp(pp, pid, lang=kwargs['lang'])
+        return cls.from_snapshot(snapshot, pp=pp, **kwargs)
+
+    def _load_snapshot(self, snapshot):
+        labels = dict()
+        for lang, keys in snapshot.label_keys.items():
+            by_uri = dict()
+            for key, i in zip(keys, snapshot.label_ids[lang]):
+                uri = snapshot.uris[int(i)]
+                if uri not in by_uri:
+                    by_uri[uri] = (snapshot.get_pref_label(uri, lang), [])
+                by_uri[uri][1].append(key)
+            labels[lang] = {uri: (pref_label, tuple(keys_))
+                            for uri, (pref_label, keys_) in by_uri.items()}
+        entries = {
+            lang: sorted((key, uri) for uri, (_, keys) in by_uri.items()
+                         for key in keys)
+            for lang, by_uri in labels.items()
+        }
+        with self._lock:
+            self._labels = labels
+            self._entries = entries
+
+    def __len__(self):
+        """
+        Number of indexed labels.
+        """
+        return sum(len(entries) for entries in self._entries.values())
+
+    def set_labels(self, uri, pref_label, labels=(), lang=None):
+        """
+        Add or replace the labels of the concept `uri` in `lang`.
+
+        :param pref_label: prefLabel returned in suggestions
+        :param labels: alt and hidden labels
+        """
+        lang = self.lang if lang is None else lang
+        keys = tuple(sorted({x.lower() for x in (pref_label, *labels) if x}))
+        with self._lock:
+            self._remove(uri, lang)
+            if not keys:
+                return
+            entries = self._entries.setdefault(lang, [])
+            for key in keys:
+                bisect.insort(entries, (key, uri))
+            self._labels.setdefault(lang, dict())[uri] = (pref_label, keys)
+
+    def remove(self, uri, lang=None):
+        """
+        Remove the concept `uri` from `lang`, or from all languages if None.
+        """
+        with self._lock:
+            for lang_ in list(self._labels) if lang is None else [lang]:
+                self._remove(uri, lang_)
+
+    def _remove(self, uri, lang):
+        old = self._labels.get(lang, dict()).pop(uri, None)
+        if old is None:
+            return
+        entries = self._entries[lang]
+        for key in old[1]:
+            pos = bisect.bisect_left(entries, (key, uri))
+            if pos < len(entries) and entries[pos] == (key, uri):
+                del entries[pos]
+
+    def invalidate_uris(self, pid, uris=None):
+        """
+        Mark concepts as changed, e.g. by a
+        `pp_api.history.HistoryInvalidator`. They are updated by the next
+        `refresh()`; if `uris` is None, the whole index is rebuilt.
+        """
+        if self.pid is not None and pid != self.pid:
+            return
+        with self._lock:
+            if uris is None:
+                self._rebuild = True
+            else:
+                self.stale_uris.update(uris)
+
+    def refresh(self, batch_size=100):
+        """
+        Update the changed concepts from the server.
+
+        :return: number of updated concepts
+        """
+        with self._lock:
+            stale = sorted(self.stale_uris)
+            rebuild = self._rebuild
+            self.stale_uris.clear()
+            self._rebuild = False
+        try:
+            if rebuild:
+                snapshot = ThesaurusSnapshot.from_pp(self.pp, self.pid,
+                                                     lang=self.lang)
+                self._load_snapshot(snapshot)
+                return len(snapshot)
+            # Labels without language tag ('') cannot be requested
+            for lang in (set(self._labels) | {self.lang}) - {''}:
+                for start in range(0, len(stale), batch_size):
+                    batch = stale[start:start + batch_size]
+                    cpts = self.pp.get_cpts_info(batch, self.pid, lang=lang)
+                    found = {cpt['uri']: cpt for cpt in cpts}
+                    for uri in batch:
+                        cpt = found.get(uri)
+                        if cpt is None:
+                            self.remove(uri, lang)
+                        else:
+                            self.set_labels(
+                                uri, cpt.get('prefLabel') or '',
+                                [*cpt.get('altLabels', ()),
+                                 *cpt.get('hiddenLabels', ())],
+                                lang=lang)
+        except Exception:
+            # Retry with the next refresh
+            with self._lock:
+                self.stale_uris.update(stale)
+                self._rebuild = self._rebuild or rebuild
+            raise
+        module_logger.debug('Refreshed {} concepts of {}'.format(len(stale), self.pid))
+        return len(stale)
+
+    def _rank_key(self, rank, prefix):
+        if callable(rank):
+            return lambda match: rank(prefix, *match)
+        if rank == 'pref':
+            return lambda match: (not match[1].lower().startswith(prefix), match[0])
+        if rank == 'length':
+            return lambda match: (len(match[0]), match[0])
+        if rank == 'weight':
+            weights = self.weights
+            return lambda match: (-weights.get(match[2], 0), match[0])
+        raise ValueError('Unknown rank: {}'.format(rank))
+
+    def get_autocomplete(self, query_str, lang=None, limit=None, rank=None,
+                         fallback=None):
+        """
+        Like `PoolParty.get_autocomplete()`: concepts with a label starting
+        with `query_str`, case-insensitively.
+
+        :param rank: ranking, default `self.rank`
+        :param fallback: ask the server if nothing matches, default
+            `self.fallback`
+        :return: list of up to `limit` (prefLabel, uri)
+        """
+        lang = self.lang if lang is None else lang
+        limit = self.limit if limit is None else limit
+        rank = self.rank if rank is None else rank
+        fallback = self.fallback if fallback is None else fallback
+        prefix = query_str.lower()
+        # Collect at most this many matches (label, prefLabel, uri)
+        n = limit if rank == 'label' else max(limit, self.max_candidates)
+        matches = []
+        seen = dict()  # uri -> position in matches
+        with self._lock:
+            entries = self._entries.get(lang, [])
+            labels = self._labels.get(lang, dict())
+            pos = bisect.bisect_left(entries, (prefix,))
+            while pos < len(entries) and len(matches) < n:
+                key, uri = entries[pos]
+                if not key.startswith(prefix):
+                    break
+                if uri not in seen:
+                    seen[uri] = len(matches)
+                    matches.append((key, labels[uri][0], uri))
+                elif len(key) < len(matches[seen[uri]][0]):
+                    # Rank a concept by its shortest matching label
+                    matches[seen[uri]] = (key, labels[uri][0], uri)
+                pos += 1
+        if rank != 'label':
+            matches.sort(key=self._rank_key(rank, prefix))
+        result = [(pref_label, uri) for _, pref_label, uri in matches[:limit]]
+        if not result and fallback and self.pp is not None and query_str:
+            result = self.pp.get_autocomplete(query_str, self.pid, lang=lang)[:limit]
+        return result
@@ -0,0 +1,238 @@
+"""
+Client-side caches for rarely changing data, e.g. thesaurus metadata.
+
+All caches share the interface of `BaseCache`: `get`, `set`, `delete`,
+`keys`, `clear`, `invalidate_where` and `get_or_set`, entries expire after
+`ttl` seconds, and hits and misses are counted. Keys are tuples of
+strings (and other simple values), values anything picklable.
+
+`BloomFilter` is a compact set of strings with false positives, e.g. to
+rule out most of the identifiers that are not indexed yet without asking
+the server.
+"""
+import hashlib
+import math
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from time import time
+
+
+_MISSING = object()
+
+
+class BaseCache:
+    """
+    Common bookkeeping of the caches. Subclasses implement `_get`, `set`,
+    `delete`, `keys`, `clear` and `__len__`.
+    """
+
+    def __init__(self, ttl=None):
+        """
+        :param ttl: lifetime of entries in seconds, None for no expiry
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    def _expires(self):
+        return None if self.ttl is None else time() + self.ttl
+
+    def get(self, key, default=None):
+        value = self._get(key, _MISSING)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def get_or_set(self, key, fetch):
+        """
+        Return the cached value of `key`, or call `fetch()`, cache and
+        return its result.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        self.delete(key)
+
+    def invalidate_where(self, predicate):
+        """
+        Remove all entries whose key satisfies `predicate`.
+
+        :param predicate: callable taking a key
+        :return: number of removed entries
+        """
+        stale = [k for k in self.keys() if predicate(k)]
+        for k in stale:
+            self.delete(k)
+        return len(stale)
+
+    def stats(self):
+        """
+        :return: dict with the number of hits, misses and entries
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+class LRUCache(BaseCache):
+    """
+    In-memory cache evicting the least recently used entries beyond
+    `maxsize`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        super().__init__(ttl=ttl)
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def _get(self, key, default):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires < time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self._expires(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteCache(BaseCache):
+    """
+    On-disk cache in a sqlite database, so the cached data survives restarts
+    and can be shared between processes.
+    """
+
+    def __init__(self, path, ttl=None):
+        """
+        :param path: file name of the database
+        :param ttl: lifetime of entries in seconds, None for no expiry
+        """
+        super().__init__(ttl=ttl)
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'create table if not exists cache ('
+                'key text primary key, pkey blob, value blob, expires real)'
+            )
+
+    def _get(self, key, default):
+        with self._lock:
+            row = self._conn.execute(
+                'select value, expires from cache where key = ?', (repr(key),)
+            ).fetchone()
+        if row is None:
+            return default
+        value, expires = row
+        if expires is not None and expires < time():
+            self.delete(key)
+            return default
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'insert or replace into cache values (?, ?, ?, ?)',
+                (repr(key), pickle.dumps(key), pickle.dumps(value),
+                 self._expires())
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute('delete from cache where key = ?', (repr(key),))
+
+    def keys(self):
+        with self._lock:
+            rows = self._conn.execute('select pkey from cache').fetchall()
+        return [pickle.loads(pkey) for pkey, in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('delete from cache')
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('select count(*) from cache').fetchone()[0]
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings: `x in bloom` is always true for added
+    strings, and true with probability about `error_rate` for others.
+    Takes about 1.2 bytes per element at 1% errors.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        :param capacity: expected number of elements
+        :param error_rate: false positive rate at `capacity` elements
+        """
+        capacity = max(1, capacity)
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        with self._lock:
+            for pos in positions:
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(item))
+
+    def __len__(self):
+        """
+        Number of `add()` calls, an upper bound of the number of elements.
+        """
+        return self.count
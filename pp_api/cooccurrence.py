@@ -0,0 +1,324 @@
+"""
+Compact cooccurrence scores of concepts or terms, e.g. from the corpus
+analysis graphs.
+
+`CooccurrenceMatrix` keeps the scores in compressed sparse row (CSR) form
+in NumPy arrays, with an index of the uris, so that lookups of many pairs
+and top-k neighbours are vectorized.
+"""
+import numpy as np
+
+from pp_api import sparql_calls
+from pp_api.packed import (
+    StringIndex, StringTable, read_packed, write_packed
+)
+
+
+class CooccurrenceMatrix:
+    """
+    Sparse square matrix of cooccurrence scores between uris.
+
+        cooc = CooccurrenceMatrix.from_sparql(endpoint, cooc_graph)
+        cooc.score(uri1, uri2)
+        cooc.neighbours(uri1, k=10)
+        cooc.normalized('log2_max').save('coocs.npz')
+
+    The entries of row i are data[indptr[i]:indptr[i + 1]], in the columns
+    indices[indptr[i]:indptr[i + 1]], which are sorted.
+    """
+
+    def __init__(self, indptr, indices, data, uris, index=None):
+        """
+        :param indptr: int64 array of len(uris) + 1 row offsets
+        :param indices: int array of the column ids, sorted within rows
+        :param data: float64 array of the scores
+        :param uris: list (or `StringTable`) of uris indexed by id
+        :param index: mapping uri -> id, built from `uris` if None
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        # 32 bit column ids where possible, they are most of the data
+        self.indices = np.asarray(
+            indices, dtype=np.int32 if len(uris) < 2 ** 31 else np.int64)
+        self.data = np.asarray(data, dtype=np.float64)
+        self.uris = uris if isinstance(uris, StringTable) else list(uris)
+        if index is None:
+            index = {uri: i for i, uri in enumerate(self.uris)}
+        self.index = index
+        self._keys = None
+
+    @classmethod
+    def from_arrays(cls, rows, cols, scores, uris, symmetric=True):
+        """
+        :param rows: int array of row ids
+        :param cols: int array of column ids
+        :param scores: float array
+        :param uris: list of uris indexed by id
+        :param symmetric: If true, every score is stored for (row, col) and
+            (col, row), like `sparql_calls.query_cpt_cooc_scores()` does.
+        :return: CooccurrenceMatrix; of repeated pairs the last score is kept
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+        if symmetric:
+            # Interleaved, so that "last" means the same as in a dict
+            rows, cols = (np.column_stack([rows, cols]).ravel(),
+                          np.column_stack([cols, rows]).ravel())
+            scores = np.repeat(scores, 2)
+        n = len(uris)
+        keys = rows * n + cols
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        keys = keys[last]
+        data = scores[order][last]
+        rows, indices = np.divmod(keys, n) if n else (keys, keys)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(indptr, indices, data, uris)
+
+    @classmethod
+    def from_dict(cls, scores, symmetric=False):
+        """
+        :param scores: dict of dicts uri1 -> uri2 -> score, as returned by
+            `sparql_calls.query_cpt_cooc_scores()`
+        """
+        index = dict()
+        rows, cols, data = [], [], []
+        for uri1, row in scores.items():
+            i = index.setdefault(uri1, len(index))
+            for uri2, score in row.items():
+                rows.append(i)
+                cols.append(index.setdefault(uri2, len(index)))
+                data.append(score)
+        return cls.from_arrays(rows, cols, data, list(index), symmetric=symmetric)
+
+    @classmethod
+    def from_sparql(cls, sparql_endpoint, cpt_cooc_graph, session=None):
+        """
+        Load the concept cooccurrence scores of a corpus analysis graph.
+        """
+        arrays, uris = sparql_calls.query_cpt_cooc_arrays(
+            sparql_endpoint, cpt_cooc_graph, session=session)
+        return cls.from_arrays(arrays['cpt1'], arrays['cpt2'],
+                               arrays['score'], uris)
+
+    @classmethod
+    def from_terms2cpts(cls, sparql_endpoint, cpt_cooc_graph, terms_graph,
+                        client=None, executor=None):
+        """
+        Load the cooccurrence scores of terms with concepts, streamed
+        without building the dict of `query_terms2cpts_cooc_scores()`.
+
+        The rows are the terms (by text value) and the columns the
+        concepts, which share one index: `neighbours(term)` are the
+        concepts cooccurring most with the term.
+        """
+        columns = ('tv', 'cpt', 'c_score')
+        rows = sparql_calls.iter_terms2cpts_cooc_rows(
+            sparql_endpoint, cpt_cooc_graph, terms_graph, client=client,
+            executor=executor)
+        arrays, uris = sparql_calls.rows_to_arrays(
+            rows, columns, uri_columns=('tv', 'cpt'), float_columns=('c_score',))
+        return cls.from_arrays(arrays['tv'], arrays['cpt'], arrays['c_score'],
+                               uris, symmetric=False)
+
+    def __len__(self):
+        """
+        Number of stored scores.
+        """
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return len(self.uris), len(self.uris)
+
+    def ids(self, uris):
+        """
+        :param uris: iterable of uris
+        :return: int64 array of ids, -1 for unknown uris
+        """
+        index = self.index
+        if isinstance(index, StringIndex):
+            return index.get_many(uris)
+        return np.array([index.get(uri, -1) for uri in uris], dtype=np.int64)
+
+    def _get_keys(self):
+        # Linear positions of the entries, sorted since the rows are
+        if self._keys is None:
+            rows = np.repeat(np.arange(len(self.uris), dtype=np.int64),
+                             np.diff(self.indptr))
+            self._keys = rows * len(self.uris) + self.indices
+        return self._keys
+
+    def scores_by_id(self, ids1, ids2, default=0.):
+        """
+        Vectorized lookup of the scores of the pairs (ids1[i], ids2[i]).
+
+        :param default: score of the pairs without entry (and unknown ids)
+        :return: float64 array
+        """
+        ids1 = np.asarray(ids1, dtype=np.int64)
+        ids2 = np.asarray(ids2, dtype=np.int64)
+        result = np.full(ids1.shape, default, dtype=np.float64)
+        if not len(self.data):
+            return result
+        known = (ids1 >= 0) & (ids2 >= 0)
+        queries = ids1[known] * len(self.uris) + ids2[known]
+        keys = self._get_keys()
+        pos = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+        found = keys[pos] == queries
+        values = result[known]
+        values[found] = self.data[pos[found]]
+        result[known] = values
+        return result
+
+    def scores(self, uris1, uris2, default=0.):
+        """
+        Scores of the pairs (uris1[i], uris2[i]), see `scores_by_id()`.
+        """
+        return self.scores_by_id(self.ids(uris1), self.ids(uris2),
+                                 default=default)
+
+    def score(self, uri1, uri2, default=0.):
+        i, j = self.index.get(uri1), self.index.get(uri2)
+        if i is None or j is None:
+            return default
+        start, end = self.indptr[i], self.indptr[i + 1]
+        pos = start + np.searchsorted(self.indices[start:end], j)
+        if pos < end and self.indices[pos] == j:
+            return float(self.data[pos])
+        return default
+
+    def similarity(self, uri1, uri2):
+        """
+        Like the function returned by `sparql_calls.get_corpus_zscores()`:
+        1 for identical uris, the score of either direction otherwise, and
+        0 if there is none.
+        """
+        if uri1 == uri2:
+            return 1.
+        score = self.score(uri1, uri2, default=None)
+        if score is None:
+            score = self.score(uri2, uri1)
+        return score
+
+    def similarity_matrix(self, uris, diagonal=1.):
+        """
+        Dense matrix of the scores between all pairs of `uris`.
+
+        :param diagonal: value of the diagonal, None to keep the scores
+        :return: float64 array of shape (len(uris), len(uris))
+        """
+        ids = self.ids(uris)
+        n = len(ids)
+        matrix = self.scores_by_id(np.repeat(ids, n), np.tile(ids, n)).reshape(n, n)
+        if diagonal is not None:
+            np.fill_diagonal(matrix, diagonal)
+        return matrix
+
+    def neighbours(self, uri, k=10):
+        """
+        :return: list of up to `k` (uri, score) with the highest scores in
+            the row of `uri`, highest first
+        """
+        i = self.index.get(uri)
+        if i is None:
+            return []
+        start, end = self.indptr[i], self.indptr[i + 1]
+        row = self.data[start:end]
+        if k < len(row):
+            top = np.argpartition(-row, k)[:k]
+        else:
+            top = np.arange(len(row))
+        top = top[np.argsort(-row[top], kind='stable')]
+        return [(self.uris[self.indices[start + j]], float(row[j])) for j in top]
+
+    def normalized(self, how='max'):
+        """
+        :param how: 'max' to divide by the maximal score, 'log2_max' to
+            take the log2 first (as `sparql_calls.get_corpus_zscores()`
+            does), or 'row_max' to divide every row by its maximum
+        :return: new CooccurrenceMatrix
+        """
+        data = self.data
+        if how == 'log2_max':
+            data = np.log2(data)
+            how = 'max'
+        if how == 'max':
+            data = data / data.max() if len(data) else data.copy()
+        elif how == 'row_max':
+            counts = np.diff(self.indptr)
+            nonempty = self.indptr[:-1][counts > 0]
+            row_max = np.maximum.reduceat(data, nonempty) if len(data) else data
+            data = data / np.repeat(row_max, counts[counts > 0])
+        else:
+            raise ValueError('Unknown normalization: {}'.format(how))
+        return type(self)(self.indptr, self.indices, data, self.uris,
+                          index=self.index)
+
+    def to_dict(self):
+        """
+        :return: dict of dicts uri1 -> uri2 -> score
+        """
+        result = dict()
+        for i, uri in enumerate(self.uris):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            if start < end:
+                result[uri] = {
+                    self.uris[j]: float(score)
+                    for j, score in zip(self.indices[start:end],
+                                        self.data[start:end])
+                }
+        return result
+
+    def save(self, path):
+        """
+        Write the matrix to a compressed .npz file.
+        """
+        encoded = [uri.encode('utf-8') for uri in self.uris]
+        uri_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in encoded], out=uri_offsets[1:])
+        np.savez_compressed(
+            path, indptr=self.indptr, indices=self.indices, data=self.data,
+            uri_bytes=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            uri_offsets=uri_offsets,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            uri_bytes = npz['uri_bytes'].tobytes()
+            offsets = npz['uri_offsets']
+            uris = [uri_bytes[a:b].decode('utf-8')
+                    for a, b in zip(offsets[:-1], offsets[1:])]
+            return cls(npz['indptr'], npz['indices'], npz['data'], uris)
+
+    def save_packed(self, path):
+        """
+        Write the matrix to an uncompressed packed file (see
+        `pp_api.packed`), which `load_packed()` maps into memory.
+        """
+        index = self.index
+        if not isinstance(index, StringIndex):
+            index = StringIndex.build(self.uris)
+        write_packed(path, {
+            'indptr': self.indptr, 'indices': self.indices, 'data': self.data,
+            'uris': self.uris, 'uri_hashes': index.hashes,
+            'uri_order': index.order,
+        })
+
+    @classmethod
+    def load_packed(cls, path, mmap=True):
+        """
+        Open a file written by `save_packed()`. With `mmap`, the arrays and
+        uris are views of the mapped file: opening is almost free and the
+        memory is shared by all processes using the same file. Uris are
+        then looked up in a `pp_api.packed.StringIndex` instead of a dict.
+        """
+        arrays, _ = read_packed(path, mmap=mmap)
+        index = StringIndex(arrays['uris'], arrays['uri_hashes'],
+                            arrays['uri_order'])
+        return cls(arrays['indptr'], arrays['indices'], arrays['data'],
+                   arrays['uris'], index=index)
@@ -2,7 +2,12 @@
 Extractor-related utility functions.
 """
 
+import re
 from collections import defaultdict
+from string import Formatter
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
 
 
 def ppextract2matches(matches, tag=None, overlaps=True):
@@ -53,6 +58,10 @@ def ppextract2matches(matches, tag=None, overlaps=True):
     """
     if tag is None:
         tag = "{prefLabel}"
+    # Only patterns using the offsets need formatting for every position
+    per_position = bool({"start", "end"} & {
+        field for _, field, _, _ in Formatter().parse(tag) if field
+    })
 
     edits = []
     for cpt_dict in matches:
@@ -61,14 +70,18 @@ def ppextract2matches(matches, tag=None, overlaps=True):
         if "matchings" not in cpt_dict:
             continue
 
+        # Support tag patterns with substitution
+        if not per_position:
+            thistag = tag.format(**cpt_dict)
         for match in cpt_dict["matchings"]:
+            text = match["text"]
             for start, end in match["positions"]:
-                # Support tag patterns with substitution
-                thistag = tag.format(**cpt_dict, start=start, end=end)
-                edits.append((start, end, thistag, match["text"]))
+                if per_position:
+                    thistag = tag.format(**cpt_dict, start=start, end=end)
+                edits.append((start, end, thistag, text))
 
     if not overlaps:
-        edits = remove_overlaps(edits)
+        edits = resolve_overlaps(edits)
 
     return edits
 
@@ -114,3 +127,214 @@ def remove_overlaps(matches):
         offset = end
 
     return clean
+
+
+OVERLAP_POLICIES = ('longest', 'score', 'nested')
+
+
+def resolve_overlaps(matches, policy='longest', score=None):
+    """
+    Return a subset of the matches, ordered by position, in which
+    overlapping annotations are resolved according to `policy`:
+
+    - 'longest': Among spans that start at the same point the longest
+      wins, and any span starting before the previous kept one ended is
+      dropped. This is the result of `remove_overlaps()`, computed faster.
+    - 'score': The spans with the highest `score(match)` win (greedily);
+      spans overlapping an already kept one are dropped.
+    - 'nested': Spans lying completely within another one are kept;
+      only spans crossing the boundary of a kept span are dropped.
+
+    As in `remove_overlaps()`, a span that starts where the previous one
+    ends counts as overlapping.
+
+    :param matches: iterable of 4-tuples (start, end, tag, content)
+    :param policy: one of OVERLAP_POLICIES
+    :param score: for policy 'score', a function from a match to a number
+    :return: the cleaned list
+    """
+    if policy not in OVERLAP_POLICIES:
+        raise ValueError('Unknown overlap policy: {}'.format(policy))
+    # Remove repetitions, keeping the order
+    matches = list(dict.fromkeys(matches))
+    if policy == 'score':
+        if score is None:
+            raise ValueError("Policy 'score' needs a score function")
+        return _resolve_by_score(matches, score)
+
+    n = len(matches)
+    starts = np.fromiter((m[0] for m in matches), dtype=np.int64, count=n)
+    ends = np.fromiter((m[1] for m in matches), dtype=np.int64, count=n)
+    # By start, and the longest span first for equal starts
+    order = np.lexsort((-ends, starts))
+    return list(iter_resolve_overlaps((matches[i] for i in order.tolist()),
+                                      policy=policy))
+
+
+def iter_resolve_overlaps(matches, policy='longest'):
+    """
+    Streaming version of `resolve_overlaps()` for the policies 'longest'
+    and 'nested': consume matches sorted by start position (and by
+    decreasing end for equal starts, at least for policy 'nested'), and
+    yield the kept ones as soon as they are known.
+
+    :param matches: iterable of 4-tuples (start, end, tag, content)
+    :param policy: 'longest' or 'nested'
+    :return: generator of matches
+    """
+    if policy == 'longest':
+        return _iter_longest(matches)
+    elif policy == 'nested':
+        return _iter_nested(matches)
+    raise ValueError('Policy {} cannot be streamed'.format(policy))
+
+
+def _iter_longest(matches):
+    offset = -1
+    best = None
+    for edt in matches:
+        if best is not None and edt[0] < best[0]:
+            raise ValueError('Matches are not sorted by start position')
+        if best is not None and edt[0] == best[0]:
+            # Same start: keep the longest, or the one that sorts last
+            if (edt[1], edt) > (best[1], best):
+                best = edt
+            continue
+        if best is not None and best[0] > offset:
+            yield best
+            offset = best[1]
+        best = edt
+    if best is not None and best[0] > offset:
+        yield best
+
+
+def _iter_nested(matches):
+    # Ends of the kept spans enclosing the current position, innermost last
+    open_ends = []
+    last_start = None
+    for edt in matches:
+        start, end = edt[0], edt[1]
+        if last_start is not None and start < last_start:
+            raise ValueError('Matches are not sorted by start position')
+        last_start = start
+        while open_ends and open_ends[-1] < start:
+            open_ends.pop()
+        if open_ends and end > open_ends[-1]:
+            # Crosses the boundary of the innermost enclosing span
+            continue
+        open_ends.append(end)
+        yield edt
+
+
+def _resolve_by_score(matches, score):
+    if not matches:
+        return []
+    # Highest score first; prefer longer, then earlier spans on ties
+    ranked = sorted(matches,
+                    key=lambda m: (-score(m), m[0] - m[1], m[0]))
+    # Offsets covered by kept spans, including the end offset itself,
+    # since touching spans count as overlapping
+    first = min(m[0] for m in matches)
+    covered = bytearray(max(m[1] for m in matches) - first + 1)
+    ones = memoryview(b'\x01' * len(covered))
+    kept = []
+    for edt in ranked:
+        start, end = edt[0] - first, edt[1] - first + 1
+        if covered.find(1, start, end) != -1:
+            continue
+        covered[start:end] = ones[:end - start]
+        kept.append(edt)
+    kept.sort(key=lambda m: m[0])
+    return kept
+
+
+ANNOTATION_STYLES = ('opennlp', 'xml', 'bio')
+
+
+def apply_annotations(text, edits, style='opennlp', out=None,
+                      element='span', attribute='class',
+                      token_pattern=r'\S+'):
+    """
+    Render `text` with the annotations `edits` applied, in one linear pass.
+
+    :param text: the annotated text
+    :param edits: non-overlapping 4-tuples (start, end, tag, content) as
+        returned by `ppextract2matches(..., overlaps=False)`
+    :param style: 'opennlp' for `<START:tag> text <END>` (tags starting
+                    with "<START" are used as they are),
+                  'xml' for `<span class="tag">text</span>` with escaped
+                    text (tags starting with "<" are used as they are, and
+                    closed with the end tag of their own element),
+                  'bio' for one "token<TAB>label" line per token, with
+                    labels B-tag, I-tag and O.
+    :param out: optional file object; if given, the output is written to
+                it piece by piece and None is returned.
+    :param element: element name for style 'xml'
+    :param attribute: attribute holding the tag for style 'xml'
+    :param token_pattern: regular expression of a token for style 'bio'
+    :return: the rendered string (if `out` is None)
+    """
+    if style not in ANNOTATION_STYLES:
+        raise ValueError('Unknown annotation style: {}'.format(style))
+    edits = sorted(edits, key=lambda x: (x[0], x[1]))
+    for previous, edt in zip(edits, edits[1:]):
+        if edt[0] < previous[1]:
+            raise ValueError('Overlapping annotations {} and {}, use '
+                             'resolve_overlaps() first'.format(previous, edt))
+
+    if style == 'bio':
+        pieces = _iter_bio(text, edits, token_pattern)
+    else:
+        pieces = _iter_inline(text, edits, style, element, attribute)
+
+    if out is None:
+        return ''.join(pieces)
+    for piece in pieces:
+        out.write(piece)
+
+
+_ELEMENT_NAME = re.compile(r'<([^\s/>]+)')
+
+
+def _iter_inline(text, edits, style, element, attribute):
+    quote = escape if style == 'xml' else (lambda x: x)
+    if style == 'xml':
+        closing = '</{}>'.format(element)
+    else:
+        closing = ' <END>'
+    offset = 0
+    for start, end, tag, _ in edits:
+        yield quote(text[offset:start])
+        end_tag = closing
+        if style == 'xml' and tag.startswith('<'):
+            # Custom opening tag, closed by the end tag of its element
+            name = _ELEMENT_NAME.match(tag)
+            if name is None:
+                raise ValueError('Invalid opening tag: {}'.format(tag))
+            end_tag = '</{}>'.format(name.group(1))
+            yield tag
+        elif style == 'xml':
+            yield '<{} {}={}>'.format(element, attribute, quoteattr(tag))
+        else:
+            yield (tag if tag.startswith('<START') else
+                   '<START:{}>'.format(tag)) + ' '
+        yield quote(text[start:end])
+        yield end_tag
+        offset = end
+    yield quote(text[offset:])
+
+
+def _iter_bio(text, edits, token_pattern):
+    i = 0
+    labelled = -1  # index of the edit that has received its B- label
+    for token in re.finditer(token_pattern, text):
+        tstart, tend = token.span()
+        while i < len(edits) and edits[i][1] <= tstart:
+            i += 1
+        if i < len(edits) and edits[i][0] < tend:
+            tag = '_'.join(edits[i][2].split())
+            label = ('I-' if labelled == i else 'B-') + tag
+            labelled = i
+        else:
+            label = 'O'
+        yield '{}\t{}\n'.format(token.group(), label)
@@ -1,21 +1,50 @@
+import itertools
 import logging
+from collections.abc import Sequence
+from time import time
 
 from pp_api import utils as u
 from pp_api import pp_calls
+from pp_api.cache import BloomFilter
 
 
 module_logger = logging.getLogger(__name__)
 
+# Keys of the documents of `GraphSearch.bulk_create()` that are arguments
+# rather than fields
+_REQUIRED_DOC_ARGS = ('id_', 'title', 'author', 'date', 'text')
+_DOC_ARGS = _REQUIRED_DOC_ARGS + ('image_url',)
+
 
 class GraphSearch:
     timeout = None
 
-    def __init__(self, server, auth_data=None, session=None, timeout=None):
+    def __init__(self, server, auth_data=None, session=None, timeout=None,
+                 transport=None):
+        """
+        :param transport: optional `pp_api.utils.TransportConfig` for
+            connection pooling and retries, e.g. shared with a PoolParty
+            client
+        """
         self.server = server
-        session = u.get_session(session, auth_data)
+        session = u.get_session(session, auth_data, transport)
         self.auth_data = auth_data
         self.session = session
         self.timeout = timeout
+        self.transport = transport
+        self._pp = None
+
+    @property
+    def pp(self):
+        """
+        PoolParty client for extraction, sharing our server and session.
+        """
+        if self._pp is None:
+            self._pp = pp_calls.PoolParty(server=self.server,
+                                          auth_data=self.auth_data,
+                                          session=self.session,
+                                          timeout=self.timeout)
+        return self._pp
 
     def raise_for_status(self, response, data=None):
         """
@@ -55,20 +84,95 @@ class GraphSearch:
         self.raise_for_status(r, data)
         return r
 
-    def clean(self, search_space_id):
+    def clean(self, search_space_id, **kwargs):
         """
-        Remove first 100000 document from GraphSearch.
+        Remove all documents from GraphSearch, see `delete_all()`.
         """
-        r = self.search(
-            count=100000,
-            search_space_id=search_space_id
-        )
-        for result in r.json()['results']:
-            id_ = result['id']
-            r2_ = self.delete(
-                id_=id_,
-                search_space_id=search_space_id
-            )
+        return self.delete_all(search_space_id, **kwargs)
+
+    def delete_all(self, search_space_id, search_filters=None, sources=None,
+                   page_size=1000, max_workers=8, max_in_flight=None,
+                   log_every=10000):
+        """
+        Delete all documents of a search space (matching `search_filters`),
+        with up to `max_workers` concurrent delete calls.
+
+        The search space is read page by page while deleting. Since deleted
+        documents drop out of the results, a page is read again after its
+        documents were deleted, and the next page is only read when the
+        current one holds no new documents (failures, or deletes not yet
+        committed). Once deletes are committed, the remaining documents
+        shift to earlier pages, so the search space is read again from the
+        start until a whole pass finds no new documents.
+
+        If `sources` are given, the documents of these sources are deleted
+        with one call per source instead, and nothing else is deleted.
+
+        :param search_space_id:
+        :param search_filters: only delete the documents matching these
+        :param sources: list of document sources
+        :param page_size: number of ids fetched per search
+        :param max_workers: number of worker threads
+        :param max_in_flight: maximum number of pending deletes
+            (defaults to `max_workers`)
+        :param log_every: log the progress every that many deletes
+        :return: dict with "deleted" (number), "failed" (dict id or source
+            -> exception) and "seconds"
+        """
+        start_time = time()
+        failed = dict()
+        if sources is not None:
+            sources = list(sources)
+            outcomes = u.map_bounded(
+                lambda source: self.delete(search_space_id, source=source),
+                sources, max_workers=max_workers, max_in_flight=max_in_flight)
+            for source, outcome in zip(sources, outcomes):
+                if isinstance(outcome, Exception):
+                    failed[source] = outcome
+            return {'deleted': len(sources) - len(failed), 'failed': failed,
+                    'seconds': time() - start_time}
+
+        def delete_one(id_):
+            self.delete(search_space_id, id_=id_)
+
+        attempted = set()
+        deleted = 0
+        start = 0
+        new_in_pass = False
+        while True:
+            r = self.search(search_space_id=search_space_id,
+                            search_filters=search_filters,
+                            count=page_size, start=start).json()
+            results = r['results']
+            ids = [x['id'] for x in results if x['id'] not in attempted]
+            if not ids:
+                if results and len(results) >= page_size:
+                    # Only documents already seen: look further down
+                    start += page_size
+                    continue
+                if not new_in_pass:
+                    break
+                # End of a pass: documents may have moved up meanwhile
+                start = 0
+                new_in_pass = False
+                continue
+            new_in_pass = True
+            attempted.update(ids)
+            total = deleted + r['total']
+            outcomes = u.map_bounded(delete_one, ids,
+                                     max_workers=max_workers,
+                                     max_in_flight=max_in_flight)
+            for id_, error in zip(ids, outcomes):
+                if error is not None:
+                    failed[id_] = error
+                    module_logger.error('Deleting {} failed: {}'.format(id_, error))
+                    continue
+                deleted += 1
+                if log_every and not deleted % log_every:
+                    module_logger.info('{} of about {} documents deleted, {:.1f} docs/sec'.format(
+                        deleted, total, deleted / (time() - start_time)))
+        return {'deleted': deleted, 'failed': failed,
+                'seconds': time() - start_time}
 
     def in_gs(self, uri, search_space_id):
         """
@@ -78,23 +182,118 @@ class GraphSearch:
         :param search_space_id:
         :return: Boolean
         """
-        id_filter = self.filter_id(id_=uri)
-        r = self.search(search_space_id=search_space_id,
-                        search_filters=id_filter)
-        return r.json()['total'] > 0
+        return uri in self.in_gs_many([uri], search_space_id)
+
+    def in_gs_many(self, uris, search_space_id, known_ids=None,
+                   batch_size=100, max_workers=4):
+        """
+        Check which of many documents are contained in GS, with one search
+        per `batch_size` uris (the identifier filters are OR-combined).
+
+        :param uris: iterable of document uris
+        :param search_space_id:
+        :param known_ids: optional container of all the ids in the search
+            space, e.g. a `pp_api.cache.BloomFilter` from `load_known_ids()`.
+            Uris not in it are taken to be absent without asking the
+            server, the others are still checked.
+        :param batch_size: number of uris per search
+        :param max_workers: number of concurrent searches
+        :return: set of the uris that are contained
+        """
+        uris = set(uris)
+        if known_ids is not None:
+            uris = {uri for uri in uris if uri in known_ids}
+        uris = sorted(uris)
+
+        def check_batch(batch):
+            search_filters = [
+                {'field': 'identifier', 'value': id_, 'optional': True}
+                for id_ in batch
+            ]
+            r = self.search(search_space_id=search_space_id,
+                            search_filters=search_filters,
+                            count=len(batch),
+                            documentFacets=[], searchFacets=[]).json()
+            if r['total'] > len(r['results']):
+                # Loose matches took the place of exact ones
+                r = self.search(search_space_id=search_space_id,
+                                search_filters=search_filters,
+                                count=r['total'],
+                                documentFacets=[], searchFacets=[]).json()
+            return {x['id'] for x in r['results']}
+
+        batches = (uris[i:i + batch_size]
+                   for i in range(0, len(uris), batch_size))
+        found = set()
+        for ids in u.map_bounded(check_batch, batches, max_workers=max_workers,
+                                 return_exceptions=False):
+            found |= ids
+        # The identifier field may match loosely; keep exact hits only
+        return found.intersection(uris)
+
+    def load_known_ids(self, search_space_id, error_rate=0.01, capacity=None,
+                       page_size=1000):
+        """
+        Read all the ids of a search space into a Bloom filter for
+        `in_gs_many(known_ids=...)`. Ids indexed later must be added
+        with `add()`.
+
+        :param search_space_id:
+        :param error_rate: false positive rate of the filter
+        :param capacity: expected number of ids (default: twice the
+            current number of documents)
+        :param page_size: number of ids per search
+        :return: `pp_api.cache.BloomFilter`
+        """
+        if capacity is None:
+            r = self.search(search_space_id=search_space_id, count=0,
+                            documentFacets=[], searchFacets=[])
+            capacity = 2 * r.json()['total']
+        known_ids = BloomFilter(capacity, error_rate=error_rate)
+        known_ids.update(
+            doc['id'] for doc in self.iter_search(search_space_id,
+                                                  page_size=page_size)
+        )
+        return known_ids
 
     def _create(self, id_, title, author, date, search_space_id,
                 text=None, update=False,
-                text_limit=True, **kwargs):
+                text_limit=True, fields=None, **kwargs):
         """
 
         :param id_: should be a URL starting from protocol (e.g. http://)
         :param title:
         :param author:
         :param date: datetime object
+        :param fields: optional dict of additional fields, also for field
+            names that clash with the arguments (e.g. "update")
         :param kwargs: any additional fields in key=value format. Fields should exist in GS.
         :return:
         """
+        suffix, data = self.get_create_data(
+            id_=id_, title=title, author=author, date=date,
+            search_space_id=search_space_id, text=text, update=update,
+            text_limit=text_limit, fields=fields, **kwargs
+        )
+        dest_url = self.server + suffix
+        r = self.session.post(
+            dest_url,
+            json=data,
+            timeout=self.timeout
+        )
+
+        self.raise_for_status(r, data)
+        return r
+
+    @staticmethod
+    def get_create_data(id_, title, author, date, search_space_id,
+                        text=None, update=False,
+                        text_limit=True, fields=None, **kwargs):
+        """
+        Prepare the url suffix and the payload of a create (or update) call.
+
+        :return: (suffix, data)
+        """
         if text_limit and len(text) > 12048:
             text = text[:12000]
             module_logger.warning('Text was too long ({} chars), has been '
@@ -112,23 +311,19 @@ class GraphSearch:
             'useExtraction': False,
             'searchSpaceId': search_space_id
         }
-        for k, v in kwargs.items():
+        for k, v in itertools.chain(kwargs.items(), (fields or {}).items()):
             if k is not None and v is not None and v != [None]:
                 data[k] = v
-        dest_url = self.server + suffix
-        r = self.session.post(
-            dest_url,
-            json=data,
-            timeout=self.timeout
-        )
+        return suffix, data
 
-        self.raise_for_status(r, data)
-        return r
+    @staticmethod
+    def get_cpt_facets(cpts):
+        """
+        Facets carrying the frequencies of the extracted concepts.
 
-    def create_with_freqs(self, id_, title, author, date, cpts, search_space_id,
-                          image_url=None,
-                          text=None, update=False,
-                          **kwargs):
+        :param cpts: concepts as returned by PoolParty.get_cpts_from_response
+        :return: dict
+        """
         cpt_uris = [x['uri'] for x in cpts]
         cpt_freqs = {
             x['uri'].split("/")[-1]: x['frequencyInDocument'] for x in cpts
@@ -139,6 +334,13 @@ class GraphSearch:
         cpt_facets.update({
             'dyn_uri_all_concepts': cpt_uris
         })
+        return cpt_facets
+
+    def create_with_freqs(self, id_, title, author, date, cpts, search_space_id,
+                          image_url=None,
+                          text=None, update=False,
+                          **kwargs):
+        cpt_facets = self.get_cpt_facets(cpts)
         return self._create(
             id_=id_, title=title, author=author, date=date,
             text=text, facets=cpt_facets,
@@ -152,7 +354,7 @@ class GraphSearch:
                            image_url=None,
                            text_to_extract=None,
                            update=False,
-                           lang='en', **kwargs):
+                           lang='en', fields=None, **kwargs):
         """
         Extract concepts from the text and create corresponding document with
         concept frequencies.
@@ -163,9 +365,11 @@ class GraphSearch:
         :param author:
         :param date:
         :param text:
+        :param fields: optional dict of additional fields of the document,
+            see `_create()`
         :return:
         """
-        pp = pp_calls.PoolParty(server=self.server, auth_data=self.auth_data)
+        pp = self.pp
         if text_to_extract is None:
             text_to_extract = text
         r = pp.extract(
@@ -176,7 +380,7 @@ class GraphSearch:
             id_=id_, title=title, author=author,
             date=date, text=text, cpts=cpts, update=update,
             search_space_id=search_space_id, image_url=image_url,
-            language=lang,
+            language=lang, fields=fields,
             **kwargs
         )
         return cpts
@@ -184,6 +388,98 @@ class GraphSearch:
     def extract_and_update(self, *args, **kwargs):
         return self.extract_and_create(*args, update=True, **kwargs)
 
+    def bulk_create(self, docs, search_space_id, pid=None, update=False,
+                    lang='en', max_workers=8, max_in_flight=None,
+                    log_every=1000):
+        """
+        Create (or update) many documents concurrently, sharing one session.
+
+        Each document is a dict with id_, title, author, date, text, and
+        optionally cpts, image_url and text_to_extract, as for
+        `create_with_freqs()`. Any other keys are fields of the document,
+        even if named like an argument (e.g. "update"). Documents without
+        "cpts" are run through the extractor of project `pid` first (see
+        `extract_and_create()`; "text_to_extract" is honoured), or are
+        created without concepts if `pid` is None.
+
+        :param docs: iterable of dicts
+        :param search_space_id:
+        :param pid: project id for extraction
+        :param update: update instead of create
+        :param lang: language for extraction
+        :param max_workers: number of worker threads
+        :param max_in_flight: maximum number of documents in process
+            (defaults to `max_workers`)
+        :param log_every: log the progress every that many documents
+        :return: dict with "results" (list of (id_, exception or None) in
+            input order), "succeeded", "failed", "seconds", "docs_per_sec"
+        :raises ValueError: if a document lacks one of id_, title, author,
+            date and text. A sequence of documents is checked before any
+            is indexed, other iterables when the document is reached.
+        """
+        def index_one(doc):
+            fields = dict(doc)
+            args = {name: fields.pop(name) for name in _DOC_ARGS
+                    if name in fields}
+            text_to_extract = fields.pop('text_to_extract', None)
+            if 'cpts' in fields:
+                self.create_with_freqs(cpts=fields.pop('cpts'),
+                                       search_space_id=search_space_id,
+                                       update=update, fields=fields, **args)
+            elif pid is not None:
+                self.extract_and_create(pid=pid, search_space_id=search_space_id,
+                                        update=update, lang=lang,
+                                        text_to_extract=text_to_extract,
+                                        fields=fields, **args)
+            else:
+                image_url = args.pop('image_url', None)
+                self._create(search_space_id=search_space_id, update=update,
+                             dyn_txt_imageUrl=[image_url], fields=fields,
+                             **args)
+
+        # Keep the ids only, the documents may be large. The documents are
+        # consumed in order, by this thread.
+        ids = []
+
+        def check(i, doc):
+            missing = [name for name in _REQUIRED_DOC_ARGS if name not in doc]
+            if missing:
+                raise ValueError('Document {} has no {}'.format(
+                    i, ', '.join(missing)))
+
+        if isinstance(docs, Sequence):
+            for i, doc in enumerate(docs):
+                check(i, doc)
+
+        def tracked(docs):
+            for i, doc in enumerate(docs):
+                check(i, doc)
+                ids.append(doc['id_'])
+                yield doc
+
+        start = time()
+        results = []
+        failed = 0
+        outcomes = u.map_bounded(index_one, tracked(docs),
+                                 max_workers=max_workers,
+                                 max_in_flight=max_in_flight)
+        for i, error in enumerate(outcomes, 1):
+            if error is not None:
+                failed += 1
+                module_logger.error('Indexing {} failed: {}'.format(ids[i - 1], error))
+            results.append((ids[i - 1], error))
+            if log_every and not i % log_every:
+                module_logger.info('{} documents indexed, {} failed, {:.1f} docs/sec'.format(
+                    i, failed, i / (time() - start)))
+        seconds = time() - start
+        return {
+            'results': results,
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'seconds': seconds,
+            'docs_per_sec': len(results) / seconds if seconds else 0.,
+        }
+
     def search(self, search_space_id,
                search_filters=None, locale='en', count=10000,
                **kwargs):
@@ -198,6 +494,92 @@ class GraphSearch:
         :return: results as returned by GS API call
         """
         suffix = '/GraphSearch/api/search'
+        data = self.get_search_data(search_space_id, search_filters=search_filters,
+                                    locale=locale, count=count, **kwargs)
+        dest_url = self.server + suffix
+        r = self.session.post(
+            dest_url,
+            json=data,
+            timeout=self.timeout
+        )
+
+        self.raise_for_status(r, data)
+        return r
+
+    def iter_search(self, search_space_id, search_filters=None, locale='en',
+                    page_size=100, prefetch=True, document_facets=(),
+                    search_facets=(), start=0, pages=False, **kwargs):
+        """
+        Page through the results of a search, yielding the documents lazily,
+        so that only a few pages are held in memory at any time.
+
+            for doc in gs.iter_search(space_id, document_facets=['all']):
+                ...
+
+        Unlike `search()`, no facets are requested by default: per-document
+        facets only if listed in `document_facets`, and the aggregated
+        `search_facets` are computed for every page, so they are best
+        requested once with `search()`.
+
+        :param search_space_id: ID of search space from GS admin->configuration
+        :param search_filters: the filters (usually prepared by other methods of GS
+        :param locale: language (default: 'en')
+        :param page_size: number of documents per request
+        :param prefetch: If true, the next page is requested in the
+            background while the current one is consumed.
+        :param document_facets: facets to include in the documents, e.g.
+            ['all'] or a list of field names
+        :param search_facets: list of aggregated facets, e.g.
+            [{'field': 'dyn_uri_all_concepts'}]
+        :param start: index of the first document
+        :param pages: If true, yield the parsed responses instead of the
+            single documents.
+        :param kwargs: other parameters of the search call
+        :return: generator of documents (dicts from "results")
+        """
+        data = self.get_search_data(search_space_id,
+                                    search_filters=search_filters,
+                                    locale=locale, count=page_size,
+                                    documentFacets=list(document_facets),
+                                    searchFacets=list(search_facets),
+                                    **kwargs)
+
+        def get_page(page_start):
+            params = dict(data, start=page_start)
+            r = self.session.post(self.server + '/GraphSearch/api/search',
+                                  json=params,
+                                  timeout=self.timeout)
+            self.raise_for_status(r, params)
+            return page_start, r.json()
+
+        page_iter = u.map_bounded(get_page, itertools.count(start, page_size),
+                                  max_workers=2 if prefetch else 1,
+                                  return_exceptions=False)
+        try:
+            for page_start, page in page_iter:
+                results = page.get('results') or []
+                if not results:
+                    break
+                if pages:
+                    yield page
+                else:
+                    yield from results
+                if (len(results) < page_size or
+                        page_start + len(results) >= page.get('total', float('inf'))):
+                    break
+        finally:
+            # Discards the prefetched page
+            page_iter.close()
+
+    @staticmethod
+    def get_search_data(search_space_id,
+                        search_filters=None, locale='en', count=10000,
+                        **kwargs):
+        """
+        Prepare the payload of a search call, see `search()`.
+
+        :return: dict
+        """
         data = {
             'searchSpaceId': search_space_id,
             'locale': locale,
@@ -209,15 +591,7 @@ class GraphSearch:
             data.update({'searchFilters': search_filters})
         if kwargs:
             data.update(**kwargs)
-        dest_url = self.server + suffix
-        r = self.session.post(
-            dest_url,
-            json=data,
-            timeout=self.timeout
-        )
-
-        self.raise_for_status(r, data)
-        return r
+        return data
 
     @staticmethod
     def filter_full_text(query_str):
@@ -0,0 +1,142 @@
+"""
+Keep client-side thesaurus data fresh by following the project history.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+module_logger = logging.getLogger(__name__)
+
+
+# Keys of a history event holding the uri of an affected resource: the
+# changed resource, and both ends of a changed relation. Values such as
+# oldValue/newValue are left out, they may be literals.
+EVENT_URI_KEYS = ('affectedResource', 'sourceConcept', 'targetConcept')
+
+
+def get_event_uris(event):
+    """
+    Collect the uris of the resources touched by one history event, as
+    returned by `PoolParty.get_history()`.
+
+    :param event: dict
+    :return: set of uris
+    """
+    uris = set()
+    for key in EVENT_URI_KEYS:
+        value = event.get(key)
+        if isinstance(value, dict):
+            value = value.get('uri')
+        if isinstance(value, str) and value.startswith(('http://', 'https://')):
+            uris.add(value)
+    return uris
+
+
+def get_event_time(event):
+    """
+    :param event: dict with a "timestamp" (ISO 8601, or milliseconds since
+        the epoch)
+    :return: timezone-aware datetime in UTC (naive timestamps are taken
+        to be UTC), None if there is none
+    """
+    value = event.get('timestamp')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    if not isinstance(value, str):
+        return None
+    try:
+        time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if time.tzinfo is None:
+        return time.replace(tzinfo=timezone.utc)
+    return time.astimezone(timezone.utc)
+
+
+class HistoryInvalidator:
+    """
+    Poll the history of a project and invalidate the client-side data of
+    the changed concepts only, so that caches can use long TTLs.
+
+    Targets are objects with a method `invalidate_uris(pid, uris)`, e.g.
+    a `PoolParty` client with a cache. By default the client used for
+    polling is the only target.
+
+        invalidator = HistoryInvalidator(pp, pid, interval=10)
+        invalidator.start()
+    """
+
+    def __init__(self, pp, pid, targets=None, interval=30, since=None,
+                 overlap=5):
+        """
+        :param pp: PoolParty client used to poll the history
+        :param pid: id of project
+        :param targets: objects to invalidate (default: [pp])
+        :param interval: seconds between two polls of `start()`
+        :param since: datetime of the last change already reflected in the
+            targets, naive datetimes are taken to be UTC (default: now)
+        :param overlap: seconds by which successive polls overlap, to be
+            robust against clock skew between us and the server
+        """
+        self.pp = pp
+        self.pid = pid
+        self.targets = [pp] if targets is None else list(targets)
+        self.interval = interval
+        if since is None:
+            since = datetime.now(timezone.utc)
+        elif since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        self.last_seen = since
+        self.overlap = timedelta(seconds=overlap)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Fetch the history events since the last poll and invalidate the
+        affected uris in all targets.
+
+        The next poll starts at the newest event returned (less
+        `overlap`), so that it does not depend on our clock. Without event
+        times, it starts at the time this poll started.
+
+        :return: set of invalidated uris
+        """
+        started = datetime.now(timezone.utc)
+        events = self.pp.get_history(self.pid, from_=self.last_seen - self.overlap)
+        uris = set()
+        for event in events:
+            uris |= get_event_uris(event)
+        if uris:
+            module_logger.debug('{} history events, invalidating {} uris'.format(
+                len(events), len(uris)))
+            for target in self.targets:
+                target.invalidate_uris(self.pid, uris)
+        times = [t for t in map(get_event_time, events) if t is not None]
+        self.last_seen = max(self.last_seen, max(times) if times else started)
+        return uris
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                module_logger.exception('Polling the history of {} failed'.format(
+                    self.pid))
+
+    def start(self):
+        """
+        Poll every `interval` seconds in a daemon thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,298 @@
+"""
+In-process concept extraction from a project export, without calls to the
+PoolParty extractor.
+
+The labels of the concepts are compiled into an Aho-Corasick automaton per
+language, so a text is annotated in one pass regardless of the size of
+the thesaurus. Results have the shape of
+`pp_api.PoolParty.get_cpts_from_response()`.
+"""
+from collections import defaultdict, deque
+
+import rdflib
+from rdflib.namespace import RDF, SKOS, DCTERMS
+
+
+LABEL_PROPERTIES = (SKOS.prefLabel, SKOS.altLabel, SKOS.hiddenLabel)
+
+
+def _lower(text):
+    """
+    Lowercase `text` without changing its length, so offsets stay valid.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+class LabelAutomaton:
+    """
+    Aho-Corasick automaton over lowercased labels. Every state is an index
+    into the parallel lists `goto` (dict: char -> state), `fail` and
+    `output` (ids of the labels ending in this state).
+    """
+
+    def __init__(self, labels):
+        """
+        :param labels: list of label strings; matches report list indexes
+        """
+        labels = [_lower(label) for label in labels]
+        self.lengths = [len(label) for label in labels]
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for label_id, label in enumerate(labels):
+            if not label:
+                continue
+            state = 0
+            for char in label:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(label_id)
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                if self.fail[nxt] == nxt:
+                    self.fail[nxt] = 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+        # Tuples of ints (unlike lists) are not tracked by the garbage
+        # collector, which otherwise rescans the whole automaton regularly
+        self.output = [tuple(out) for out in self.output]
+
+    def iter_matches(self, text):
+        """
+        Yield (start, end, label_id) for every occurrence of a label in
+        `text` (lowercased, `end` exclusive), including overlapping ones.
+        """
+        goto, fail, output, lengths = self.goto, self.fail, self.output, self.lengths
+        state = 0
+        for i, char in enumerate(text, 1):
+            nxt = goto[state].get(char)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(char)
+            # The root is never a transition target, so 0 means no match
+            state = nxt or 0
+            if output[state]:
+                for label_id in output[state]:
+                    yield i - lengths[label_id], i, label_id
+
+
+def _word_boundaries(text):
+    """
+    :return: list of flags: is there a word boundary before position i?
+        (with one entry for the end of `text`)
+    """
+    alnum = [c.isalnum() for c in text]
+    return ([True]
+            + [not (a and b) for a, b in zip(alnum, alnum[1:])]
+            + [True])
+
+
+class LocalExtractor:
+    """
+    Annotate texts with the concepts of a thesaurus held in memory.
+
+        extractor = LocalExtractor.from_pp(pp, pid)
+        cpts = extractor.extract(text)
+
+    Compared to the PoolParty extractor there is no lemmatization and no
+    relevance scoring: labels match case-insensitively at word boundaries,
+    and "score" is left empty, like other missing attributes.
+    """
+
+    def __init__(self, graph, lang='en'):
+        """
+        :param graph: rdflib.Graph with the SKOS data of the project
+        :param lang: default language of `extract()`
+        """
+        self.lang = lang
+        self.concepts = sorted(set(graph.subjects(RDF.type, SKOS.Concept)))
+        self._labels = defaultdict(list)  # lang -> [(label, concept, property)]
+        self._pref_labels = defaultdict(dict)  # concept -> {lang: label}
+        for cpt in self.concepts:
+            for prop in LABEL_PROPERTIES:
+                for label in graph.objects(cpt, prop):
+                    self._labels[label.language].append((str(label), cpt, prop))
+                    if prop == SKOS.prefLabel:
+                        self._pref_labels[cpt][label.language] = str(label)
+
+        broaders = defaultdict(set)
+        for cpt, broader in graph.subject_objects(SKOS.broader):
+            broaders[cpt].add(broader)
+        for broader, cpt in graph.subject_objects(SKOS.narrower):
+            broaders[cpt].add(broader)
+        related = defaultdict(set)
+        for a, b in graph.subject_objects(SKOS.related):
+            related[a].add(b)
+            related[b].add(a)
+        schemes = defaultdict(set)
+        top_concepts = set()
+        for prop in (SKOS.inScheme, SKOS.topConceptOf):
+            for cpt, scheme in graph.subject_objects(prop):
+                schemes[cpt].add(scheme)
+        for cpt, scheme in graph.subject_objects(SKOS.topConceptOf):
+            top_concepts.add(cpt)
+        for scheme, cpt in graph.subject_objects(SKOS.hasTopConcept):
+            schemes[cpt].add(scheme)
+            top_concepts.add(cpt)
+        scheme_titles = {
+            scheme: str(graph.value(scheme, DCTERMS.title)
+                        or graph.value(scheme, SKOS.prefLabel) or '')
+            for scheme in set().union(*schemes.values())
+        }
+
+        self._info = dict()
+        for cpt in self.concepts:
+            ancestors = self._ancestors(cpt, broaders)
+            # Concepts belong to the schemes of their broaders as well
+            cpt_schemes = schemes[cpt].union(*(schemes[x] for x in ancestors))
+            self._info[cpt] = {
+                'transitiveBroaderConcepts': [str(x) for x in sorted(ancestors)],
+                'transitiveBroaderTopConcepts': [
+                    str(x) for x in sorted(ancestors) if x in top_concepts
+                ],
+                'relatedConcepts': [str(x) for x in sorted(related[cpt])],
+                'conceptSchemes': [
+                    {'uri': str(x), 'title': scheme_titles[x]}
+                    for x in sorted(cpt_schemes)
+                ],
+            }
+        self._automata = dict()
+
+    @staticmethod
+    def _ancestors(cpt, broaders):
+        seen = set()
+        stack = list(broaders[cpt])
+        while stack:
+            x = stack.pop()
+            if x not in seen:
+                seen.add(x)
+                stack.extend(broaders[x])
+        seen.discard(cpt)
+        return seen
+
+    @classmethod
+    def from_export(cls, data, lang='en', format='n3'):
+        """
+        :param data: project export as returned by `PoolParty.export_project()`
+        :param lang: default language of `extract()`
+        :param format: rdflib format of `data`
+        """
+        graph = rdflib.Graph()
+        graph.parse(data=data, format=format)
+        return cls(graph, lang=lang)
+
+    @classmethod
+    def from_pp(cls, pp, pid, lang=None):
+        """
+        Export the project `pid` and build an extractor from it.
+        """
+        lang = pp.lang if lang is None else lang
+        return cls.from_export(pp.export_project(pid), lang=lang)
+
+    def _get_automaton(self, lang):
+        if lang not in self._automata:
+            # Labels without language tag are used for every language
+            entries = []
+            seen = set()
+            for entry in self._labels[lang] + (self._labels[None] if lang else []):
+                # Labels of a concept equal up to case would match the
+                # same spans: keep the first one (prefLabels come first)
+                key = (_lower(entry[0]), entry[1])
+                if key not in seen:
+                    seen.add(key)
+                    entries.append(entry)
+            automaton = LabelAutomaton([label for label, _, _ in entries])
+            self._automata[lang] = (automaton, entries)
+        return self._automata[lang]
+
+    def extract(self, text, lang=None, filter_nested=True):
+        """
+        Find the concepts whose labels occur in `text`.
+
+        :param text: text
+        :param lang: language of the labels to match
+        :param filter_nested: If true, drop matches contained in a longer
+            match (like the filterNestedConcepts option of the extractor).
+        :return: list of concept dicts as returned by
+            `PoolParty.get_cpts_from_response()`
+        """
+        lang = self.lang if lang is None else lang
+        automaton, entries = self._get_automaton(lang)
+        boundary = _word_boundaries(text)
+        matches = [
+            (start, end, label_id)
+            for start, end, label_id in automaton.iter_matches(_lower(text))
+            if boundary[start] and boundary[end]
+        ]
+        if filter_nested:
+            matches = self._filter_nested(matches)
+
+        # concept -> (label, matched text) -> positions
+        found = defaultdict(lambda: defaultdict(list))
+        for start, end, label_id in matches:
+            label, cpt, _ = entries[label_id]
+            found[cpt][(label, text[start:end])].append((start, end))
+
+        extr_cpts = []
+        for cpt, matchings in found.items():
+            pref_labels = self._pref_labels[cpt]
+            cpt_dict = {
+                'prefLabel': pref_labels.get(lang) or next(iter(pref_labels.values()), []),
+                'prefLabels': dict(pref_labels),
+                'frequencyInDocument': sum(len(p) for p in matchings.values()),
+                'uri': str(cpt),
+                'score': [],
+            }
+            # Copies, so callers may modify the results
+            info = self._info[cpt]
+            cpt_dict['transitiveBroaderConcepts'] = list(info['transitiveBroaderConcepts'])
+            cpt_dict['transitiveBroaderTopConcepts'] = list(info['transitiveBroaderTopConcepts'])
+            cpt_dict['relatedConcepts'] = list(info['relatedConcepts'])
+            cpt_dict['conceptSchemes'] = [dict(x) for x in info['conceptSchemes']]
+            cpt_dict['matchings'] = [
+                {
+                    'lemma': label,
+                    'text': matched_text,
+                    'frequency': len(positions),
+                    'positions': positions,
+                }
+                for (label, matched_text), positions in matchings.items()
+            ]
+            extr_cpts.append(cpt_dict)
+        extr_cpts.sort(key=lambda x: -x['frequencyInDocument'])
+        return extr_cpts
+
+    @staticmethod
+    def _filter_nested(matches):
+        """
+        Remove matches lying within a longer match; matches with identical
+        spans (ambiguous labels) are all kept.
+        """
+        matches = sorted(matches, key=lambda m: (m[0], -m[1]))
+        kept = []
+        cover_start, cover_end = -1, -1
+        for start, end, label_id in matches:
+            if end <= cover_end and (start, end) != (cover_start, cover_end):
+                continue
+            if end > cover_end:
+                cover_start, cover_end = start, end
+            kept.append((start, end, label_id))
+        return kept
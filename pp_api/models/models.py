@@ -1,3 +1,5 @@
+import sys
+from array import array
 from dataclasses import dataclass, field, asdict
 from typing import Dict, Any, List
 
@@ -30,3 +32,139 @@ class PoolPartyProject:
     def to_dict(self) -> Dict[str, Any]:
         return {k: v for k, v in asdict(self).items() if v}
 
+
+# Keys of the dict forms of ConceptMatching and ExtractedConcept (besides
+# the optional "matchings")
+_MATCHING_KEYS = ('lemma', 'text', 'frequency', 'positions')
+_CONCEPT_KEYS = ('prefLabel', 'prefLabels', 'frequencyInDocument', 'uri',
+                 'score', 'transitiveBroaderConcepts',
+                 'transitiveBroaderTopConcepts', 'relatedConcepts',
+                 'conceptSchemes')
+
+
+class _SlotMapping:
+    """
+    Read-only dict-style access to the attributes of a __slots__ class, so
+    instances can be used where the dicts of get_cpts_from_response()
+    were expected (`obj['uri']`, `'matchings' in obj`, `**obj`).
+    """
+    __slots__ = ()
+    # Keys of the dict form, set by the subclasses
+    _keys = ()
+    _key_set = frozenset()
+
+    def keys(self):
+        return list(self._keys)
+
+    def _has_key(self, key):
+        return key in self._key_set
+
+    def __getitem__(self, key):
+        if not self._has_key(key):
+            raise KeyError(key)
+        value = getattr(self, key)
+        # Missing attributes are filled with empty lists in the dict form
+        return [] if value is None else value
+
+    def __contains__(self, key):
+        return self._has_key(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class ConceptMatching(_SlotMapping):
+    """
+    One matched text of a concept. The positions are stored as a flat
+    array of (start, end) offsets.
+    """
+    __slots__ = ('lemma', 'text', 'frequency', '_positions')
+    _keys = _MATCHING_KEYS
+    _key_set = frozenset(_MATCHING_KEYS)
+
+    def __init__(self, lemma, text, frequency, positions):
+        self.lemma = sys.intern(lemma)
+        self.text = sys.intern(text)
+        self.frequency = frequency
+        self._positions = array('l', [x for pos in positions for x in pos])
+
+    @property
+    def positions(self):
+        flat = self._positions
+        return list(zip(flat[::2], flat[1::2]))
+
+    def to_dict(self):
+        return {
+            'lemma': self.lemma,
+            'text': self.text,
+            'frequency': self.frequency,
+            'positions': self.positions,
+        }
+
+
+class ExtractedConcept(_SlotMapping):
+    """
+    Compact form of a concept found by the extractor, see
+    PoolParty.get_cpts_from_response(..., compact=True). Uris are interned,
+    so repeated concepts across documents share one string.
+    """
+    __slots__ = _CONCEPT_KEYS + ('matchings',)
+    _keys = _CONCEPT_KEYS
+    _key_set = frozenset(_CONCEPT_KEYS)
+
+    def __init__(self, **kwargs):
+        for attr in self.__slots__:
+            setattr(self, attr, kwargs.get(attr))
+        self.uri = sys.intern(self.uri)
+        for attr in ('transitiveBroaderConcepts',
+                     'transitiveBroaderTopConcepts', 'relatedConcepts'):
+            value = getattr(self, attr)
+            if value is not None:
+                setattr(self, attr, tuple(sys.intern(x) for x in value))
+
+    def keys(self):
+        # Like the dicts, "matchings" only exists if the extractor sent them
+        keys = list(_CONCEPT_KEYS)
+        if self.matchings is not None:
+            keys.append('matchings')
+        return keys
+
+    def _has_key(self, key):
+        return key in self._key_set or (key == 'matchings' and
+                                        self.matchings is not None)
+
+    @classmethod
+    def from_json(cls, cpt_json):
+        """
+        :param cpt_json: one element of "concepts" in an extractor response
+        """
+        kwargs = {attr: cpt_json.get(attr) for attr in _CONCEPT_KEYS}
+        if 'matchingLabels' in cpt_json:
+            kwargs['matchings'] = tuple(
+                ConceptMatching(
+                    lemma=x['label'],
+                    text=m['matchedText'],
+                    frequency=m['frequency'],
+                    positions=[(p['beginningIndex'], p['endIndex'] + 1)
+                               for p in m['positions']]
+                )
+                for x in cpt_json['matchingLabels']
+                for m in x['matchedTexts']
+            )
+        return cls(**kwargs)
+
+    def to_dict(self):
+        """
+        :return: the dict form returned by get_cpts_from_response()
+        """
+        cpt = dict()
+        for attr in _CONCEPT_KEYS:
+            value = getattr(self, attr)
+            cpt[attr] = [] if value is None else (
+                list(value) if isinstance(value, tuple) else value)
+        if self.matchings is not None:
+            cpt['matchings'] = [m.to_dict() for m in self.matchings]
+        return cpt
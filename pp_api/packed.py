@@ -0,0 +1,246 @@
+"""
+Single-file binary format for read-only data such as thesaurus snapshots
+and cooccurrence matrices, meant to be opened with `mmap`.
+
+A packed file is the magic bytes, the length of a JSON header, the header
+and then the arrays, each aligned to `ALIGNMENT` bytes. Reading it maps
+the file and wraps the arrays in zero-copy NumPy views, so the operating
+system shares the pages between all processes opening the same file and
+opening it costs hardly more than reading the header.
+
+    write_packed('data.pack', {'ids': ids, 'uris': uris}, meta={'pid': pid})
+    arrays, meta = read_packed('data.pack')
+"""
+import bisect
+import hashlib
+import json
+import os
+import struct
+from mmap import ACCESS_READ, mmap as _mmap
+
+import numpy as np
+
+
+MAGIC = b'PPAPACK\x01'
+ALIGNMENT = 64
+_HEADER_LENGTH = struct.Struct('<Q')
+
+
+class StringTable:
+    """
+    Immutable sequence of strings stored as utf-8 in one byte array, with
+    the start of every string in `offsets` (plus the end of the last one).
+    Works with `bisect` if the strings are sorted.
+    """
+
+    def __init__(self, data, offsets):
+        """
+        :param data: uint8 array
+        :param offsets: int64 array of len(self) + 1 offsets into `data`
+        """
+        self.data = data
+        self.offsets = offsets
+        # Indexing memoryviews is much faster than indexing NumPy arrays
+        self._data = memoryview(np.ascontiguousarray(data, dtype=np.uint8))
+        self._offsets = memoryview(np.ascontiguousarray(offsets, dtype=np.int64))
+        self._len = len(offsets) - 1
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [x.encode('utf-8') for x in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class StringIndex:
+    """
+    Read-only mapping string -> position in a `StringTable`, backed by
+    arrays that can be packed with it instead of a dict: the 64 bit
+    blake2b hashes of the strings in sorted order and the positions of
+    the strings in that order. A lookup is a binary search of the hash and
+    a comparison of the string.
+    """
+
+    def __init__(self, strings, hashes, order):
+        """
+        Use `build()` unless `hashes` and `order` were saved.
+
+        :param strings: StringTable or list of strings
+        :param hashes: sorted uint64 array of `string_hash()` of `strings`
+        :param order: int64 array of the positions of the strings of `hashes`
+        """
+        self.strings = strings
+        self.hashes = hashes
+        self.order = order
+        # bisect and indexing are much faster on memoryviews
+        self._hashes = memoryview(np.ascontiguousarray(hashes, dtype=np.uint64))
+        self._order = memoryview(np.ascontiguousarray(order, dtype=np.int64))
+
+    @classmethod
+    def build(cls, strings):
+        hashes = np.array([string_hash(x) for x in strings], dtype=np.uint64)
+        order = np.argsort(hashes, kind='stable')
+        return cls(strings, hashes[order], order)
+
+    def get(self, key, default=None):
+        h = string_hash(key)
+        hashes, order = self._hashes, self._order
+        pos = bisect.bisect_left(hashes, h)
+        while pos < len(hashes) and hashes[pos] == h:
+            if self.strings[order[pos]] == key:
+                return order[pos]
+            pos += 1
+        return default
+
+    def get_many(self, keys, default=-1):
+        """
+        :return: int64 array of the positions of `keys`, `default` for
+            unknown keys
+        """
+        keys = list(keys)
+        result = np.full(len(keys), default, dtype=np.int64)
+        if not len(self.hashes):
+            return result
+        hashes = np.array([string_hash(x) for x in keys], dtype=np.uint64)
+        found = np.searchsorted(self.hashes, hashes)
+        candidates = self.order[np.minimum(found, len(self.order) - 1)].tolist()
+        strings = self.strings
+        for i, (key, pos) in enumerate(zip(keys, candidates)):
+            if strings[pos] == key:
+                result[i] = pos
+            else:
+                # Unknown or a hash collision
+                pos = self.get(key)
+                if pos is not None:
+                    result[i] = pos
+        return result
+
+    def __getitem__(self, key):
+        pos = self.get(key)
+        if pos is None:
+            raise KeyError(key)
+        return pos
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def string_hash(string):
+    """
+    Hash of `string` that, unlike `hash()`, is the same in every process.
+
+    :return: int < 2 ** 64
+    """
+    return int.from_bytes(
+        hashlib.blake2b(string.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _aligned(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def write_packed(path, arrays, meta=None):
+    """
+    Write a packed file. The file is written next to `path` and then
+    renamed, so that processes opening `path` never see a partial file.
+
+    :param arrays: dict name -> NumPy array, `StringTable` or list of
+        strings
+    :param meta: JSON serializable data to store along
+    """
+    entries = dict()
+    blobs = []
+    offset = 0
+    for name, value in arrays.items():
+        if isinstance(value, np.ndarray):
+            kind, parts = 'array', [value]
+        else:
+            if not isinstance(value, StringTable):
+                value = StringTable.from_strings(value)
+            kind, parts = 'strings', [value.data, value.offsets]
+        specs = []
+        for part in parts:
+            part = np.ascontiguousarray(part)
+            if part.dtype.hasobject:
+                raise TypeError('Cannot pack object array {}'.format(name))
+            specs.append({'dtype': part.dtype.str, 'shape': list(part.shape),
+                          'offset': offset})
+            blobs.append((offset, part))
+            offset = _aligned(offset + part.nbytes)
+        entries[name] = {'kind': kind, 'parts': specs}
+    header = json.dumps({'meta': meta, 'arrays': entries}).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + _HEADER_LENGTH.size + len(header))
+
+    tmp_path = '{}.tmp{}'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for blob_offset, part in blobs:
+                f.seek(data_start + blob_offset)
+                f.write(part.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_packed(path, mmap=True):
+    """
+    Open a packed file written by `write_packed()`.
+
+    :param mmap: If true, map the file into memory, otherwise read it.
+        Either way, the arrays are read-only views of the file contents.
+    :return: (arrays, meta) with arrays a dict name -> NumPy array or
+        `StringTable`
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a packed file: {}'.format(path))
+        if mmap:
+            buffer = _mmap(f.fileno(), 0, access=ACCESS_READ)
+        else:
+            f.seek(0)
+            buffer = f.read()
+    start = len(MAGIC)
+    header_length, = _HEADER_LENGTH.unpack_from(buffer, start)
+    start += _HEADER_LENGTH.size
+    header = json.loads(bytes(buffer[start:start + header_length]).decode('utf-8'))
+    data_start = _aligned(start + header_length)
+
+    def view(spec):
+        dtype = np.dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        count = int(np.prod(shape, dtype=np.int64))
+        if not count:
+            return np.zeros(shape, dtype=dtype)
+        return np.frombuffer(buffer, dtype=dtype, count=count,
+                             offset=data_start + spec['offset']).reshape(shape)
+
+    arrays = dict()
+    for name, entry in header['arrays'].items():
+        parts = [view(spec) for spec in entry['parts']]
+        arrays[name] = StringTable(*parts) if entry['kind'] == 'strings' else parts[0]
+    return arrays, header['meta']
@@ -1,4 +1,7 @@
+import contextlib
+import copy
 import dataclasses
+import itertools
 import os
 import uuid
 
@@ -6,38 +9,103 @@ import rdflib.util
 import requests
 from urllib3.util import Retry
 from requests.adapters import HTTPAdapter
-import tempfile
 import logging
 import traceback
 from time import time
-from pp_api.models.models import PoolPartyProject
+from datetime import timezone
+from pp_api.models.models import PoolPartyProject, ExtractedConcept
 
 module_logger = logging.getLogger(__name__)
 
+# Number of pages of corpus management results that are fetched concurrently
+PAGE_WINDOW = 4
+
 
 from pp_api import utils as _utils
 
 
 class PoolParty:
 
-    def __init__(self, server, auth_data=None, session=None, max_retries=None, timeout=None, lang="en", auth_type="basic_auth"):
+    def __init__(self, server, auth_data=None, session=None, max_retries=None, timeout=None, lang="en", auth_type="basic_auth",
+                 cache=None, transport=None):
+        """
+        :param transport: optional `pp_api.utils.TransportConfig` for
+            connection pooling and retries, e.g. shared with a GraphSearch
+            client. `max_retries` overrides its number of retries for
+            `server`, keeping its connection pools.
+        :param cache: optional `pp_api.cache` object to keep thesaurus
+            metadata (prefLabels, concept info, paths, schemes, narrowers)
+            client-side. Writes through this client invalidate the affected
+            entries; use `invalidate_uris()` for changes made elsewhere.
+        """
         self.auth_data = auth_data
         if server.endswith("/"):
             server = server[:-1]
         self.server = server
         if auth_type == "basic_auth":
-            self.session = _utils.get_session(session, auth_data)
+            self.session = _utils.get_session(session, auth_data, transport)
         elif auth_type == "oauth2":
             self.session = _utils.get_oauth_session(session, auth_data)
+            if transport is not None:
+                transport.configure(self.session)
         else:
             raise NotImplementedError
-        if max_retries is not None:
+        self.transport = transport
+        if max_retries is not None and transport is not None:
+            self.session.mount(self.server, transport.retry_adapter(max_retries))
+        elif max_retries is not None:
             retries = Retry(total=max_retries,
                             backoff_factor=0.3,
                             status_forcelist=[500, 502, 503, 504])
             self.session.mount(self.server, HTTPAdapter(max_retries=retries))
         self.timeout = timeout
         self.lang=lang
+        self.cache = cache
+
+    # Cached calls whose results depend on other concepts than the ones
+    # in their key (the hierarchy, labels of broaders)
+    STRUCTURAL_CALLS = ('get_cpt_path', 'get_cpt_narrowers', 'get_schemes')
+
+    def _cached(self, key, fetch):
+        """
+        Return the value of `key` from `self.cache`, calling `fetch()` on a
+        miss. Keys are tuples (method name, pid, tuple of uris, ...). The
+        caller gets a copy, so changing it leaves the cache intact.
+        """
+        if self.cache is None:
+            return fetch()
+        return copy.deepcopy(self.cache.get_or_set(key, fetch))
+
+    @staticmethod
+    def _uris_key(uris):
+        if isinstance(uris, str):
+            return (uris,)
+        return tuple(str(uri) for uri in uris)
+
+    def invalidate_uris(self, pid, uris=None):
+        """
+        Remove cached data of project `pid` that may be affected by a change
+        of the concepts `uris`: the entries about these concepts and all
+        hierarchy-dependent entries (paths, narrowers, schemes).
+
+        :param pid: id of project
+        :param uris: changed concept uris; if None, drop everything of `pid`
+        :return: number of removed entries
+        """
+        if self.cache is None:
+            return 0
+        if uris is not None:
+            uris = set(self._uris_key(uris))
+
+        def is_stale(key):
+            method, key_pid, key_uris = key[:3]
+            if key_pid != pid:
+                return False
+            if uris is None or method in self.STRUCTURAL_CALLS:
+                return True
+            return not uris.isdisjoint(key_uris)
+
+        return self.cache.invalidate_where(is_stale)
 
     def extract(self, text, pid=None, lang=None, **kwargs):
         """
@@ -57,10 +125,40 @@ class PoolParty:
         :return: response object
         """
         lang = self.lang if lang == None else lang
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, mode='w+b')
-        tmp_file.write(str(text).encode('utf8'))
-        tmp_file.seek(0)
-        return self.extract_from_file(tmp_file, pid, lang=lang, **kwargs)
+        return self.extract_from_bytes(str(text).encode('utf8'), pid,
+                                       lang=lang, **kwargs)
+
+    def extract_many(self, texts, pid=None, lang=None, max_workers=8,
+                     max_in_flight=None, return_exceptions=True, **kwargs):
+        """
+        Make extract calls for many texts concurrently, using a pool of
+        threads that share this object's session.
+
+        :param texts: iterable of texts
+        :param pid: id of project
+        :param lang: language
+        :param max_workers: number of worker threads
+        :param max_in_flight: maximum number of concurrent requests to the
+            extractor (defaults to `max_workers`)
+        :param return_exceptions: If true (default), a failed extraction
+            puts the exception at its position in the result list instead
+            of aborting the whole batch.
+        :param kwargs: passed on to `extract()`
+
+        Note: the default connection pool of a session keeps 10 connections
+        per host, so use a correspondingly sized adapter for larger pools.
+
+        :return: list of response objects (or exceptions), in input order
+        """
+        def extract_one(text):
+            return self.extract(text, pid, lang=lang, **kwargs)
+
+        return list(_utils.map_bounded(
+            extract_one, texts,
+            max_workers=max_workers,
+            max_in_flight=max_in_flight,
+            return_exceptions=return_exceptions
+        ))
 
     def extract_from_file(self, file, pid, mb_time_factor=3, lang=None, force_json=False,
                           **kwargs):
@@ -68,43 +166,56 @@ class PoolParty:
         Make extract call using project determined by pid.
         NOTE: Swallows all exceptions
 
-        :param file: filename
+        :param file: filename or file object opened in binary mode
         :param pid: id of project
         :param mb_time_factor: timeout scale factor (relative to file size)
         :param lang: language
         :return: response object
         """
-        lang = self.lang if lang == None else lang
-        data = {
-            'numberOfConcepts': 100000,
-            'numberOfTerms': 100000,
-            'projectId': pid,
-            'language': lang,
-            'useTransitiveBroaderConcepts': True,
-            'useRelatedConcepts': True,
-            # 'sentimentAnalysis': True,
-            'filterNestedConcepts': True,
-            'showMatchingPosition': True,
-            'showMatchingDetails': True
-        }
-        data.update(kwargs)
-        target_url = self.server + '/extractor/api/extract'
-        start = time()
         try:
             if not hasattr(file, 'read'):
                 file = open(file, 'rb')
-            file_text = file.read()
-            # Findout filesize
-            if self.timeout:
-                countedTimeout = self.timeout
-            else:
-                file.seek(0, 2)  # Go to end of file
-                f_size_mb = file.tell() / (1024 * 1024)
-                file.seek(0)  # Go to start of file
-                countedTimeout = (3.05, int(27 * mb_time_factor * (1 + f_size_mb)))
+            content = file.read()
+        except Exception as e:
+            module_logger.error(traceback.format_exc())
+            return None
+        finally:
+            if hasattr(file, 'close'):
+                file.close()
+        filename = os.path.basename(getattr(file, 'name', 'file') or 'file')
+        return self.extract_from_bytes(
+            content, pid, mb_time_factor=mb_time_factor, lang=lang,
+            force_json=force_json, filename=filename, **kwargs
+        )
 
+    def extract_from_bytes(self, content, pid, mb_time_factor=3, lang=None,
+                           force_json=False, filename='file', **kwargs):
+        """
+        Make extract call using project determined by pid, uploading
+        `content` from memory.
+        NOTE: Swallows all exceptions
+
+        :param content: bytes (utf8 encoded text)
+        :param pid: id of project
+        :param mb_time_factor: timeout scale factor (relative to content size)
+        :param lang: language
+        :param force_json: If True, the content is sent in the "text" field,
+            otherwise as the form-data file named "file".
+        :param filename: name of the uploaded file
+        :return: response object
+        """
+        lang = self.lang if lang == None else lang
+        data = self.get_extract_data(pid, lang, **kwargs)
+        target_url = self.server + '/extractor/api/extract'
+        if self.timeout:
+            countedTimeout = self.timeout
+        else:
+            countedTimeout = self.get_extract_timeout(len(content),
+                                                      mb_time_factor)
+        start = time()
+        try:
             if force_json:
-                data['text'] = file_text
+                data['text'] = content
                 r = self.session.post(
                     target_url,
                     data=data,
@@ -113,12 +224,10 @@ class PoolParty:
                 r = self.session.post(
                     target_url,
                     data=data,
-                    files={'file': file},
+                    files={'file': (filename, content)},
                     timeout=countedTimeout)
         except Exception as e:
             module_logger.error(traceback.format_exc())
-        finally:
-            file.close()
         module_logger.debug('call took {:0.3f}'.format(time() - start))
 
         if not 'r' in locals():
@@ -140,6 +249,43 @@ class PoolParty:
         return r
 
 
+    @staticmethod
+    def get_extract_timeout(n_bytes, mb_time_factor=3):
+        """
+        Timeout of an extract call, scaled by the size of the document.
+
+        :param n_bytes: size of the document in bytes
+        :param mb_time_factor: timeout scale factor
+        :return: (connect timeout, read timeout)
+        """
+        f_size_mb = n_bytes / (1024 * 1024)
+        return (3.05, int(27 * mb_time_factor * (1 + f_size_mb)))
+
+    @staticmethod
+    def get_extract_data(pid, lang, **kwargs):
+        """
+        Parameters of an extract call, with our defaults.
+
+        :param pid: id of project
+        :param lang: language
+        :param kwargs: additional (or overriding) extractor parameters
+        :return: dict
+        """
+        data = {
+            'numberOfConcepts': 100000,
+            'numberOfTerms': 100000,
+            'projectId': pid,
+            'language': lang,
+            'useTransitiveBroaderConcepts': True,
+            'useRelatedConcepts': True,
+            # 'sentimentAnalysis': True,
+            'filterNestedConcepts': True,
+            'showMatchingPosition': True,
+            'showMatchingDetails': True
+        }
+        data.update(kwargs)
+        return data
+
     def raise_for_status(self, response, data=None):
         """
         Call the raise_for_status() method of the response, which will
@@ -155,8 +301,16 @@ class PoolParty:
 
 
     @staticmethod
-    def get_cpts_from_response(r):
-        # TODO: create a class ExtractedConcept
+    def get_cpts_from_response(r, compact=False):
+        """
+        Parse the concepts of an extractor response.
+
+        :param r: response object or its parsed json
+        :param compact: If true, return `ExtractedConcept` objects instead
+            of dicts. They use much less memory for many matches, support
+            read access like the dicts and convert with `to_dict()`.
+        :return: list of concepts
+        """
         attributes = ['prefLabel', 'prefLabels', 'frequencyInDocument', 'uri',
                       'score',
                       'transitiveBroaderConcepts', 'transitiveBroaderTopConcepts',
@@ -181,6 +335,10 @@ class PoolParty:
                 # concepts are mentioned inside 'document'
                 concept_container = concept_container['document']
 
+        if compact:
+            return [ExtractedConcept.from_json(cpt_json)
+                    for cpt_json in concept_container['concepts']]
+
         for cpt_json in concept_container['concepts']:
             cpt = dict()
             for attr in attributes:
@@ -212,7 +370,12 @@ class PoolParty:
         r = self.extract(
             text, pid, shadowConceptCorpusId=shadow_cpts_corpus_id, **kwargs
         )
+        if r is None:
+            return []
+        return self.get_shadow_cpts_from_response(r), r
 
+    @staticmethod
+    def get_shadow_cpts_from_response(r):
         attributes = ['prefLabel', 'uri',
                       'transitiveBroaderConcepts', 'relatedConcepts',
                       'corporaScore']
@@ -220,7 +383,11 @@ class PoolParty:
         shadow_cpts = []
         if r is None:
             return shadow_cpts
-        concept_container = r.json()
+        elif isinstance(r, requests.Response):
+            concept_container = r.json()
+        else:
+            # Accept parsed json instead of the request object
+            concept_container = r
 
         if not 'shadowConcepts' in concept_container:
             if not 'document' in concept_container:
@@ -241,7 +408,7 @@ class PoolParty:
                     cpt[attr] = []
             shadow_cpts.append(cpt)
 
-        return shadow_cpts, r
+        return shadow_cpts
 
     @staticmethod
     def get_terms_from_response(r):
@@ -249,7 +416,11 @@ class PoolParty:
         extr_terms = []
         if r is None:
             return extr_terms
-        term_container = r.json()
+        elif isinstance(r, requests.Response):
+            term_container = r.json()
+        else:
+            # Accept parsed json instead of the request object
+            term_container = r
 
         found = False
         for term_key_word in ['freeTerms', 'extractedTerms']:
@@ -266,7 +437,7 @@ class PoolParty:
             module_logger.warning("No terms found in this document!")
             return extr_terms
 
-        assert found, [extr_terms, list(term_container.keys()), r.json()]
+        assert found, [extr_terms, list(term_container.keys())]
 
         for term_json in term_container[term_key_word]:
             term = dict()
@@ -281,7 +452,9 @@ class PoolParty:
 
     @staticmethod
     def get_sentiment_from_response(r):
-        return r.json()["sentiments"][0]["score"]
+        if isinstance(r, requests.Response):
+            r = r.json()
+        return r["sentiments"][0]["score"]
 
     @staticmethod
     def format_nif(text, cpts, doc_uri="http://example.doc/"+str(uuid.uuid4())):
@@ -350,19 +523,26 @@ class PoolParty:
         :return: response object
         """
         lang = self.lang if lang == None else lang
+        # A tuple for both the key and the call (a generator is read once)
+        uris = self._uris_key(uris)
         data = {
             'concepts': uris,
             'projectId': pid,
             'language': lang,
         }
         target_url = self.server + '/PoolParty/api/thesaurus/{}/concepts'.format(pid)
-        r = self.session.get(
-            target_url,
-            params=data,
-            timeout=self.timeout
-        )
-        self.raise_for_status(r, data)
-        return [x['prefLabel'] for x in r.json()]
+
+        def fetch():
+            r = self.session.get(
+                target_url,
+                params=data,
+                timeout=self.timeout
+            )
+            self.raise_for_status(r, data)
+            return [x['prefLabel'] for x in r.json()]
+
+        key = ('get_pref_labels', pid, uris, lang)
+        return self._cached(key, fetch)
 
     def get_cpts_info(self, uris, pid, lang=None):
         """
@@ -373,27 +553,49 @@ class PoolParty:
         :return: response object
         """
         lang = self.lang if lang == None else lang
+        # A tuple for both the key and the call (a generator is read once)
+        uris = self._uris_key(uris)
         data = {
             'concepts': uris,
             'language': lang,
             'properties': 'all'
         }
         target_url = self.server + '/PoolParty/api/thesaurus/{}/concepts'.format(pid)
-        r = self.session.get(
-            target_url,
-            params=data,
-            timeout=self.timeout
-        )
-        self.raise_for_status(r, data)
-        return r.json()
 
-    def get_cpt_corpus_freqs(self, corpus_id, pid):
+        def fetch():
+            r = self.session.get(
+                target_url,
+                params=data,
+                timeout=self.timeout
+            )
+            self.raise_for_status(r, data)
+            return r.json()
+
+        key = ('get_cpts_info', pid, uris, lang, 'all')
+        return self._cached(key, fetch)
+
+    def get_cpt_corpus_freqs(self, corpus_id, pid, window=PAGE_WINDOW):
         """
         Make call to PP to extract frequencies of concepts in a corpus.
 
         :param corpus_id: corpus id
         :param pid: id of project
-        :return: response object
+        :param window: number of pages fetched concurrently
+        :return: list of results
+        """
+        return list(self.iter_cpt_corpus_freqs(corpus_id, pid, window=window))
+
+    def iter_cpt_corpus_freqs(self, corpus_id, pid, window=PAGE_WINDOW,
+                              pages=False):
+        """
+        Like `get_cpt_corpus_freqs()`, but yield the results as the pages
+        arrive.
+
+        :param corpus_id: corpus id
+        :param pid: id of project
+        :param window: number of pages fetched concurrently
+        :param pages: If true, yield whole pages (lists) instead of results
+        :return: generator of results
         """
         data = {
             'corpusId': corpus_id,
@@ -402,15 +604,7 @@ class PoolParty:
         suffix = '/PoolParty/api/corpusmanagement/{pid}/results/concepts'.format(
             pid=pid
         )
-        results = []
-        while True:
-            r = self.session.get(self.server + suffix, params=data, timeout=self.timeout)
-            self.raise_for_status(r, data)
-            data['startIndex'] += 20
-            results += r.json()
-            if not len(r.json()):
-                break
-        return results
+        return self._iter_paginated(suffix, data, pages=pages, window=window)
 
     def get_cpt_path(self, cpt_uri, pid):
         """
@@ -429,16 +623,42 @@ class PoolParty:
             pid=pid
         )
         target_url = self.server + suffix
-        r = self.session.get(target_url, params=data, timeout=self.timeout)
-        self.raise_for_status(r, data)
 
+        def fetch():
+            r = self.session.get(target_url, params=data, timeout=self.timeout)
+            self.raise_for_status(r, data)
+            return self.get_cpt_path_from_response(r.json())
+
+        return self._cached(('get_cpt_path', pid, (cpt_uri,)), fetch)
+
+    @staticmethod
+    def get_cpt_path_from_response(paths):
+        """
+        :param paths: parsed json of a getPaths call
+        :return: list: [(uri, label)] of cpt scheme and broaders
+        """
         broaders = [(x['uri'], x['prefLabel']) for x in
-                    r.json()[0]['conceptPath']]
-        cpt_scheme = r.json()[0]['conceptScheme']
+                    paths[0]['conceptPath']]
+        cpt_scheme = paths[0]['conceptScheme']
         result = [(cpt_scheme['uri'], cpt_scheme['title'])] + broaders
         return result
 
-    def get_term_coocs(self, term_str, corpus_id, pid):
+    def get_term_coocs(self, term_str, corpus_id, pid, window=PAGE_WINDOW):
+        return list(self.iter_term_coocs(term_str, corpus_id, pid,
+                                         window=window))
+
+    def iter_term_coocs(self, term_str, corpus_id, pid, window=PAGE_WINDOW,
+                        pages=False):
+        """
+        Yield the cooccurrences of a term in a corpus as the pages arrive.
+
+        :param term_str: the term
+        :param corpus_id: corpus id
+        :param pid: id of project
+        :param window: number of pages fetched concurrently
+        :param pages: If true, yield whole pages (lists) instead of results
+        :return: generator of results
+        """
         suffix = '/PoolParty/api/corpusmanagement/' \
                  '{pid}/results/cooccurrence/term'.format(
             pid=pid
@@ -449,23 +669,61 @@ class PoolParty:
             'startIndex': 0,
             'limit': 2 ** 15,  # int(sys.maxsize)
         }
-        results = []
+        return self._iter_paginated(suffix, data, pages=pages, window=window,
+                                    stop_on_short_page=True)
 
-        while True:
+    def _iter_pages(self, suffix, data, page_size=20, window=PAGE_WINDOW,
+                    stop_on_short_page=False):
+        """
+        Page through the results of a corpus management call, which returns
+        `page_size` results per request from `startIndex` on.
+
+        Up to `window` pages are requested concurrently; pages are yielded
+        in order as they arrive, and paging stops cleanly at the first empty
+        page (requests already sent for later pages are discarded).
+
+        :param suffix: path of the API call
+        :param data: request parameters, optionally including 'startIndex'
+        :param page_size: number of results per page returned by the server
+        :param window: maximal number of pages requested at the same time
+        :param stop_on_short_page: If true, a page with fewer than
+            `page_size` results is taken to be the last one.
+        :return: generator of pages (lists of results)
+        """
+        def get_page(start_index):
+            params = dict(data, startIndex=start_index)
             r = self.session.get(self.server + suffix,
-                            params=data,
-                            timeout=self.timeout)
-            self.raise_for_status(r, data)
+                                 params=params,
+                                 timeout=self.timeout)
+            self.raise_for_status(r, params)
+            return r.json()
 
-            results += r.json()
-            if len(r.json()) == 20:
-                data['startIndex'] += len(r.json())
-                if not len(r.json()):
+        start_indexes = itertools.count(data.get('startIndex', 0), page_size)
+        pages = _utils.map_bounded(get_page, start_indexes,
+                                   max_workers=window,
+                                   return_exceptions=False)
+        try:
+            for page in pages:
+                if not page:
                     break
-            else:
-                break
+                yield page
+                if stop_on_short_page and len(page) < page_size:
+                    break
+        finally:
+            pages.close()
 
-        return results
+    def _iter_paginated(self, suffix, data, pages=False, **kwargs):
+        """
+        Like `_iter_pages()`, but yield the single results unless `pages`
+        is true.
+        """
+        with contextlib.closing(self._iter_pages(suffix, data, **kwargs)) \
+                as page_iter:
+            for page in page_iter:
+                if pages:
+                    yield page
+                else:
+                    yield from page
 
     def get_projects(self):
         suffix = '/PoolParty/api/projects'
@@ -505,27 +763,21 @@ class PoolParty:
         result = r.json()
         return result
 
-    def get_allterms_scores(self, corpus_id, pid):
-        suffix = '/PoolParty/api/corpusmanagement/{pid}/results/extractedterms'.format(
-            pid=pid
-        )
-        data = {
-            'corpusId': corpus_id,
-            'startIndex': 0
-        }
-        results = []
-        while True:
-            r = self.session.get(self.server + suffix,
-                                 params=data,
-                                 timeout=self.timeout)
-            self.raise_for_status(r, data)
-            data['startIndex'] += 20
-            results += r.json()
-            if not len(r.json()):
-                break
-        return results
+    def get_allterms_scores(self, corpus_id, pid, window=PAGE_WINDOW):
+        return list(self.iter_allterms_scores(corpus_id, pid, window=window))
 
-    def get_terms_stats(self, corpus_id, pid):
+    def iter_allterms_scores(self, corpus_id, pid, window=PAGE_WINDOW,
+                             pages=False):
+        """
+        Yield the scores of all extracted terms of a corpus as the pages
+        arrive.
+
+        :param corpus_id: corpus id
+        :param pid: id of project
+        :param window: number of pages fetched concurrently
+        :param pages: If true, yield whole pages (lists) instead of results
+        :return: generator of results
+        """
         suffix = '/PoolParty/api/corpusmanagement/{pid}/results/extractedterms'.format(
             pid=pid
         )
@@ -533,17 +785,25 @@ class PoolParty:
             'corpusId': corpus_id,
             'startIndex': 0
         }
-        results = []
-        while True:
-            r = self.session.get(self.server + suffix,
-                                 params=data,
-                                 timeout=self.timeout)
-            self.raise_for_status(r, data)
-            data['startIndex'] += 20
-            results += r.json()
-            if not len(r.json()):
-                break
-        return results
+        return self._iter_paginated(suffix, data, pages=pages, window=window)
+
+    def get_terms_stats(self, corpus_id, pid, window=PAGE_WINDOW):
+        return list(self.iter_terms_stats(corpus_id, pid, window=window))
+
+    def iter_terms_stats(self, corpus_id, pid, window=PAGE_WINDOW,
+                         pages=False):
+        """
+        Yield the statistics of the extracted terms of a corpus as the
+        pages arrive.
+
+        :param corpus_id: corpus id
+        :param pid: id of project
+        :param window: number of pages fetched concurrently
+        :param pages: If true, yield whole pages (lists) instead of results
+        :return: generator of results
+        """
+        return self.iter_allterms_scores(corpus_id, pid, window=window,
+                                         pages=pages)
 
     def corpus_management_add_text(self, text, title, pid, corpusId, checkLanguage=True):
         suffix = '/PoolParty/api/corpusmanagement/{pid}/add'.format(
@@ -586,9 +846,17 @@ class PoolParty:
         }
         r = self.session.get(self.server + suffix, params=data, timeout=self.timeout)
         self.raise_for_status(r, data)
-        if r.json()['suggestedConcepts']:
+        return self.get_suggestions_from_response(r.json())
+
+    @staticmethod
+    def get_suggestions_from_response(suggestions):
+        """
+        :param suggestions: parsed json of a suggest call
+        :return: list: [(prefLabel, uri)]
+        """
+        if suggestions['suggestedConcepts']:
             ans = [(x['prefLabel'], x['uri'])
-                   for x in r.json()['suggestedConcepts']]
+                   for x in suggestions['suggestedConcepts']]
         else:
             ans = []
         return ans
@@ -607,29 +875,47 @@ class PoolParty:
         """
 
         :param pid: project
-        :param from_: datetime instance or None
+        :param from_: datetime instance or None; timezone-aware datetimes
+            are sent in UTC
         :return:
         """
         suffix = '/PoolParty/api/history/{pid}'.format(
             pid=pid
         )
+        data = self.get_history_data(from_)
+        r = self.session.get(self.server + suffix, params=data, timeout=self.timeout)
+        self.raise_for_status(r, data)
+        return r.json()
+
+    @staticmethod
+    def get_history_data(from_=None):
+        """
+        Prepare the parameters of a history call, see `get_history()`.
+
+        :return: dict
+        """
         data = dict()
-        if from_ is not None:
+        if from_ is not None and from_.tzinfo is not None:
+            data.update({
+                'fromTime': from_.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            })
+        elif from_ is not None:
             data.update({
                 'fromTime': from_.strftime('%Y-%m-%dT%H:%M:%S')
             })
-        r = self.session.get(self.server + suffix, params=data, timeout=self.timeout)
-        self.raise_for_status(r, data)
-        return r.json()
+        return data
 
     def get_schemes(self, pid):
         suffix = '/PoolParty/api/thesaurus/{project}/schemes'.format(
             project=pid
         )
-        r = self.session.get(self.server + suffix, timeout=self.timeout)
-        self.raise_for_status(r)
-        ans = r.json()
-        return ans
+
+        def fetch():
+            r = self.session.get(self.server + suffix, timeout=self.timeout)
+            self.raise_for_status(r)
+            return r.json()
+
+        return self._cached(('get_schemes', pid, ()), fetch)
 
     def add_new_concept(self, pid, pref_label, parent=None, suffix=None):
         """
@@ -656,6 +942,7 @@ class PoolParty:
         r = self.session.post(target_url, data=data, timeout=self.timeout)
         self.raise_for_status(r, data)
         ans = r.json()
+        self.invalidate_uris(pid, [data['parent']])
         return ans
 
     def add_label(self, pid, uri, label_value,
@@ -672,6 +959,7 @@ class PoolParty:
         target_url = self.server + suffix
         r = self.session.post(target_url, data=data, timeout=self.timeout)
         self.raise_for_status(r, data)
+        self.invalidate_uris(pid, [uri])
         return r
 
     def add_relation(self, pid, source_uri, target_uri,
@@ -687,6 +975,7 @@ class PoolParty:
         target_url = self.server + suffix
         r = self.session.post(target_url, data=data, timeout=self.timeout)
         self.raise_for_status(r, data)
+        self.invalidate_uris(pid, [source_uri, target_uri])
         return r
 
     def create_project_json(self, poolPartyProject : PoolPartyProject):
@@ -764,10 +1053,14 @@ class PoolParty:
         }
         if lang is not None:
             data['language'] = lang
-        r = self.session.get(self.server + suffix, params=data, timeout=self.timeout)
-        self.raise_for_status(r, data)
-        ans = r.json()
-        return ans
+
+        def fetch():
+            r = self.session.get(self.server + suffix, params=data, timeout=self.timeout)
+            self.raise_for_status(r, data)
+            return r.json()
+
+        key = ('get_cpt_narrowers', pid, (str(cpt_uri),), transitive, lang)
+        return self._cached(key, fetch)
 
     def get_childconcepts(self, pid, parent,
                           properties=None, language=None, transitive=None, workflowStatus=None):
@@ -850,6 +1143,7 @@ class PoolParty:
 
         r = self.session.post(self.server + urlpath, data=data, timout=self.timeout)
         self.raise_for_status(r, data)
+        self.invalidate_uris(pid, [resource])
         return r
 
     def add_custom_relation(self, pid, source, property, target):
@@ -864,6 +1158,7 @@ class PoolParty:
         }
         r = self.session.post(self.server + urlpath, data=data, timeout=self.timeout)
         self.raise_for_status(r, data)
+        self.invalidate_uris(pid, [source, target])
         return r
 
 
@@ -1,7 +1,647 @@
-import requests
+import codecs
+import csv
+import itertools
+import json
+import logging
+import operator
+import re
+import threading
+import time
+from array import array
+
 import numpy as np
 import rdflib
 
+from pp_api.utils import TransportConfig, map_bounded
+
+
+module_logger = logging.getLogger(__name__)
+
+# Endpoint of the corpus analysis graphs, unless given explicitly
+DEFAULT_SPARQL_ENDPOINT = 'https://aligned-virtuoso.poolparty.biz/sparql'
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_sparql_session(session=None):
+    """
+    :param session: `requests` session to use, or None for a module-wide
+        session with pooled keep-alive connections
+    :return: session
+    """
+    global _default_session
+    if session is not None:
+        return session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = TransportConfig().new_session()
+        return _default_session
+
+
+SPARQL_RESULT_TYPES = {
+    'json': 'application/sparql-results+json',
+    'csv': 'text/csv',
+    'tsv': 'text/tab-separated-values',
+}
+
+# Longer queries are sent as POST form data
+MAX_GET_QUERY_LENGTH = 2000
+
+
+def iter_sparql_rows(sparql_endpoint, query, default_graph_uri=None,
+                     columns=None, format='csv', session=None, timeout=None,
+                     chunk_size=2 ** 16, terms=False):
+    """
+    Run a select query and yield the result rows as they arrive, without
+    holding the whole response in memory.
+
+    :param sparql_endpoint: url of the SPARQL endpoint
+    :param query: select query
+    :param default_graph_uri: optional default graph of the query
+    :param columns: variable names, in the order of the row entries
+        (default: the order of the result header)
+    :param format: result format to request, 'csv' (smallest and fastest
+        to parse), 'tsv' or 'json'
+    :param session: optional `requests` session, see `get_sparql_session()`
+    :param timeout: `requests` timeout
+    :param chunk_size: bytes read at a time
+    :param terms: If true, yield rdflib terms instead of strings (requires
+        format 'json')
+    :return: generator of tuples of strings (uris and literal values), None
+        for unbound variables
+    """
+    params = {'query': query}
+    if default_graph_uri is not None:
+        params['default-graph-uri'] = default_graph_uri
+    headers = {'Accept': SPARQL_RESULT_TYPES[format]}
+    session = get_sparql_session(session)
+    if len(query) > MAX_GET_QUERY_LENGTH:
+        r = session.post(sparql_endpoint, data=params, headers=headers,
+                         timeout=timeout, stream=True)
+    else:
+        r = session.get(sparql_endpoint, params=params, headers=headers,
+                        timeout=timeout, stream=True)
+    with r:
+        r.raise_for_status()
+        yield from parse_sparql_stream(r.iter_content(chunk_size), format=format,
+                                       columns=columns, terms=terms)
+
+
+def parse_sparql_stream(chunks, format='csv', columns=None, terms=False):
+    """
+    Incrementally parse SPARQL select results.
+
+    :param chunks: iterable of bytes, e.g. `response.iter_content()`
+    :param format: 'csv', 'tsv' or 'json'
+    :param columns: variable names, in the order of the row entries
+        (default: the order of the result header)
+    :param terms: If true, return rdflib terms (URIRef, Literal with
+        datatype and language, BNode) instead of strings. Requires 'json'.
+    :return: generator of tuples of strings, None for unbound variables
+        (in CSV results, also for empty literals)
+    """
+    if terms and format != 'json':
+        raise ValueError('RDF terms can only be read from JSON results')
+    if format == 'json':
+        rows = _iter_json_rows(chunks, to_value=_json_term if terms else None)
+    elif format == 'csv':
+        rows = csv.reader(_iter_text_lines(chunks))
+    elif format == 'tsv':
+        rows = _iter_tsv_rows(chunks)
+    else:
+        raise ValueError('Unknown SPARQL result format: {}'.format(format))
+
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [var.lstrip('?$') for var in header]
+    if columns is None:
+        columns = header
+    positions = [header.index(var) for var in columns]
+    if positions == list(range(len(header))):
+        select = tuple
+    elif len(positions) == 1:
+        select = lambda row: (row[positions[0]],)
+    else:
+        select = operator.itemgetter(*positions)
+    # Unbound values are empty strings in CSV and TSV
+    empty = None if format == 'json' else ''
+    for row in rows:
+        if not row:
+            continue
+        values = select(row)
+        if empty is not None and empty in values:
+            values = tuple(None if x == empty else x for x in values)
+        yield values
+
+
+def _iter_text_lines(chunks):
+    """
+    Decode utf-8 `chunks` and yield lines, including their line ends.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    rest = ''
+    for chunk in chunks:
+        lines = (rest + decoder.decode(chunk)).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    rest += decoder.decode(b'', final=True)
+    if rest:
+        yield rest
+
+
+_TSV_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f',
+                '"': '"', "'": "'", '\\': '\\'}
+
+
+def _tsv_value(term):
+    """
+    Value of an RDF term in the Turtle syntax of SPARQL TSV results.
+    """
+    if term.startswith('<') and term.endswith('>'):
+        return term[1:-1]
+    if term.startswith('"'):
+        term = term[1:term.rindex('"')]
+        if '\\' in term:
+            term = re.sub(r'\\(.)', lambda m: _TSV_ESCAPES.get(m.group(1), m.group(0)),
+                          term)
+    return term
+
+
+def _iter_tsv_rows(chunks):
+    lines = _iter_text_lines(chunks)
+    header = next(lines, None)
+    if header is None:
+        return
+    yield header.rstrip('\r\n').split('\t')
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line:
+            yield [_tsv_value(term) for term in line.split('\t')]
+
+
+def _json_term(value):
+    """
+    rdflib term of a value in SPARQL JSON results.
+    """
+    if value['type'] == 'uri':
+        return rdflib.URIRef(value['value'])
+    if value['type'] == 'bnode':
+        return rdflib.BNode(value['value'])
+    return rdflib.Literal(value['value'], lang=value.get('xml:lang'),
+                          datatype=value.get('datatype'))
+
+
+def _iter_json_rows(chunks, to_value=None):
+    """
+    Yield the variable names and then the rows of SPARQL JSON results,
+    decoding one binding at a time. If "results" comes before "head", the
+    bindings are kept until the variable names are read.
+
+    :param to_value: function converting the JSON of a bound value (by
+        default its "value" is taken)
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+
+    def more():
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        return True
+
+    def find(*tokens):
+        """
+        Move past the first of `tokens` and return it (None at the end).
+        """
+        nonlocal pos
+        while True:
+            hits = [(i, token) for token in tokens
+                    for i in (buf.find(token, pos),) if i >= 0]
+            if hits:
+                i, token = min(hits)
+                pos = i + len(token)
+                return token
+            # Keep a possible partial token at the end
+            pos = max(pos, len(buf) - max(map(len, tokens)))
+            if not more():
+                return None
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or not more():
+                return
+
+    def decode_value():
+        nonlocal pos
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buf, pos)
+                return value
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+
+    def read_variables():
+        skip(' \t\r\n:')
+        return decode_value()
+
+    def iter_bindings():
+        skip(' \t\r\n:')
+        skip(' \t\r\n[')
+        while True:
+            skip(' \t\r\n,')
+            if pos >= len(buf) or buf[pos] == ']':
+                return
+            yield decode_value()
+
+    first = find('"vars"', '"bindings"')
+    if first is None:
+        return
+    if first == '"vars"':
+        variables = read_variables()
+        yield variables
+        bindings = iter_bindings() if find('"bindings"') else ()
+    else:
+        bindings = list(iter_bindings())
+        if find('"vars"') is None:
+            raise ValueError('SPARQL JSON results without "vars" in "head"')
+        variables = read_variables()
+        yield variables
+    for binding in bindings:
+        if to_value is None:
+            yield [binding[var]['value'] if var in binding else None
+                   for var in variables]
+        else:
+            yield [to_value(binding[var]) if var in binding else None
+                   for var in variables]
+
+
+def rows_to_arrays(rows, columns, uri_columns=(), float_columns=(),
+                   uri_index=None):
+    """
+    Materialize result rows into NumPy arrays: uris as int ids, scores as
+    floats. Only the ids and numbers are kept per row, so this runs in
+    about 16 bytes per row and column.
+
+    :param rows: iterable of tuples, e.g. from `iter_sparql_rows()`
+    :param columns: names of the row entries
+    :param uri_columns: columns to convert to int64 ids
+    :param float_columns: columns to convert to float64
+    :param uri_index: optional dict uri -> id to extend, to share ids
+        between several calls
+    :return: (dict column -> array, list of uris indexed by id)
+    """
+    if uri_index is None:
+        uri_index = dict()
+    uri_arrays = {col: array('q') for col in columns if col in uri_columns}
+    float_arrays = {col: array('d') for col in columns if col in float_columns}
+    uri_appends = [(columns.index(col), values.append)
+                   for col, values in uri_arrays.items()]
+    float_appends = [(columns.index(col), values.append)
+                     for col, values in float_arrays.items()]
+    setdefault = uri_index.setdefault
+    for row in rows:
+        for i, append in uri_appends:
+            append(setdefault(row[i], len(uri_index)))
+        for i, append in float_appends:
+            append(float(row[i]))
+    arrays = {col: np.frombuffer(values, dtype=np.int64)
+              for col, values in uri_arrays.items()}
+    arrays.update((col, np.frombuffer(values, dtype=np.float64))
+                  for col, values in float_arrays.items())
+    return arrays, list(uri_index)
+
+
+_QUERY_TOKENS = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|<[^<>\s]*>)|\s+')
+
+
+# Form of a query, after its prologue (comments, BASE and PREFIX)
+_QUERY_FORM = re.compile(
+    r'^(?:\s+|#[^\n]*|BASE\s*<[^>]*>|PREFIX\s+[^\s:]*:\s*<[^>]*>)*'
+    r'(SELECT|ASK|CONSTRUCT|DESCRIBE)\b', re.IGNORECASE)
+
+
+def query_form(query):
+    """
+    :return: 'SELECT', 'ASK', 'CONSTRUCT' or 'DESCRIBE', None if unknown
+    """
+    m = _QUERY_FORM.match(query)
+    return m.group(1).upper() if m else None
+
+
+def normalize_query(query):
+    """
+    Collapse the whitespace of `query` outside of literals and IRIs, so
+    that differently formatted copies of a query share a cache entry.
+    """
+    return _QUERY_TOKENS.sub(lambda m: m.group(1) or ' ', query).strip()
+
+
+class SparqlClient:
+    """
+    Connection to one SPARQL endpoint, with pooled keep-alive connections
+    and an optional cache of query results.
+
+        client = SparqlClient(endpoint, cache=LRUCache(maxsize=256),
+                              disk_cache=SqliteCache('sparql.db'))
+        rows = client.select(query, timeout=30)
+
+    Results are cached by (endpoint, default graph, normalized query,
+    result type) in `cache`, and in `disk_cache` as a second tier (e.g.
+    a `pp_api.cache.SqliteCache`) which survives restarts.
+    """
+
+    def __init__(self, sparql_endpoint, session=None, timeout=None,
+                 cache=None, disk_cache=None, max_cached_rows=1000000):
+        """
+        :param sparql_endpoint: url of the SPARQL endpoint
+        :param session: `requests` session (default: the pooled module-wide
+            one, see `get_sparql_session()`)
+        :param timeout: default `requests` timeout of queries
+        :param cache: optional in-memory cache, e.g. `pp_api.cache.LRUCache`
+        :param disk_cache: optional second cache tier
+        :param max_cached_rows: results with more rows are not cached
+        """
+        self.sparql_endpoint = sparql_endpoint
+        self.session = get_sparql_session(session)
+        self.timeout = timeout
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.max_cached_rows = max_cached_rows
+
+    def _cache_key(self, query, default_graph_uri, columns, terms):
+        return (self.sparql_endpoint, default_graph_uri,
+                normalize_query(query),
+                tuple(columns) if columns is not None else None, terms)
+
+    def _get_cached(self, key):
+        for tier in (self.cache, self.disk_cache):
+            if tier is None:
+                continue
+            rows = tier.get(key)
+            if rows is not None:
+                if tier is self.disk_cache and self.cache is not None:
+                    self.cache.set(key, rows)
+                return rows
+        return None
+
+    def _set_cached(self, key, rows):
+        for tier in (self.cache, self.disk_cache):
+            if tier is not None:
+                tier.set(key, rows)
+
+    def iter_select(self, query, default_graph_uri=None, columns=None,
+                    timeout=None, terms=False, use_cache=True):
+        """
+        Yield the rows of a select query as they arrive (or from the cache),
+        see `iter_sparql_rows()`.
+
+        :param timeout: `requests` timeout of this query, overrides
+            `self.timeout`
+        :param terms: If true, yield rdflib terms instead of strings.
+        :param use_cache: If false, neither read nor write the cache.
+        """
+        form = query_form(query)
+        if form not in (None, 'SELECT'):
+            raise ValueError('SparqlClient only runs SELECT queries, not {}; '
+                             'use query_sparql_endpoint()'.format(form))
+        use_cache = use_cache and (self.cache is not None
+                                   or self.disk_cache is not None)
+        key = None
+        if use_cache:
+            key = self._cache_key(query, default_graph_uri, columns, terms)
+            rows = self._get_cached(key)
+            if rows is not None:
+                yield from rows
+                return
+        rows = iter_sparql_rows(
+            self.sparql_endpoint, query, default_graph_uri=default_graph_uri,
+            columns=columns, format='json' if terms else 'csv',
+            session=self.session,
+            timeout=self.timeout if timeout is None else timeout, terms=terms)
+        collected = [] if use_cache else None
+        for row in rows:
+            if collected is not None:
+                collected.append(row)
+                if len(collected) > self.max_cached_rows:
+                    collected = None
+            yield row
+        if collected is not None:
+            self._set_cached(key, tuple(collected))
+
+    def select(self, query, default_graph_uri=None, columns=None,
+               timeout=None, terms=False, use_cache=True):
+        """
+        :return: list of the rows of a select query, see `iter_select()`
+        """
+        return list(self.iter_select(query, default_graph_uri=default_graph_uri,
+                                     columns=columns, timeout=timeout,
+                                     terms=terms, use_cache=use_cache))
+
+    def query(self, query, default_graph_uri=None, timeout=None,
+              use_cache=True):
+        """
+        :return: list of tuples of rdflib terms, like the rows of an rdflib
+            query result
+        """
+        return self.select(query, default_graph_uri=default_graph_uri,
+                           timeout=timeout, terms=True, use_cache=use_cache)
+
+    def invalidate(self):
+        """
+        Drop all cached results of this endpoint.
+        """
+        for tier in (self.cache, self.disk_cache):
+            if tier is not None:
+                tier.invalidate_where(lambda key: key[0] == self.sparql_endpoint)
+
+
+_clients = dict()
+_clients_lock = threading.Lock()
+
+
+def get_sparql_client(sparql_endpoint, client=None, session=None):
+    """
+    :param client: SparqlClient to use, if given
+    :param session: `requests` session for a new, uncached client
+    :return: `client`, or a new client using `session`, or else the
+        module-wide (uncached) client of `sparql_endpoint`
+    """
+    if client is not None:
+        return client
+    if session is not None:
+        return SparqlClient(sparql_endpoint, session=session)
+    with _clients_lock:
+        if sparql_endpoint not in _clients:
+            _clients[sparql_endpoint] = SparqlClient(sparql_endpoint)
+        return _clients[sparql_endpoint]
+
+
+# Placeholder in queries for the restriction of a shard
+SHARD_FILTER = '{shard_filter}'
+
+
+class ShardedExecutor:
+    """
+    Run a select query over a large graph as many smaller queries, which
+    run concurrently and are retried on failure; the rows are merged.
+
+        executor = ShardedExecutor(client, n_shards=32)
+        rows = executor.select(query, shard_var='s')
+
+    Shards are either
+
+    - 'hash': one query per bucket of the MD5 hash of `shard_var` (a
+      FILTER is put in place of `SHARD_FILTER` in the query, or before its
+      last "}"), or
+    - 'offset': pages of `page_size` rows with ORDER BY, LIMIT and OFFSET
+      appended to the query, requested until a page comes back short.
+    """
+
+    def __init__(self, client, n_shards=16, mode='hash', page_size=10000,
+                 max_workers=4, retries=3, backoff=1.):
+        """
+        :param client: `SparqlClient`
+        :param n_shards: number of hash shards (at most 256)
+        :param mode: 'hash' or 'offset'
+        :param page_size: number of rows per 'offset' shard
+        :param max_workers: number of concurrent queries
+        :param retries: number of retries of a failed shard
+        :param backoff: seconds before the first retry, doubled for every
+            further one
+        """
+        if mode not in ('hash', 'offset'):
+            raise ValueError('Unknown shard mode: {}'.format(mode))
+        if not 0 < n_shards <= 256:
+            raise ValueError('n_shards must be between 1 and 256')
+        self.client = client
+        self.n_shards = n_shards
+        self.mode = mode
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+
+    @staticmethod
+    def _with_filter(query, shard_filter):
+        if SHARD_FILTER in query:
+            return query.replace(SHARD_FILTER, shard_filter)
+        if not shard_filter:
+            return query
+        end = query.rindex('}')
+        return query[:end] + shard_filter + '\n' + query[end:]
+
+    def hash_shard_queries(self, query, shard_var):
+        """
+        :return: list of `n_shards` queries, each restricted to the values
+            of `shard_var` whose MD5 hash falls into its buckets
+        """
+        digits = 1 if self.n_shards <= 16 else 2
+        buckets = ['{:0{}x}'.format(b, digits) for b in range(16 ** digits)]
+        queries = []
+        for shard in range(self.n_shards):
+            shard_filter = 'FILTER (SUBSTR(MD5(STR(?{})), 1, {}) IN ({}))'.format(
+                shard_var, digits,
+                ', '.join('"{}"'.format(b) for b in buckets[shard::self.n_shards]))
+            queries.append(self._with_filter(query, shard_filter))
+        return queries
+
+    def _select(self, query, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.client.select(query, **kwargs)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                module_logger.warning('Shard query failed ({}), retry {} of {}'.format(
+                    e, attempt + 1, self.retries))
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def iter_select(self, query, shard_var=None, columns=None, order_by=None,
+                    default_graph_uri=None, terms=False, distinct=False):
+        """
+        Yield the rows of all shards of `query`. The query must not have
+        solution modifiers (ORDER BY, LIMIT, OFFSET) of its own.
+
+        :param query: select query, optionally containing `SHARD_FILTER`
+        :param shard_var: variable (without "?") to hash, for mode 'hash'
+        :param columns: variable names, in the order of the row entries
+        :param order_by: ORDER BY expression of mode 'offset' (default: all
+            of `columns`)
+        :param default_graph_uri: optional default graph of the query
+        :param terms: If true, yield rdflib terms instead of strings.
+        :param distinct: If true, drop rows repeated in several shards.
+        :return: generator of tuples
+        """
+        kwargs = dict(default_graph_uri=default_graph_uri, columns=columns,
+                      terms=terms)
+        if self.mode == 'hash':
+            if shard_var is None:
+                raise ValueError('Hash shards need a shard_var')
+            pages = map_bounded(lambda q: self._select(q, **kwargs),
+                                self.hash_shard_queries(query, shard_var),
+                                max_workers=self.max_workers,
+                                return_exceptions=False)
+        else:
+            if order_by is None:
+                if columns is None:
+                    raise ValueError('Offset shards need columns or order_by')
+                order_by = ' '.join('?' + col for col in columns)
+            query = self._with_filter(query, '')
+
+            def get_page(offset):
+                return self._select(
+                    '{}\nORDER BY {} LIMIT {} OFFSET {}'.format(
+                        query, order_by, self.page_size, offset),
+                    **kwargs)
+
+            pages = map_bounded(get_page, itertools.count(0, self.page_size),
+                                max_workers=self.max_workers,
+                                return_exceptions=False)
+        seen = set() if distinct else None
+        try:
+            for page in pages:
+                for row in page:
+                    if seen is not None:
+                        if row in seen:
+                            continue
+                        seen.add(row)
+                    yield row
+                if self.mode == 'offset' and len(page) < self.page_size:
+                    break
+        finally:
+            pages.close()
+
+    def select(self, query, **kwargs):
+        """
+        :return: list of the rows of all shards, see `iter_select()`
+        """
+        return list(self.iter_select(query, **kwargs))
+
+
+def _select_rows(sparql_endpoint, query, shard_var, client=None,
+                 executor=None, **kwargs):
+    """
+    Rows of `query`, sharded by `executor` if given, otherwise in one query.
+    """
+    if executor is not None:
+        return executor.iter_select(query, shard_var=shard_var, **kwargs)
+    client = get_sparql_client(sparql_endpoint, client=client)
+    return client.iter_select(ShardedExecutor._with_filter(query, ''), **kwargs)
+
 
 def get_corpus_analysis_graphs(corpus_id):
     corpusgraph_id = 'corpusgraph:' + corpus_id[7:]
@@ -11,12 +651,22 @@ def get_corpus_analysis_graphs(corpus_id):
     return corpusgraph_id, termsgraph_id, cpt_occur_graph_id, cooc_graph
 
 
-def get_corpus_zscores(term_uris, cooc_corpus_graph):
+def get_corpus_zscores(term_uris, cooc_corpus_graph, session=None,
+                       sparql_endpoint=DEFAULT_SPARQL_ENDPOINT,
+                       chunk_size=200, max_workers=4):
     """
     Get zscores for term-term cooccurrences.
 
+    Only the cooccurrences among `term_uris` are requested: the terms are
+    sent in VALUES blocks of `chunk_size` uris, with up to `max_workers`
+    queries running at the same time.
+
     :param term_uris: list: uris of 2 terms
     :param cooc_corpus_graph: graph of corpus coocs
+    :param session: optional `requests` session, see `get_sparql_session()`
+    :param sparql_endpoint: url of the SPARQL endpoint
+    :param chunk_size: number of uris per query
+    :param max_workers: number of concurrent queries
     :return: float [0, 1]: similarity score := zscore/max(zscore)
     """
     def similarity(term1_uri, term2_uri):
@@ -31,58 +681,86 @@ def get_corpus_zscores(term_uris, cooc_corpus_graph):
 
     query_text = """
 select ?uri1 ?uri2 ?score where {{
+  {values}
   ?uri1 <http://schema.semantic-web.at/ppcm/2013/5/hasTermCooccurrence> ?co.
   ?co <http://schema.semantic-web.at/ppcm/2013/5/cooccurringExtractedTerm> ?uri2.
   ?co <http://schema.semantic-web.at/ppcm/2013/5/zscore> ?score.
 }}"""
-    params = {
-        'default-graph-uri': '{}'.format(cooc_corpus_graph),
-        'query': query_text,
-        'format': 'json',
-    }
-    r = requests.get('https://aligned-virtuoso.poolparty.biz/sparql',
-                     params=params)
-    assert r.status_code == 200
+    term_uris = set(term_uris)
+    # With few terms, the server restricts both ends; otherwise ?uri2 is
+    # checked here, to keep the queries short
+    uri2_values = (values_block('uri2', term_uris)
+                   if len(term_uris) <= chunk_size else '')
+
+    def query_chunk(chunk):
+        values = values_block('uri1', chunk) + '\n  ' + uri2_values
+        rows = iter_sparql_rows(sparql_endpoint,
+                                query_text.format(values=values),
+                                default_graph_uri=cooc_corpus_graph,
+                                columns=('uri1', 'uri2', 'score'),
+                                session=session)
+        return [row for row in rows if row[1] in term_uris]
+
     sim_matrix = dict()
-    for binding in r.json()['results']['bindings']:
-        uri1 = binding['uri1']['value']
-        uri2 = binding['uri2']['value']
-        if uri1 in term_uris and uri2 in term_uris:
-            sim_matrix[(uri1, uri2)] = np.log2(float(binding['score']['value']))
-    max_score = max(sim_matrix.values())
-    for k in sim_matrix:
-        sim_matrix[k] /= max_score
+    results = map_bounded(query_chunk, chunked(sorted(term_uris), chunk_size),
+                          max_workers=max_workers, return_exceptions=False)
+    for rows in results:
+        for uri1, uri2, score in rows:
+            sim_matrix[(uri1, uri2)] = np.log2(float(score))
+    if sim_matrix:
+        max_score = max(sim_matrix.values())
+        for k in sim_matrix:
+            sim_matrix[k] /= max_score
     return similarity
 
 
-def get_pp_terms(corpus_graph_terms, crs_threshold=5):
+def values_block(var, uris):
+    """
+    :return: SPARQL VALUES clause binding `var` to `uris`
+    """
+    return 'VALUES ?{} {{ {} }}'.format(
+        var, ' '.join('<{}>'.format(uri) for uri in uris))
+
+
+def chunked(items, size):
+    """
+    Yield lists of `size` consecutive elements of `items` (the last one
+    may be shorter).
+    """
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_pp_terms(corpus_graph_terms, crs_threshold=5, session=None,
+                 sparql_endpoint=DEFAULT_SPARQL_ENDPOINT):
     """
     Load all terms with combinedRelevanceScore is greater than CRS_threshold
     from the graph corpus_graph_terms.
 
     :param corpus_graph_terms: uri of the graph
     :param crs_threshold: min combinedRelevanceScore of term to be returned
+    :param session: optional `requests` session, see `get_sparql_session()`
+    :param sparql_endpoint: url of the SPARQL endpoint
     :return:
     """
-    params = {
-        'default-graph-uri': '{}'.format(corpus_graph_terms),
-        'query': """
+    query = """
 select ?termUri ?name ?score where {{
   ?termUri <http://schema.semantic-web.at/ppcm/2013/5/combinedRelevanceScore> ?score .
   ?termUri <http://schema.semantic-web.at/ppcm/2013/5/name> ?name .
   filter (?score > {})
-}} order by desc(?score)""".format(crs_threshold),
-        'format': 'json',
-    }
-    r = requests.get('https://aligned-virtuoso.poolparty.biz/sparql',
-                     params=params)
+}} order by desc(?score)""".format(crs_threshold)
+    rows = iter_sparql_rows(sparql_endpoint,
+                            query, default_graph_uri=corpus_graph_terms,
+                            columns=('termUri', 'name', 'score'),
+                            session=session)
     top_terms_scores = dict()
     top_terms_uris = dict()
-    for new_term in r.json()['results']['bindings']:
-        name = new_term['name']['value']
-        score = float(new_term['score']['value'])
-        term_uri = new_term['termUri']['value']
-        top_terms_scores[name] = score
+    for term_uri, name, score in rows:
+        top_terms_scores[name] = float(score)
         top_terms_uris[name] = term_uri
     return top_terms_scores, top_terms_uris
 
@@ -102,45 +780,73 @@ select distinct * where {{
 
 
 def query_sparql_endpoint(sparql_endpoint, query=all_data_q):
+    """
+    Run any query (also ASK, CONSTRUCT and DESCRIBE) through rdflib.
+
+    For SELECT queries, `get_sparql_client(sparql_endpoint).query(query)`
+    returns the same rows as tuples of rdflib terms over a pooled
+    connection, optionally cached.
+
+    :return: rdflib query result
+    """
     graph = rdflib.ConjunctiveGraph('SPARQLStore')
     rt = graph.open(sparql_endpoint)
     rs = graph.query(query)
     return rs
 
 
-def get_ridfs(sparql_endpoint, termsgraph):
+def get_ridfs(sparql_endpoint, termsgraph, client=None, executor=None):
+    """
+    :param client: optional `SparqlClient` of the endpoint
+    :param executor: optional `ShardedExecutor` to split the query (by term)
+    :return: dict lemma -> combinedRelevanceScore
+    """
     q_term_scores = """
     select distinct ?lemma ?ridf ?crs where {{
       GRAPH <{}> {{
         ?s <http://schema.semantic-web.at/ppcm/2013/5/textValue> ?lemma .
         ?s <http://schema.semantic-web.at/ppcm/2013/5/ridfTermScore> ?ridf .
         ?s <http://schema.semantic-web.at/ppcm/2013/5/combinedRelevanceScore> ?crs .
+        {{shard_filter}}
       }}  
     }}
     """.format(termsgraph)
-    rs = query_sparql_endpoint(sparql_endpoint, q_term_scores)
+    rs = _select_rows(sparql_endpoint, q_term_scores, 's', client=client,
+                      executor=executor, columns=('lemma', 'ridf', 'crs'))
     results = dict()
     for r in rs:
         results[str(r[0])] = float(r[2])
     return results
 
 
-def query_cpt_cooc_scores(sparql_endpoint, cpt_cooc_graph):
-    q_cooc_score = """
+Q_CPT_COOC_SCORES = """
 select distinct ?cpt1 ?cpt2 ?score where {{
   GRAPH <{}> {{
   ?cpt1 <http://schema.semantic-web.at/ppcm/2013/5/hasConceptCooccurrence> ?o .
   ?o <http://schema.semantic-web.at/ppcm/2013/5/cooccurringExtractedConcept> ?cpt2 .
   ?o <http://schema.semantic-web.at/ppcm/2013/5/score> ?score
+  {{shard_filter}}
   }}
 }}
-""".format(cpt_cooc_graph)
-    rs = query_sparql_endpoint(sparql_endpoint, q_cooc_score)
+"""
+
+
+def query_cpt_cooc_scores(sparql_endpoint, cpt_cooc_graph, session=None,
+                          client=None, executor=None):
+    """
+    :param session: optional `requests` session
+    :param client: optional `SparqlClient` of the endpoint
+    :param executor: optional `ShardedExecutor` to split the query (by
+        first concept)
+    :return: dict of dicts cpt1 -> cpt2 -> score, in both directions
+    """
+    client = get_sparql_client(sparql_endpoint, client=client, session=session)
+    rows = _select_rows(sparql_endpoint, Q_CPT_COOC_SCORES.format(cpt_cooc_graph),
+                        'cpt1', client=client, executor=executor,
+                        columns=('cpt1', 'cpt2', 'score'))
     dist_mx = dict()
-    for r in rs:
-        cpt1 = str(r[0])
-        cpt2 = str(r[1])
-        score = float(r[2])
+    for cpt1, cpt2, score in rows:
+        score = float(score)
         try:
             dist_mx[cpt1][cpt2] = score
         except KeyError:
@@ -152,27 +858,49 @@ select distinct ?cpt1 ?cpt2 ?score where {{
     return dist_mx
 
 
-def query_terms2cpts_cooc_scores(sparql_endpoint, cpt_cooc_graph, terms_graph):
-    q_cooc_cpt_score = """
-    select distinct ?tv (group_concat(?cpt;separator="|") as ?cpts) (group_concat(?c_score;separator="|") as ?c_scores) where {{
-      ?s <http://schema.semantic-web.at/ppcm/2013/5/hasConceptCooccurrence> ?co_cpt .
-      ?s <http://schema.semantic-web.at/ppcm/2013/5/textValue> ?tv .
-      ?co_cpt <http://schema.semantic-web.at/ppcm/2013/5/cooccurringExtractedConcept> ?cpt .
-      ?co_cpt <http://schema.semantic-web.at/ppcm/2013/5/score> ?c_score .
-    }}
+def query_cpt_cooc_arrays(sparql_endpoint, cpt_cooc_graph, session=None,
+                          uri_index=None, client=None, executor=None):
     """
-    q_cooc_term_score = """
-    select distinct ?tv (group_concat(?cooc_term;separator="|") as ?cooc_terms) (group_concat(?t_score;separator="|") as ?t_scores) where {{
-      ?s <http://schema.semantic-web.at/ppcm/2013/5/textValue> ?tv .
-      ?s <http://schema.semantic-web.at/ppcm/2013/5/hasTermCooccurrence> ?co_term .
-      ?co_term <http://schema.semantic-web.at/ppcm/2013/5/cooccurringExtractedTerm> ?term_view .
-      ?term_view <http://schema.semantic-web.at/ppcm/2013/5/textValue> ?cooc_term .
-      ?co_term <http://schema.semantic-web.at/ppcm/2013/5/score> ?t_score .
-    }}
+    Concept cooccurrence scores as arrays, for graphs too large for
+    `query_cpt_cooc_scores()`.
+
+    :return: (dict with int64 arrays 'cpt1', 'cpt2' and float64 array
+        'score', list of concept uris indexed by id), see `rows_to_arrays()`
+    """
+    columns = ('cpt1', 'cpt2', 'score')
+    client = get_sparql_client(sparql_endpoint, client=client, session=session)
+    rows = _select_rows(sparql_endpoint, Q_CPT_COOC_SCORES.format(cpt_cooc_graph),
+                        'cpt1', client=client, executor=executor,
+                        columns=columns)
+    return rows_to_arrays(rows, columns, uri_columns=('cpt1', 'cpt2'),
+                          float_columns=('score',), uri_index=uri_index)
+
+
+def query_terms2cpts_cooc_scores(sparql_endpoint, cpt_cooc_graph, terms_graph,
+                                 client=None, executor=None):
     """
+    The rows are streamed flat and grouped here (see
+    `iter_terms2cpts_cooc_rows()`), instead of being concatenated into
+    strings by the server.
+
+    :param client: optional `SparqlClient` of the endpoint
+    :param executor: optional `ShardedExecutor` to split the query (by term)
+    :return: dict term text value -> concept -> score
+    """
+    rows = iter_terms2cpts_cooc_rows(sparql_endpoint, cpt_cooc_graph,
+                                     terms_graph, client=client,
+                                     executor=executor)
+    cooc_dict = dict()
+    for text_value, cpt, score in rows:
+        try:
+            cooc_dict[text_value][cpt] = float(score)
+        except KeyError:
+            cooc_dict[text_value] = {cpt: float(score)}
+    return cooc_dict
+
 
-    q_cooc_cpt_score = """
-select distinct ?tv (group_concat(?cpt;separator="|") as ?cpts) (group_concat(?c_score;separator="|") as ?c_scores) where {{
+Q_TERMS2CPTS_COOC_SCORES = """
+select distinct ?tv ?cpt ?c_score where {{
   GRAPH <{cooc_graph}> {{
     ?s <http://schema.semantic-web.at/ppcm/2013/5/hasConceptCooccurrence> ?co_cpt .
     ?co_cpt <http://schema.semantic-web.at/ppcm/2013/5/cooccurringExtractedConcept> ?cpt .
@@ -182,19 +910,24 @@ select distinct ?tv (group_concat(?cpt;separator="|") as ?cpts) (group_concat(?c
   {{
     ?s <http://schema.semantic-web.at/ppcm/2013/5/textValue> ?tv .
   }}
+  {{shard_filter}}
 }}
-""".format(cooc_graph=cpt_cooc_graph, terms_graph=terms_graph)
-    cpt_rs = query_sparql_endpoint(
-        sparql_endpoint, query=q_cooc_cpt_score
-    )
-    cooc_dict = dict()
-    for r in cpt_rs:
-        text_value, cooc_cpts, t_scores = r
-        cooc_cpts = cooc_cpts.split('|')
-        t_scores = list(map(float, t_scores.split('|')))
-        cpts_scores = dict(zip(cooc_cpts, t_scores))
-        cooc_dict[text_value.toPython()] = cpts_scores
-    return cooc_dict
+"""
+
+
+def iter_terms2cpts_cooc_rows(sparql_endpoint, cpt_cooc_graph, terms_graph,
+                              client=None, executor=None):
+    """
+    Stream the cooccurrences of terms and concepts as flat rows.
+
+    :param client: optional `SparqlClient` of the endpoint
+    :param executor: optional `ShardedExecutor` to split the query (by term)
+    :return: generator of (term text value, concept uri, score string)
+    """
+    query = Q_TERMS2CPTS_COOC_SCORES.format(cooc_graph=cpt_cooc_graph,
+                                            terms_graph=terms_graph)
+    return _select_rows(sparql_endpoint, query, 's', client=client,
+                        executor=executor, columns=('tv', 'cpt', 'c_score'))
 
 
 if __name__ == '__main__':
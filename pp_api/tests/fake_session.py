@@ -0,0 +1,94 @@
+"""
+Offline stand-in for a `requests` session, routing the calls of the
+clients to handler functions, for the tests without a server.
+"""
+import json
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import requests
+
+
+class FakeResponse:
+    def __init__(self, payload=None, status_code=200, method='GET', url='',
+                 content=None):
+        """
+        :param payload: JSON of the body
+        :param content: bytes of the body, instead of a payload
+        """
+        self.status_code = status_code
+        if content is None:
+            content = b'' if payload is None else json.dumps(payload).encode('utf-8')
+        self.content = content
+        self.text = content.decode('utf-8')
+        self.request = SimpleNamespace(method=method, url=url)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        return (self.content[i:i + chunk_size]
+                for i in range(0, len(self.content), chunk_size))
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError('{} Error'.format(self.status_code),
+                                     response=self)
+
+
+class FakeSession:
+    """
+    Session whose requests are answered by `handlers`, a dict
+    (method, url path) -> function(params, body) returning the payload or
+    a FakeResponse. The body is the json, or else the form data with the
+    contents of the uploaded files. The calls are recorded in `calls` as
+    (method, path, params, body), and their other keyword arguments (e.g.
+    timeout, files) in `kwargs`. Thread-safe, like the clients need.
+    """
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.calls = []
+        self.kwargs = []
+        self.auth = None
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, json=None, data=None,
+                files=None, **kwargs):
+        path = urlsplit(url).path
+        body = json
+        if body is None and (data is not None or files is not None):
+            body = dict(data or {})
+            for name, (_, content) in (files or {}).items():
+                body[name] = content
+        with self._lock:
+            self.calls.append((method, path, params, body))
+            self.kwargs.append(dict(kwargs, files=files))
+        result = self.handlers[(method, path)](params, body)
+        if not isinstance(result, FakeResponse):
+            result = FakeResponse(result, method=method, url=url)
+        return result
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def paths(self, method=None):
+        """
+        :return: list of the paths called (with `method`)
+        """
+        return [path for method_, path, _, _ in self.calls
+                if method is None or method == method_]
@@ -0,0 +1,106 @@
+"""
+Tests of the asyncio clients against a local aiohttp server.
+"""
+import unittest
+from datetime import datetime, timedelta, timezone
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+except ImportError:
+    web = None
+
+from pp_api.async_gs_calls import AsyncGraphSearch
+from pp_api.async_pp_calls import AsyncPoolParty
+
+
+async def extract(request):
+    form = await request.post()
+    if 'file' in form:
+        text = form['file'].file.read().decode('utf8')
+    else:
+        text = form['text']
+    if text == 'fail':
+        return web.json_response({'errorMessage': 'bad text'}, status=400)
+    request.app['extracted'].append(text)
+    return web.json_response({
+        'text': text, 'upload': 'file' in form,
+        'projectId': form['projectId'], 'language': form['language'],
+        'document': {'concepts': [{'uri': 'http://x/' + text, 'prefLabel': text,
+                                   'frequencyInDocument': 1, 'score': 100}]},
+    })
+
+
+async def search(request):
+    data = await request.json()
+    values = [f['value'] for f in data.get('searchFilters', ())
+              if f['field'] == 'identifier']
+    ids = [id_ for id_ in request.app['ids'] if not values or id_ in values]
+    return web.json_response({'total': len(ids),
+                              'results': [{'id': id_} for id_ in ids]})
+
+
+async def history(request):
+    return web.json_response([dict(request.query)])
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class TestAsyncClients(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        app = web.Application()
+        app['extracted'] = []
+        app['ids'] = ['http://x/doc1', 'http://x/doc2']
+        app.router.add_post('/extractor/api/extract', extract)
+        app.router.add_post('/GraphSearch/api/search', search)
+        app.router.add_get('/PoolParty/api/history/geo', history)
+        self.app = app
+        self.server = TestServer(app)
+        await self.server.start_server()
+        server = str(self.server.make_url(''))
+        self.pp = AsyncPoolParty(server, auth_data=('u', 'p'))
+        self.gs = AsyncGraphSearch(server, auth_data=('u', 'p'))
+
+    async def asyncTearDown(self):
+        await self.pp.close()
+        await self.gs.close()
+        await self.server.close()
+
+    async def test_extract(self):
+        r = await self.pp.extract('Wien', 'geo', lang='de')
+        self.assertEqual(('Wien', True, 'geo', 'de'),
+                         (r['text'], r['upload'], r['projectId'], r['language']))
+        self.assertEqual(['http://x/Wien'],
+                         [cpt['uri'] for cpt in self.pp.get_cpts_from_response(r)])
+
+    async def test_force_json(self):
+        r = await self.pp.extract('Wien', 'geo', force_json=True)
+        self.assertEqual(('Wien', False, 'en'),
+                         (r['text'], r['upload'], r['language']))
+
+    async def test_extract_many(self):
+        texts = ['t{}'.format(i) for i in range(10)]
+        responses = await self.pp.extract_many(texts[:4] + ['fail'] + texts[4:],
+                                               'geo', max_in_flight=3)
+        self.assertIn('bad text', str(responses[4]))
+        self.assertEqual(400, responses[4].status)
+        self.assertEqual(texts, [r['text'] for r in responses[:4] + responses[5:]])
+        self.assertEqual(sorted(texts), sorted(self.app['extracted']))
+        with self.assertRaises(Exception):
+            await self.pp.extract_many(['t', 'fail'], 'geo',
+                                       return_exceptions=False)
+
+    async def test_in_gs(self):
+        self.assertTrue(await self.gs.in_gs('http://x/doc1', 'space'))
+        self.assertFalse(await self.gs.in_gs('http://x/doc3', 'space'))
+
+    async def test_history_time_in_utc(self):
+        since = datetime(2020, 5, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+        self.assertEqual([{'fromTime': '2020-05-01T10:00:00Z'}],
+                         await self.pp.get_history('geo', since))
+        self.assertEqual([{'fromTime': '2020-05-01T12:00:00'}],
+                         await self.pp.get_history('geo', since.replace(tzinfo=None)))
+        self.assertEqual([{}], await self.pp.get_history('geo'))
+
+
+if __name__ == '__main__':
+    unittest.main()
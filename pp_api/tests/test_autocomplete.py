@@ -0,0 +1,99 @@
+import unittest
+
+from pp_api.autocomplete import AutocompleteIndex
+from pp_api.tests.test_thesaurus_snapshot import T, TTL
+
+
+class FakePoolParty:
+    lang = 'en'
+
+    def __init__(self):
+        self.cpts = dict()
+        self.calls = []
+
+    def export_project(self, pid):
+        self.calls.append(('export_project', pid))
+        return TTL
+
+    def get_cpts_info(self, uris, pid, lang=None):
+        self.calls.append(('get_cpts_info', pid, tuple(uris), lang))
+        return [self.cpts[uri] for uri in uris if uri in self.cpts]
+
+    def get_autocomplete(self, query_str, pid, lang='en'):
+        self.calls.append(('get_autocomplete', query_str, pid, lang))
+        return [('Paris', T + 'paris')] if query_str == 'par' else []
+
+
+class TestAutocompleteIndex(unittest.TestCase):
+    def setUp(self):
+        self.pp = FakePoolParty()
+        self.index = AutocompleteIndex.from_pp(self.pp, 'geo')
+        self.pp.calls.clear()
+
+    def test_like_snapshot(self):
+        self.assertEqual([('Vienna', T + 'vienna'), ('Vorarlberg', T + 'vorarlberg')],
+                         self.index.get_autocomplete('V'))
+        self.assertEqual([('Austria', T + 'austria')],
+                         self.index.get_autocomplete('Republic'))
+        self.assertEqual([('Österreich', T + 'austria')],
+                         self.index.get_autocomplete('ös', lang='de'))
+        self.assertEqual([('Vienna', T + 'vienna')],
+                         self.index.get_autocomplete('v', limit=1))
+        self.assertEqual([], self.pp.calls)
+
+    def test_rank(self):
+        self.index.set_labels(T + 'vienna', 'Vienna', ['Vindobona', 'Vi'])
+        self.assertEqual([T + 'vienna', T + 'vorarlberg'],
+                         [uri for _, uri in self.index.get_autocomplete('v', rank='length')])
+        self.index.weights = {T + 'vorarlberg': 10}
+        self.assertEqual([T + 'vorarlberg', T + 'vienna'],
+                         [uri for _, uri in self.index.get_autocomplete('v', rank='weight')])
+        self.assertEqual(
+            [T + 'vorarlberg', T + 'vienna'],
+            [uri for _, uri in self.index.get_autocomplete(
+                'v', rank=lambda query, label, pref_label, uri: -len(pref_label))])
+        with self.assertRaises(ValueError):
+            AutocompleteIndex(rank='random')
+
+    def test_set_labels_and_remove(self):
+        self.index.set_labels(T + 'graz', 'Graz')
+        self.index.set_labels(T + 'vienna', 'Vienna City')
+        self.assertEqual([('Graz', T + 'graz')], self.index.get_autocomplete('gr'))
+        self.assertEqual([('Vienna City', T + 'vienna')],
+                         self.index.get_autocomplete('vie', fallback=False))
+        self.assertEqual([], self.index.get_autocomplete('vindo', fallback=False))
+        self.index.remove(T + 'vienna')
+        self.assertEqual([], self.index.get_autocomplete('vie', fallback=False))
+        self.assertEqual([], self.index.get_autocomplete('wien', lang='de', fallback=False))
+
+    def test_refresh(self):
+        self.pp.cpts[T + 'vienna'] = {'uri': T + 'vienna', 'prefLabel': 'Wien',
+                                      'altLabels': ['Vienna']}
+        self.index.invalidate_uris('other', [T + 'austria'])
+        self.index.invalidate_uris('geo', [T + 'vienna', T + 'vorarlberg'])
+        self.assertEqual(2, self.index.refresh())
+        self.assertEqual(set(), self.index.stale_uris)
+        self.assertEqual([('Wien', T + 'vienna')],
+                         self.index.get_autocomplete('vi', fallback=False))
+        self.assertEqual([('Wien', T + 'vienna')],
+                         self.index.get_autocomplete('wi', lang='de', fallback=False))
+        self.assertEqual([], self.index.get_autocomplete('vor', fallback=False))
+        self.assertEqual({('get_cpts_info', 'geo', (T + 'vienna', T + 'vorarlberg'), lang)
+                          for lang in ('en', 'de')}, set(self.pp.calls))
+
+    def test_rebuild(self):
+        self.index.set_labels(T + 'graz', 'Graz')
+        self.index.invalidate_uris('geo')
+        self.index.refresh()
+        self.assertEqual([('export_project', 'geo')], self.pp.calls)
+        self.assertEqual([], self.index.get_autocomplete('gr', fallback=False))
+        self.assertEqual(0, self.index.refresh())
+
+    def test_fallback(self):
+        self.assertEqual([('Paris', T + 'paris')], self.index.get_autocomplete('par'))
+        self.assertEqual([], self.index.get_autocomplete('par', fallback=False))
+        self.assertEqual([('get_autocomplete', 'par', 'geo', 'en')], self.pp.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from pp_api.cache import BloomFilter, LRUCache, SqliteCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def make_cache(self):
+        return LRUCache(maxsize=2, ttl=60)
+
+    def test_get_or_set_counts_hits_and_misses(self):
+        cache = self.make_cache()
+        calls = []
+        fetch = lambda: calls.append(1) or ['label']
+        key = ('get_pref_labels', 'pid', ('http://x/1',), 'en')
+        self.assertEqual(['label'], cache.get_or_set(key, fetch))
+        self.assertEqual(['label'], cache.get_or_set(key, fetch))
+        self.assertEqual(1, len(calls))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1}, cache.stats())
+
+    def test_invalidate_where(self):
+        cache = self.make_cache()
+        cache.set(('a', 'pid', ('http://x/1',)), 1)
+        cache.set(('a', 'pid', ('http://x/2',)), 2)
+        removed = cache.invalidate_where(lambda k: 'http://x/1' in k[2])
+        self.assertEqual(1, removed)
+        self.assertIsNone(cache.get(('a', 'pid', ('http://x/1',))))
+        self.assertEqual(2, cache.get(('a', 'pid', ('http://x/2',))))
+
+    def test_ttl(self):
+        cache = self.make_cache()
+        cache.ttl = 0.01
+        cache.set(('k',), 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(('k',)))
+
+
+class TestBoundedLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=None)
+        cache.set(('a',), 1)
+        cache.set(('b',), 2)
+        cache.get(('a',))
+        cache.set(('c',), 3)
+        self.assertEqual([('a',), ('c',)], cache.keys())
+
+
+class TestSqliteCache(TestLRUCache):
+    def make_cache(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        cache = SqliteCache(Path(self.tmp_dir.name) / 'cache.db', ttl=60)
+        self.addCleanup(cache.close)
+        return cache
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives_few_false_positives(self):
+        bloom = BloomFilter(capacity=10000, error_rate=0.01)
+        bloom.update('http://doc/{}'.format(i) for i in range(10000))
+        self.assertTrue(all('http://doc/{}'.format(i) in bloom
+                            for i in range(10000)))
+        false_positives = sum('http://other/{}'.format(i) in bloom
+                              for i in range(10000))
+        self.assertLess(false_positives, 200)
+        self.assertEqual(10000, len(bloom))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from pp_api.cooccurrence import CooccurrenceMatrix
+
+
+class TestCooccurrenceMatrix(unittest.TestCase):
+    def setUp(self):
+        self.uris = ['http://x/a', 'http://x/b', 'http://x/c', 'http://x/d']
+        # a-b 4, a-c 2, b-c 8 (c-b repeated: the last one counts)
+        self.cooc = CooccurrenceMatrix.from_arrays(
+            rows=[0, 0, 1, 2], cols=[1, 2, 2, 1], scores=[4., 2., 1., 8.],
+            uris=self.uris)
+
+    def test_symmetric_scores(self):
+        self.assertEqual(6, len(self.cooc))
+        self.assertEqual(4., self.cooc.score('http://x/a', 'http://x/b'))
+        self.assertEqual(4., self.cooc.score('http://x/b', 'http://x/a'))
+        self.assertEqual(8., self.cooc.score('http://x/b', 'http://x/c'))
+        self.assertEqual(0., self.cooc.score('http://x/a', 'http://x/d'))
+        self.assertEqual(0., self.cooc.score('http://x/a', 'http://x/z'))
+        self.assertEqual(1., self.cooc.similarity('http://x/d', 'http://x/d'))
+
+    def test_batch_scores(self):
+        scores = self.cooc.scores(
+            ['http://x/a', 'http://x/c', 'http://x/z', 'http://x/d'],
+            ['http://x/c', 'http://x/b', 'http://x/a', 'http://x/a'],
+            default=-1.)
+        np.testing.assert_array_equal([2., 8., -1., -1.], scores)
+        matrix = self.cooc.similarity_matrix(['http://x/a', 'http://x/b'])
+        np.testing.assert_array_equal([[1., 4.], [4., 1.]], matrix)
+
+    def test_neighbours(self):
+        self.assertEqual([('http://x/c', 8.), ('http://x/a', 4.)],
+                         self.cooc.neighbours('http://x/b'))
+        self.assertEqual([('http://x/c', 8.)],
+                         self.cooc.neighbours('http://x/b', k=1))
+        self.assertEqual([], self.cooc.neighbours('http://x/d'))
+
+    def test_normalized(self):
+        self.assertEqual(0.5, self.cooc.normalized().score('http://x/a', 'http://x/b'))
+        row_max = self.cooc.normalized('row_max')
+        self.assertEqual(0.5, row_max.score('http://x/a', 'http://x/c'))
+        self.assertEqual(0.25, row_max.score('http://x/c', 'http://x/a'))
+
+    def test_dict_round_trip(self):
+        as_dict = self.cooc.to_dict()
+        self.assertEqual({'http://x/b': 4., 'http://x/c': 2.}, as_dict['http://x/a'])
+        again = CooccurrenceMatrix.from_dict(as_dict)
+        self.assertEqual(as_dict, again.to_dict())
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'cooc.npz'
+            self.cooc.save(path)
+            loaded = CooccurrenceMatrix.load(path)
+        self.assertEqual(self.uris, loaded.uris)
+        self.assertEqual(self.cooc.to_dict(), loaded.to_dict())
+
+    def test_save_load_packed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'cooc.pack'
+            self.cooc.save_packed(path)
+            loaded = CooccurrenceMatrix.load_packed(path)
+            self.assertEqual(self.uris, list(loaded.uris))
+            self.assertEqual(self.cooc.to_dict(), loaded.to_dict())
+            self.assertEqual(8., loaded.score('http://x/c', 'http://x/b'))
+            self.assertEqual([('http://x/c', 8.), ('http://x/a', 4.)],
+                             loaded.neighbours('http://x/b'))
+            np.testing.assert_array_equal(
+                [2., 0.], loaded.scores(['http://x/a', 'http://x/z'],
+                                        ['http://x/c', 'http://x/a']))
+            del loaded
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import random
+import unittest
+
+import io
+
+from pp_api.extractor_utils import (
+    ppextract2matches, remove_overlaps, resolve_overlaps, iter_resolve_overlaps,
+    apply_annotations
+)
+
+
+CPTS = [
+    {'prefLabel': 'Data', 'uri': 'http://x/1',
+     'matchings': [{'text': 'data', 'positions': [(0, 4), (20, 24)]}]},
+    {'prefLabel': 'Data security', 'uri': 'http://x/2',
+     'matchings': [{'text': 'data security', 'positions': [(0, 13)]}]},
+    {'prefLabel': 'Security', 'uri': 'http://x/3',
+     'matchings': [{'text': 'security', 'positions': [(5, 13)]}]},
+    {'prefLabel': 'Shadow', 'uri': 'http://x/4'},
+]
+
+
+class TestPPExtract2Matches(unittest.TestCase):
+    def test_tag_patterns(self):
+        edits = ppextract2matches(CPTS, tag='<START:x uri="{uri}">')
+        self.assertIn((0, 13, '<START:x uri="http://x/2">', 'data security'), edits)
+        edits = ppextract2matches(CPTS, tag='{prefLabel}@{start}')
+        self.assertIn((20, 24, 'Data@20', 'data'), edits)
+
+    def test_without_overlaps(self):
+        edits = ppextract2matches(CPTS, overlaps=False)
+        self.assertEqual([(0, 13, 'Data security', 'data security'),
+                          (20, 24, 'Data', 'data')], edits)
+
+
+class TestResolveOverlaps(unittest.TestCase):
+    def random_matches(self, n=2000, seed=0):
+        rnd = random.Random(seed)
+        matches = set()
+        while len(matches) < n:
+            start = rnd.randrange(10000)
+            matches.add((start, start + rnd.randint(1, 30), 'tag', 'text'))
+        return list(matches)
+
+    def test_longest_equals_remove_overlaps(self):
+        matches = self.random_matches()
+        self.assertEqual(remove_overlaps(matches), resolve_overlaps(matches))
+
+    def test_nested(self):
+        edits = ppextract2matches(CPTS)
+        edits.append((10, 16, 'Crossing', 'ity is'))
+        self.assertEqual(
+            [(0, 13, 'Data security', 'data security'),
+             (0, 4, 'Data', 'data'),
+             (5, 13, 'Security', 'security'),
+             (20, 24, 'Data', 'data')],
+            resolve_overlaps(edits, policy='nested'))
+
+    def test_score(self):
+        edits = ppextract2matches(CPTS)
+        scores = {'Data': 1, 'Data security': 2, 'Security': 3}
+        kept = resolve_overlaps(edits, policy='score',
+                                score=lambda m: scores[m[2]])
+        self.assertEqual([(0, 4, 'Data', 'data'),
+                          (5, 13, 'Security', 'security'),
+                          (20, 24, 'Data', 'data')], kept)
+
+    def test_streaming_requires_sorted_input(self):
+        with self.assertRaises(ValueError):
+            list(iter_resolve_overlaps([(5, 6, 'a', 'b'), (1, 2, 'a', 'b')]))
+
+
+class TestApplyAnnotations(unittest.TestCase):
+    text = 'Big data security & more data.'
+    edits = [(25, 29, 'Data', 'data'), (4, 17, 'Data security', 'data security')]
+
+    def test_opennlp(self):
+        self.assertEqual(
+            'Big <START:Data security> data security <END> & more '
+            '<START:Data> data <END>.',
+            apply_annotations(self.text, self.edits))
+
+    def test_xml_escapes_text(self):
+        self.assertEqual(
+            'Big <span class="Data security">data security</span> &amp; more '
+            '<span class="Data">data</span>.',
+            apply_annotations(self.text, self.edits, style='xml'))
+
+    def test_xml_custom_tags(self):
+        edits = [(25, 29, '<a href="http://x/data">', 'data'),
+                 (4, 17, 'Data security', 'data security')]
+        self.assertEqual(
+            'Big <em class="Data security">data security</em> &amp; more '
+            '<a href="http://x/data">data</a>.',
+            apply_annotations(self.text, edits, style='xml', element='em'))
+        with self.assertRaises(ValueError):
+            apply_annotations(self.text, [(4, 8, '< a>', 'data')], style='xml')
+
+    def test_bio_to_file(self):
+        out = io.StringIO()
+        self.assertIsNone(apply_annotations(self.text, self.edits,
+                                            style='bio', out=out))
+        self.assertEqual(
+            'Big\tO\ndata\tB-Data_security\nsecurity\tI-Data_security\n'
+            '&\tO\nmore\tO\ndata.\tB-Data\n',
+            out.getvalue())
+
+    def test_overlaps_are_rejected(self):
+        with self.assertRaises(ValueError):
+            apply_annotations(self.text, self.edits + [(9, 20, 'x', 'x')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+"""
+Tests of GraphSearch against a fake session, without a server.
+"""
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from pp_api.gs_calls import GraphSearch
+from pp_api.tests.fake_session import FakeResponse, FakeSession
+
+
+SEARCH = ('POST', '/GraphSearch/api/search')
+DELETE_ID = ('POST', '/GraphSearch/api/content/delete/id')
+CREATE = ('POST', '/GraphSearch/api/content/create')
+
+
+class FakeSearchSpace:
+    """
+    Documents of one search space. Deletes become visible to searches
+    only after `commit_delay` further searches, like an index committing
+    asynchronously.
+    """
+
+    def __init__(self, ids, commit_delay=0, fail_ids=(), with_total=True,
+                 delays=None):
+        self.ids = list(ids)
+        self.commit_delay = commit_delay
+        self.fail_ids = set(fail_ids)
+        self.with_total = with_total
+        # start -> seconds of latency
+        self.delays = delays or {}
+        self.pending = []  # [searches left, id]
+        self.lock = threading.Lock()
+
+    def handlers(self):
+        return {SEARCH: self.search, DELETE_ID: self.delete}
+
+    def search(self, params, data):
+        with self.lock:
+            for entry in self.pending:
+                entry[0] -= 1
+            for _, id_ in [x for x in self.pending if x[0] < 0]:
+                self.ids.remove(id_)
+            self.pending = [x for x in self.pending if x[0] >= 0]
+            ids = self.ids
+            id_filters = [f['value'] for f in data.get('searchFilters', ())
+                          if f['field'] == 'identifier']
+            if id_filters:
+                # Loose matching, like a tokenized field
+                ids = [id_ for id_ in ids
+                       if any(id_.startswith(value) for value in id_filters)]
+            start = data.get('start', 0)
+            page = ids[start:start + data['count']]
+            total = len(ids)
+        time.sleep(self.delays.get(start, 0))
+        response = {'results': [{'id': id_} for id_ in page]}
+        if self.with_total:
+            response['total'] = total
+        return response
+
+    def delete(self, params, data):
+        id_ = data['identifier']
+        if id_ in self.fail_ids:
+            return FakeResponse({'message': 'locked'}, status_code=500,
+                                method='POST', url='delete')
+        with self.lock:
+            self.pending.append([self.commit_delay, id_])
+        return {}
+
+
+def graph_search(handlers):
+    session = FakeSession(handlers)
+    return GraphSearch('http://gs', auth_data=('u', 'p'), session=session), session
+
+
+class TestDeleteAll(unittest.TestCase):
+    def test_immediate_commits(self):
+        space = FakeSearchSpace(['d{}'.format(i) for i in range(7)])
+        gs, _ = graph_search(space.handlers())
+        result = gs.delete_all('space', page_size=3)
+        self.assertEqual(7, result['deleted'])
+        self.assertEqual({}, result['failed'])
+        self.assertEqual([], space.ids)
+
+    def test_delayed_commits(self):
+        for delay in range(4):
+            space = FakeSearchSpace(['d{}'.format(i) for i in range(10)],
+                                    commit_delay=delay)
+            gs, _ = graph_search(space.handlers())
+            result = gs.clean('space', page_size=2, max_workers=2)
+            self.assertEqual(10, result['deleted'], delay)
+            # Whatever is still pending is committed by later searches
+            for _ in range(delay + 1):
+                gs.search('space', count=0)
+            self.assertEqual([], space.ids, delay)
+
+    def test_failures_are_collected(self):
+        space = FakeSearchSpace(['d{}'.format(i) for i in range(5)],
+                                fail_ids={'d1', 'd3'})
+        gs, session = graph_search(space.handlers())
+        result = gs.delete_all('space', page_size=2)
+        self.assertEqual(3, result['deleted'])
+        self.assertEqual({'d1', 'd3'}, set(result['failed']))
+        self.assertEqual(['d1', 'd3'], space.ids)
+        # Every document is tried once
+        self.assertEqual(5, session.paths().count(DELETE_ID[1]))
+
+
+
+class TestIterSearch(unittest.TestCase):
+    def starts(self, session):
+        return sorted(body['start'] for _, _, _, body in session.calls)
+
+    def test_pages_in_order(self):
+        ids = ['d{}'.format(i) for i in range(25)]
+        # The first page is slower than the prefetched second one
+        space = FakeSearchSpace(ids, delays={0: 0.05})
+        gs, session = graph_search(space.handlers())
+        docs = gs.iter_search('space', page_size=10)
+        self.assertEqual(ids, [doc['id'] for doc in docs])
+        self.assertEqual([0, 10, 20], self.starts(session)[:3])
+        self.assertLessEqual(len(session.calls), 4)
+        body = session.calls[0][3]
+        self.assertEqual(([], []), (body['documentFacets'], body['searchFacets']))
+
+    def test_stops_on_short_page(self):
+        for prefetch in (False, True):
+            ids = ['d{}'.format(i) for i in range(28)]
+            space = FakeSearchSpace(ids, with_total=False)
+            gs, session = graph_search(space.handlers())
+            pages = list(gs.iter_search('space', page_size=10, prefetch=prefetch,
+                                        start=5, pages=True))
+            self.assertEqual([ids[5:15], ids[15:25], ids[25:]],
+                             [[doc['id'] for doc in page['results']] for page in pages])
+            # The short page ends the search without asking for an empty one
+            self.assertEqual([5, 15, 25], self.starts(session)[:3])
+            self.assertLessEqual(len(session.calls), 4 if prefetch else 3)
+
+
+class TestInGs(unittest.TestCase):
+    def setUp(self):
+        self.space = FakeSearchSpace(['d{}'.format(i) for i in range(25)])
+        self.gs, self.session = graph_search(self.space.handlers())
+
+    def searched_ids(self):
+        return [{f['value'] for f in body['searchFilters']}
+                for _, _, _, body in self.session.calls]
+
+    def test_in_gs(self):
+        self.assertTrue(self.gs.in_gs('d3', 'space'))
+        self.assertFalse(self.gs.in_gs('d30', 'space'))
+        # d1 matches d1x loosely, but is not contained itself
+        del self.space.ids[1]
+        self.assertFalse(self.gs.in_gs('d1', 'space'))
+
+    def test_in_gs_many(self):
+        uris = ['d{}'.format(i) for i in range(0, 40, 3)]
+        found = self.gs.in_gs_many(uris, 'space', batch_size=4, max_workers=2)
+        self.assertEqual({'d{}'.format(i) for i in range(0, 25, 3)}, found)
+        batches = self.searched_ids()
+        self.assertEqual([4, 4, 4, 2], [len(ids) for ids in batches])
+        self.assertEqual(set(uris), set.union(*batches))
+        for _, _, _, body in self.session.calls:
+            self.assertEqual(len(body['searchFilters']), body['count'])
+            self.assertTrue(all(f['optional'] for f in body['searchFilters']))
+
+    def test_known_ids(self):
+        known_ids = self.gs.load_known_ids('space', page_size=10)
+        self.assertEqual(25, len(known_ids))
+        # A count=0 search for the capacity, then the pages
+        counts = [body['count'] for _, _, _, body in self.session.calls]
+        self.assertEqual([0, 10, 10, 10], counts[:4])
+        self.session.calls.clear()
+        # A false positive of the filter is checked with the server
+        known_ids.add('x1')
+        found = self.gs.in_gs_many(['d2', 'd24', 'x1', 'x2', 'x3'], 'space',
+                                   known_ids=known_ids)
+        self.assertEqual({'d2', 'd24'}, found)
+        # d2 also matches d20 to d24 loosely, so the batch is searched
+        # again for all of its matches
+        self.assertEqual([{'d2', 'd24', 'x1'}] * 2, self.searched_ids())
+        self.assertEqual([3, 6], [body['count'] for _, _, _, body in self.session.calls])
+
+
+
+class TestBulkCreate(unittest.TestCase):
+    def setUp(self):
+        def create(params, data):
+            if data['identifier'] == 'bad':
+                return FakeResponse({'message': 'invalid'}, status_code=400,
+                                    method='POST', url=CREATE[1])
+            # Earlier documents are slower, so they finish last
+            time.sleep(0.02 / (1 + len(self.created)))
+            self.created.append(data)
+            return {}
+
+        self.created = []
+        self.gs, self.session = graph_search({CREATE: create})
+
+    def doc(self, id_, **fields):
+        return dict(id_=id_, title='Title ' + id_, author='me',
+                    date=datetime(2020, 5, 1), text='Text of ' + id_, **fields)
+
+    def test_results_and_failures(self):
+        ids = ['d{}'.format(i) for i in range(8)]
+        docs = [self.doc(id_) for id_ in ids[:3]] + [self.doc('bad')] + \
+            [self.doc(id_) for id_ in ids[3:]]
+        result = self.gs.bulk_create(iter(docs), 'space', max_workers=3)
+        self.assertEqual(ids[:3] + ['bad'] + ids[3:],
+                         [id_ for id_, _ in result['results']])
+        self.assertEqual([None] * 3, [error for _, error in result['results'][:3]])
+        self.assertIn('invalid', str(result['results'][3][1]))
+        self.assertEqual(8, result['succeeded'])
+        self.assertEqual(1, result['failed'])
+        self.assertEqual(set(ids), {data['identifier'] for data in self.created})
+
+    def test_invalid_documents(self):
+        docs = [self.doc('d0'), self.doc('d1'), self.doc('d2')]
+        del docs[1]['id_'], docs[1]['text']
+        with self.assertRaisesRegex(ValueError, 'Document 1 has no id_, text'):
+            self.gs.bulk_create(docs, 'space')
+        # A list is checked before anything is indexed
+        self.assertEqual([], self.session.calls)
+        with self.assertRaisesRegex(ValueError, 'Document 1 has no id_'):
+            self.gs.bulk_create(iter(docs), 'space', max_workers=1)
+
+    def test_fields_named_like_arguments(self):
+        cpts = [{'uri': 'http://t/vienna', 'frequencyInDocument': 2}]
+        docs = [self.doc('d0', update='weekly', search_space_id='other',
+                         image_url='http://img'),
+                self.doc('d1', cpts=cpts, update='daily')]
+        result = self.gs.bulk_create(docs, 'space')
+        self.assertEqual(0, result['failed'], result['results'])
+        created = {data['identifier']: data for data in self.created}
+        self.assertEqual({'space'}, {data['searchSpaceId'] for data in self.created})
+        self.assertEqual('weekly', created['d0']['update'])
+        self.assertEqual('other', created['d0']['search_space_id'])
+        self.assertEqual(['http://img'], created['d0']['dyn_txt_imageUrl'])
+        self.assertEqual('daily', created['d1']['update'])
+        self.assertEqual(['http://t/vienna'], created['d1']['facets']['dyn_uri_all_concepts'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from pp_api.cache import LRUCache
+from pp_api.history import HistoryInvalidator, get_event_time, get_event_uris
+from pp_api.pp_calls import PoolParty
+from pp_api.tests.fake_session import FakeSession
+
+
+T = 'http://localhost:8082/test/'
+CONCEPTS = ('GET', '/PoolParty/api/thesaurus/geo/concepts')
+HISTORY = ('GET', '/PoolParty/api/history/geo')
+
+
+class TestEvents(unittest.TestCase):
+    def test_get_event_uris(self):
+        self.assertEqual({T + 'vienna'}, get_event_uris({
+            'affectedResource': T + 'vienna',
+            'property': 'http://www.w3.org/2004/02/skos/core#prefLabel',
+            'oldValue': 'http://example.org/a literal that looks like a uri',
+            'newValue': 'Wien',
+        }))
+        self.assertEqual({T + 'vienna', T + 'austria'}, get_event_uris({
+            'sourceConcept': {'uri': T + 'vienna'},
+            'targetConcept': T + 'austria',
+        }))
+        self.assertEqual(set(), get_event_uris({'affectedResource': 'Vienna'}))
+
+    def test_get_event_time(self):
+        expected = datetime(2020, 5, 1, 10, 30, tzinfo=timezone.utc)
+        self.assertEqual(expected, get_event_time({'timestamp': '2020-05-01T10:30:00Z'}))
+        self.assertEqual(expected, get_event_time({'timestamp': '2020-05-01T12:30:00+02:00'}))
+        self.assertEqual(expected, get_event_time({'timestamp': '2020-05-01T10:30:00'}))
+        self.assertEqual(expected, get_event_time({'timestamp': 1588329000000}))
+        self.assertIsNone(get_event_time({'timestamp': 'yesterday'}))
+        self.assertIsNone(get_event_time({}))
+
+
+class TestHistoryInvalidator(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        session = FakeSession({
+            CONCEPTS: lambda params, data: [
+                {'prefLabel': uri.rsplit('/', 1)[-1].title()}
+                for uri in params['concepts']],
+            HISTORY: lambda params, data: self.events,
+        })
+        self.session = session
+        self.pp = PoolParty('http://pp', auth_data=('u', 'p'), session=session,
+                            cache=LRUCache())
+        self.since = datetime(2020, 5, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+        self.invalidator = HistoryInvalidator(self.pp, 'geo', since=self.since,
+                                              overlap=5)
+
+    def test_poll_invalidates_changed_uris(self):
+        for uri in ('vienna', 'graz'):
+            self.assertEqual([uri.title()], self.pp.get_pref_labels([T + uri], 'geo'))
+        self.events = [{'affectedResource': T + 'vienna',
+                        'timestamp': '2020-05-01T10:10:00Z'}]
+        self.assertEqual({T + 'vienna'}, self.invalidator.poll())
+        self.assertIsNone(self.pp.cache.get(('get_pref_labels', 'geo', (T + 'vienna',), 'en')))
+        self.assertEqual(['Graz'], self.pp.cache.get(('get_pref_labels', 'geo', (T + 'graz',), 'en')))
+        self.pp.get_pref_labels([T + 'vienna'], 'geo')
+        self.pp.get_pref_labels([T + 'graz'], 'geo')
+        self.assertEqual(3, self.session.paths().count(CONCEPTS[1]))
+
+    def test_from_time_is_utc_and_follows_events(self):
+        self.events = [{'affectedResource': T + 'vienna', 'timestamp': '2020-05-01T10:20:00Z'},
+                       {'affectedResource': T + 'graz', 'timestamp': 1588328100000}]
+        self.invalidator.poll()
+        # 12:00 at UTC+2, less the overlap
+        self.assertEqual({'fromTime': '2020-05-01T09:59:55Z'}, self.session.calls[-1][2])
+        # The server returns the newest event again
+        self.invalidator.poll()
+        self.invalidator.poll()
+        self.assertEqual([{'fromTime': '2020-05-01T10:19:55Z'}] * 2,
+                         [call[2] for call in self.session.calls[-2:]])
+
+    def test_without_event_times_follows_the_clock(self):
+        for events in ([], [{'affectedResource': T + 'vienna'}]):
+            self.events = events
+            before = datetime.now(timezone.utc).replace(microsecond=0)
+            self.invalidator.poll()
+            self.invalidator.poll()
+            from_time = datetime.strptime(self.session.calls[-1][2]['fromTime'],
+                                          '%Y-%m-%dT%H:%M:%SZ')
+            from_time = from_time.replace(tzinfo=timezone.utc)
+            # Started at the first poll, less the overlap
+            self.assertLessEqual(before - timedelta(seconds=5), from_time)
+            self.assertLessEqual(from_time, datetime.now(timezone.utc))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from pathlib import Path
+
+from pp_api.local_extractor import LabelAutomaton, LocalExtractor
+
+
+class TestLabelAutomaton(unittest.TestCase):
+    def test_overlapping_matches(self):
+        automaton = LabelAutomaton(['data', 'data security', 'security', 'ta s'])
+        matches = sorted(automaton.iter_matches('big data security'))
+        self.assertEqual(
+            [(4, 8, 0), (4, 17, 1), (6, 10, 3), (9, 17, 2)], matches
+        )
+
+
+class TestLocalExtractor(unittest.TestCase):
+    def setUp(self):
+        ttl = Path(__file__).parent / 'data' / 'minimal_taxonomy.ttl'
+        self.extractor = LocalExtractor.from_export(ttl.read_bytes(),
+                                                    format='turtle')
+
+    def test_extract(self):
+        text = 'A Leaf falls from the top. Leafs, leaf!'
+        cpts = {x['uri']: x for x in self.extractor.extract(text)}
+        leaf = cpts['http://localhost:8082/test/3']
+        self.assertEqual('Leaf', leaf['prefLabel'])
+        self.assertEqual(2, leaf['frequencyInDocument'])
+        self.assertEqual(['http://localhost:8082/test/2'],
+                         leaf['transitiveBroaderConcepts'])
+        self.assertEqual(['http://localhost:8082/test/1'],
+                         [x['uri'] for x in leaf['conceptSchemes']])
+        positions = sorted(p for m in leaf['matchings'] for p in m['positions'])
+        self.assertEqual([(2, 6), (34, 38)], positions)
+        for start, end in positions:
+            self.assertEqual('leaf', text[start:end].lower())
+        self.assertEqual(1, cpts['http://localhost:8082/test/2']['frequencyInDocument'])
+
+    def test_result_has_response_shape(self):
+        cpt = self.extractor.extract('top')[0]
+        for attr in ['prefLabel', 'prefLabels', 'frequencyInDocument', 'uri',
+                     'score', 'transitiveBroaderConcepts',
+                     'transitiveBroaderTopConcepts', 'relatedConcepts',
+                     'conceptSchemes', 'matchings']:
+            self.assertIn(attr, cpt)
+
+    def test_labels_equal_up_to_case_count_once(self):
+        ttl = '''
+            @prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+            <http://x/ai> a skos:Concept; skos:prefLabel "AI"@en;
+                skos:altLabel "ai"@en; skos:hiddenLabel "AI"@en, "Ai" .
+        '''
+        extractor = LocalExtractor.from_export(ttl, format='turtle')
+        cpt, = extractor.extract('We study AI.')
+        self.assertEqual(1, cpt['frequencyInDocument'])
+        self.assertEqual([{'lemma': 'AI', 'text': 'AI', 'frequency': 1,
+                           'positions': [(9, 11)]}], cpt['matchings'])
+
+    def test_filter_nested(self):
+        matches = [(0, 4, 0), (0, 13, 1), (5, 13, 2), (0, 13, 3), (10, 20, 4)]
+        self.assertEqual([(0, 13, 1), (0, 13, 3), (10, 20, 4)],
+                         LocalExtractor._filter_nested(matches))
+
+
+if __name__ == '__main__':
+    unittest.main()
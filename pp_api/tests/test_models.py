@@ -0,0 +1,90 @@
+import copy
+import unittest
+
+from pp_api.models.models import ConceptMatching, ExtractedConcept
+from pp_api.pp_calls import PoolParty
+
+
+T = 'http://localhost:8082/test/'
+
+# Shortened extractor response, showMatchingDetails and
+# showMatchingPosition on
+RESPONSE = {
+    'document': {
+        'concepts': [
+            {
+                'id': T + 'vienna',
+                'uri': T + 'vienna',
+                'prefLabel': 'Vienna',
+                'prefLabels': {'en': 'Vienna', 'de': 'Wien'},
+                'frequencyInDocument': 3,
+                'score': 100,
+                'transitiveBroaderConcepts': [T + 'austria', T + 'europe'],
+                'transitiveBroaderTopConcepts': [T + 'europe'],
+                'relatedConcepts': [],
+                'conceptSchemes': [{'uri': T + 'scheme', 'title': 'Geography'}],
+                'matchingLabels': [
+                    {'label': 'Vienna', 'language': 'en', 'matchedTexts': [
+                        {'matchedText': 'Vienna', 'frequency': 2, 'positions': [
+                            {'beginningIndex': 0, 'endIndex': 5},
+                            {'beginningIndex': 40, 'endIndex': 45}]},
+                        {'matchedText': 'vienna', 'frequency': 1, 'positions': [
+                            {'beginningIndex': 60, 'endIndex': 65}]},
+                    ]},
+                ],
+            },
+            {
+                # Without matchings and most optional attributes
+                'uri': T + 'austria',
+                'prefLabel': 'Austria',
+                'frequencyInDocument': 1,
+                'score': 20.5,
+            },
+        ],
+    },
+}
+
+
+class TestExtractedConcept(unittest.TestCase):
+    def test_round_trip(self):
+        vienna, austria = RESPONSE['document']['concepts']
+        cpt = ExtractedConcept.from_json(vienna).to_dict()
+        self.assertEqual(T + 'vienna', cpt['uri'])
+        self.assertEqual(['Vienna', 'vienna'], [m['text'] for m in cpt['matchings']])
+        self.assertEqual([(0, 6), (40, 46)], cpt['matchings'][0]['positions'])
+        self.assertEqual([T + 'austria', T + 'europe'], cpt['transitiveBroaderConcepts'])
+        cpt = ExtractedConcept.from_json(austria).to_dict()
+        self.assertNotIn('matchings', cpt)
+        self.assertEqual([], cpt['prefLabels'])
+
+    def test_compact_matches_dicts(self):
+        response = copy.deepcopy(RESPONSE)
+        dicts = PoolParty.get_cpts_from_response(response)
+        compact = PoolParty.get_cpts_from_response(response, compact=True)
+        self.assertEqual(2, len(compact))
+        self.assertEqual(dicts, [cpt.to_dict() for cpt in compact])
+        # Read access like the dicts (with tuples for the lists of uris)
+        for cpt_dict, cpt in zip(dicts, compact):
+            self.assertEqual(set(cpt_dict), set(cpt.keys()))
+            for key, value in cpt_dict.items():
+                if key == 'matchings':
+                    self.assertEqual(value, [m.to_dict() for m in cpt[key]])
+                elif isinstance(cpt[key], tuple):
+                    self.assertEqual(value, list(cpt[key]))
+                else:
+                    self.assertEqual(value, cpt[key])
+        self.assertIn('matchings', compact[0])
+        self.assertNotIn('matchings', compact[1])
+        self.assertEqual([], compact[1].get('relatedConcepts'))
+        with self.assertRaises(KeyError):
+            compact[0]['id']
+
+    def test_matching(self):
+        matching = ConceptMatching('Vienna', 'vienna', 2, [(0, 6), (40, 46)])
+        self.assertEqual({'lemma': 'Vienna', 'text': 'vienna', 'frequency': 2,
+                          'positions': [(0, 6), (40, 46)]}, matching.to_dict())
+        self.assertEqual(matching.to_dict(), dict(**matching))
+
+
+if __name__ == '__main__':
+    unittest.main()
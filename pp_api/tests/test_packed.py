@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from pp_api.packed import (
+    StringIndex, StringTable, read_packed, write_packed
+)
+
+
+class TestStringTable(unittest.TestCase):
+    def test_sequence(self):
+        strings = ['', 'a', 'ab', 'Ö', 'zz']
+        table = StringTable.from_strings(strings)
+        self.assertEqual(strings, list(table))
+        self.assertEqual('zz', table[-1])
+        with self.assertRaises(IndexError):
+            table[5]
+
+    def test_index(self):
+        strings = ['http://x/c', 'http://x/a', 'http://x/ä', 'http://x/b']
+        table = StringTable.from_strings(strings)
+        index = StringIndex.build(table)
+        for i, string in enumerate(strings):
+            self.assertEqual(i, index[string])
+        self.assertIsNone(index.get('http://x/'))
+        self.assertEqual(-1, index.get('http://x/z', -1))
+        self.assertNotIn('http://x/bb', index)
+        np.testing.assert_array_equal(
+            [2, -1, 0], index.get_many(['http://x/ä', 'http://x/z', 'http://x/c']))
+
+    def test_index_hash_collision(self):
+        strings = ['a', 'b', 'c']
+        index = StringIndex(strings, np.array([7, 7, 9], dtype=np.uint64),
+                            np.array([1, 0, 2], dtype=np.int64))
+        with mock.patch('pp_api.packed.string_hash', lambda x: 9 if x == 'c' else 7):
+            self.assertEqual(0, index.get('a'))
+            self.assertEqual(1, index.get('b'))
+            np.testing.assert_array_equal([0, 1, 2, -1],
+                                          index.get_many(['a', 'b', 'c', 'd']))
+
+
+class TestPacked(unittest.TestCase):
+    def test_round_trip(self):
+        arrays = {
+            'ids': np.array([3, 1, 2], dtype=np.int32),
+            'matrix': np.arange(6, dtype=np.float64).reshape(2, 3),
+            'empty': np.zeros(0, dtype=np.int64),
+            'labels': ['Wien', 'Österreich', ''],
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'data.pack'
+            write_packed(path, arrays, meta={'pid': 'geo'})
+            for mmap in (True, False):
+                loaded, meta = read_packed(path, mmap=mmap)
+                self.assertEqual({'pid': 'geo'}, meta)
+                for name in ('ids', 'matrix', 'empty'):
+                    self.assertEqual(arrays[name].dtype, loaded[name].dtype)
+                    np.testing.assert_array_equal(arrays[name], loaded[name])
+                self.assertEqual(0, loaded['matrix'].ctypes.data % 8)
+                self.assertFalse(loaded['ids'].flags.writeable)
+                self.assertEqual(arrays['labels'], list(loaded['labels']))
+                del loaded
+
+    def test_not_packed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'data.npz'
+            path.write_bytes(b'PK\x03\x04')
+            with self.assertRaises(ValueError):
+                read_packed(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
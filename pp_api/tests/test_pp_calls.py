@@ -0,0 +1,197 @@
+"""
+Tests of PoolParty against a fake session, without a server.
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from pp_api.cache import LRUCache
+from pp_api.pp_calls import PoolParty
+from pp_api.tests.fake_session import FakeResponse, FakeSession
+
+
+CONCEPT_FREQS = ('GET', '/PoolParty/api/corpusmanagement/geo/results/concepts')
+CONCEPTS = ('GET', '/PoolParty/api/thesaurus/geo/concepts')
+EXTRACT = ('POST', '/extractor/api/extract')
+
+
+def poolparty(handlers, cache=None):
+    session = FakeSession(handlers)
+    return PoolParty('http://pp', auth_data=('u', 'p'), session=session,
+                     cache=cache), session
+
+
+def paged(n_results, page_size=20, delays=None):
+    """
+    Handler serving `n_results` numbers in pages from "startIndex" on,
+    with delays[page] seconds of latency.
+    """
+    def handler(params, data):
+        start = params['startIndex']
+        if delays:
+            time.sleep(delays.get(start // page_size, 0))
+        return list(range(start, min(start + page_size, n_results)))
+    return handler
+
+
+class TestIterPages(unittest.TestCase):
+    def start_indexes(self, session):
+        return sorted(params['startIndex'] for _, _, params, _ in session.calls)
+
+    def test_exact_multiple_of_page_size(self):
+        for stop_on_short_page in (False, True):
+            pp, session = poolparty({CONCEPT_FREQS: paged(60)})
+            pages = list(pp._iter_pages(CONCEPT_FREQS[1], {'corpusId': 'c'},
+                                        window=3,
+                                        stop_on_short_page=stop_on_short_page))
+            self.assertEqual([list(range(0, 20)), list(range(20, 40)),
+                              list(range(40, 60))], pages)
+            # The empty page ends paging; besides it, at most the rest of
+            # the window (2 pages) was requested
+            self.assertEqual([0, 20, 40, 60, 80, 100][:len(session.calls)],
+                             self.start_indexes(session))
+            self.assertLessEqual(len(session.calls), 4 + 2)
+
+    def test_short_page(self):
+        pp, session = poolparty({CONCEPT_FREQS: paged(45)})
+        results = list(pp._iter_paginated(CONCEPT_FREQS[1], {'startIndex': 0},
+                                          window=1, stop_on_short_page=True))
+        self.assertEqual(list(range(45)), results)
+        self.assertEqual([0, 20, 40], self.start_indexes(session))
+
+    def test_empty_first_page(self):
+        pp, session = poolparty({CONCEPT_FREQS: paged(0)})
+        self.assertEqual([], pp.get_cpt_corpus_freqs('c', 'geo', window=4))
+        self.assertLessEqual(len(session.calls), 4)
+
+    def test_order_and_window(self):
+        # Earlier pages are slower, so they arrive last
+        delays = {0: 0.05, 1: 0.03, 2: 0.01}
+        pp, session = poolparty({CONCEPT_FREQS: paged(70, delays=delays)})
+        page_iter = pp.iter_cpt_corpus_freqs('c', 'geo', window=2, pages=True)
+        self.assertEqual(list(range(0, 20)), next(page_iter))
+        # Nothing is requested beyond the window of pages not yet consumed
+        self.assertLessEqual(len(session.calls), 2)
+        self.assertEqual(list(range(20, 70)), [x for page in page_iter for x in page])
+
+
+class TestExtractMany(unittest.TestCase):
+    def setUp(self):
+        def extract(params, body):
+            text = body['file'].decode('utf8')
+            if text == 'fail':
+                return FakeResponse({'errorMessage': 'bad text'}, status_code=400,
+                                    method='POST', url=EXTRACT[1])
+            # Later texts are answered first
+            time.sleep(0.01 / (1 + len(text)))
+            return {'text': text, 'projectId': body['projectId'],
+                    'language': body['language']}
+
+        self.pp, self.session = poolparty({EXTRACT: extract})
+        self.texts = ['t' * i for i in range(1, 12)]
+
+    def test_results_in_input_order(self):
+        responses = self.pp.extract_many(self.texts, 'geo', lang='de',
+                                         max_workers=4)
+        self.assertEqual([{'text': text, 'projectId': 'geo', 'language': 'de'}
+                          for text in self.texts],
+                         [r.json() for r in responses])
+        self.assertEqual(len(self.texts), len(self.session.calls))
+
+    def test_failures_in_place(self):
+        texts = self.texts[:3] + ['fail'] + self.texts[3:]
+        responses = self.pp.extract_many(texts, 'geo', max_workers=3)
+        self.assertIsInstance(responses[3], Exception)
+        self.assertIn('bad text', str(responses[3]))
+        self.assertEqual([r.json()['text'] for r in responses[:3] + responses[4:]],
+                         self.texts)
+        with self.assertRaises(Exception):
+            self.pp.extract_many(texts, 'geo', max_workers=3,
+                                 return_exceptions=False)
+
+
+
+class TestExtractFromBytes(unittest.TestCase):
+    def setUp(self):
+        self.pp, self.session = poolparty({EXTRACT: lambda params, body: {}})
+
+    def test_upload(self):
+        content = 'Wien und Graz'.encode('utf8')
+        self.pp.extract_from_bytes(content, 'geo', lang='de', filename='a.txt')
+        _, _, _, body = self.session.calls[-1]
+        self.assertEqual(content, body['file'])
+        self.assertEqual(('geo', 'de'), (body['projectId'], body['language']))
+        self.assertEqual({'file': ('a.txt', content)}, self.session.kwargs[-1]['files'])
+        self.pp.extract_from_bytes(content, 'geo', force_json=True)
+        _, _, _, body = self.session.calls[-1]
+        self.assertEqual(content, body['text'])
+        self.assertNotIn('file', body)
+        self.assertIsNone(self.session.kwargs[-1]['files'])
+        # extract() sends the encoded text the same way
+        self.pp.extract('Wien und Graz', 'geo')
+        self.assertEqual(content, self.session.calls[-1][3]['file'])
+
+    def test_timeout(self):
+        self.assertEqual((3.05, 81), self.pp.get_extract_timeout(0))
+        self.assertEqual((3.05, 162), self.pp.get_extract_timeout(1024 * 1024))
+        self.assertEqual((3.05, 54), self.pp.get_extract_timeout(1024 * 1024, 1))
+        self.pp.extract_from_bytes(b'x' * (2 * 1024 * 1024), 'geo')
+        self.assertEqual((3.05, 243), self.session.kwargs[-1]['timeout'])
+        self.pp.timeout = 10
+        self.pp.extract_from_bytes(b'x' * (2 * 1024 * 1024), 'geo')
+        self.assertEqual(10, self.session.kwargs[-1]['timeout'])
+
+    def test_extract_from_file(self):
+        content = 'Wien\nGraz'.encode('utf8')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cities.txt')
+            with open(path, 'wb') as f:
+                f.write(content)
+            with mock.patch.object(self.pp, 'extract_from_bytes',
+                                   wraps=self.pp.extract_from_bytes) as from_bytes:
+                self.pp.extract_from_file(path, 'geo', mb_time_factor=2)
+                self.pp.extract_from_file(open(path, 'rb'), 'geo')
+        self.assertEqual(2, from_bytes.call_count)
+        self.assertEqual((content, 'geo'), from_bytes.call_args_list[0][0])
+        self.assertEqual(2, from_bytes.call_args_list[0][1]['mb_time_factor'])
+        self.assertEqual([{'file': ('cities.txt', content)}] * 2,
+                         [kwargs['files'] for kwargs in self.session.kwargs])
+        self.assertEqual((3.05, 54), self.session.kwargs[0]['timeout'])
+
+
+
+class TestCachedCalls(unittest.TestCase):
+    def setUp(self):
+        def concepts(params, data):
+            return [{'uri': uri, 'prefLabel': uri.rsplit('/', 1)[-1].title(),
+                     'broaders': []} for uri in params['concepts']]
+
+        self.pp, self.session = poolparty({CONCEPTS: concepts}, cache=LRUCache())
+        self.uris = ['http://x/vienna', 'http://x/graz']
+
+    def test_results_are_copies(self):
+        labels = self.pp.get_pref_labels(self.uris, 'geo')
+        labels.append('Linz')
+        info = self.pp.get_cpts_info(self.uris, 'geo')
+        info[0]['broaders'].append('http://x/austria')
+        self.assertEqual(['Vienna', 'Graz'], self.pp.get_pref_labels(self.uris, 'geo'))
+        self.assertEqual([], self.pp.get_cpts_info(self.uris, 'geo')[0]['broaders'])
+        self.assertEqual(2, len(self.session.calls))
+
+    def test_generator_of_uris(self):
+        self.assertEqual(['Vienna', 'Graz'],
+                         self.pp.get_pref_labels((uri for uri in self.uris), 'geo'))
+        self.assertEqual(self.uris,
+                         [cpt['uri'] for cpt in
+                          self.pp.get_cpts_info(iter(self.uris), 'geo')])
+        self.assertEqual([tuple(self.uris)] * 2,
+                         [tuple(params['concepts']) for _, _, params, _ in self.session.calls])
+        # Cached under the same key as the list
+        self.pp.get_pref_labels(self.uris, 'geo')
+        self.assertEqual(2, len(self.session.calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
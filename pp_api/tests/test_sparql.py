@@ -0,0 +1,287 @@
+import json
+import re
+import threading
+import unittest
+
+import numpy as np
+import rdflib
+
+from pp_api.cache import LRUCache
+from pp_api.tests.fake_session import FakeResponse, FakeSession
+from pp_api.sparql_calls import (
+    ShardedExecutor, SparqlClient, get_corpus_zscores, normalize_query,
+    parse_sparql_stream, query_form, rows_to_arrays
+)
+
+
+def chunked(data, size=7):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+class TestParseSparqlStream(unittest.TestCase):
+    expected = [
+        ('http://x/1', 'http://x/2', '2.5'),
+        ('http://x/2', 'http://x/3', None),
+        ('http://x/3', 'http://x/1', '0.5'),
+    ]
+
+    def test_json(self):
+        results = {
+            'head': {'vars': ['cpt1', 'score', 'cpt2']},
+            'results': {'bindings': [
+                {'cpt1': {'type': 'uri', 'value': a},
+                 'cpt2': {'type': 'uri', 'value': b},
+                 **({'score': {'type': 'literal', 'value': s}} if s else {})}
+                for a, b, s in self.expected
+            ]}
+        }
+        data = json.dumps(results, indent=1).encode('utf-8')
+        rows = parse_sparql_stream(chunked(data), format='json',
+                                   columns=('cpt1', 'cpt2', 'score'))
+        self.assertEqual(self.expected, list(rows))
+
+    def test_json_results_before_head(self):
+        results = {
+            'results': {'bindings': [
+                {'cpt1': {'type': 'uri', 'value': a},
+                 'cpt2': {'type': 'uri', 'value': b},
+                 **({'score': {'type': 'literal', 'value': s}} if s else {})}
+                for a, b, s in self.expected
+            ]},
+            'head': {'vars': ['cpt1', 'cpt2', 'score']},
+        }
+        data = json.dumps(results).encode('utf-8')
+        rows = parse_sparql_stream(chunked(data), format='json')
+        self.assertEqual(self.expected, list(rows))
+        del results['head']
+        with self.assertRaises(ValueError):
+            list(parse_sparql_stream(chunked(json.dumps(results).encode('utf-8')),
+                                     format='json'))
+
+    def test_csv(self):
+        data = ('cpt1,cpt2,score\r\n'
+                + ''.join('{},{},{}\r\n'.format(a, b, s or '')
+                          for a, b, s in self.expected)).encode('utf-8')
+        rows = parse_sparql_stream(chunked(data), format='csv')
+        self.assertEqual(self.expected, list(rows))
+
+    def test_csv_quoted_newline_and_utf8(self):
+        data = 'name,score\n"Wien,\nÖsterreich",1\n'.encode('utf-8')
+        rows = parse_sparql_stream(chunked(data, size=3), format='csv')
+        self.assertEqual([('Wien,\nÖsterreich', '1')], list(rows))
+
+    def test_tsv(self):
+        data = ('?cpt1\t?cpt2\t?score\n'
+                '<http://x/1>\t<http://x/2>\t2.5\n'
+                '<http://x/2>\t<http://x/3>\t\n'
+                '<http://x/3>\t<http://x/1>\t"0.5"^^<http://www.w3.org/2001/XMLSchema#double>\n'
+                ).encode('utf-8')
+        rows = parse_sparql_stream(chunked(data), format='tsv')
+        self.assertEqual(self.expected, list(rows))
+
+    def test_rows_to_arrays(self):
+        rows = [(a, b, s or 'nan') for a, b, s in self.expected]
+        arrays, uris = rows_to_arrays(rows, ('cpt1', 'cpt2', 'score'),
+                                      uri_columns=('cpt1', 'cpt2'),
+                                      float_columns=('score',))
+        self.assertEqual(['http://x/1', 'http://x/2', 'http://x/3'], uris)
+        np.testing.assert_array_equal([0, 1, 2], arrays['cpt1'])
+        np.testing.assert_array_equal([1, 2, 0], arrays['cpt2'])
+        np.testing.assert_array_equal([2.5, np.nan, 0.5], arrays['score'])
+
+
+SPARQL = 'http://sparql/sparql'
+
+
+def sparql_session(content):
+    """
+    Fake session answering the queries at SPARQL with `content`, bytes or
+    function(params) returning them.
+    """
+    def query(params, body):
+        return FakeResponse(content=content(params) if callable(content) else content)
+
+    return FakeSession({('GET', '/sparql'): query})
+
+
+class TestSparqlClient(unittest.TestCase):
+    def test_normalize_query(self):
+        self.assertEqual(
+            'select * where { ?s <http://x/a b> "two  spaces" }',
+            normalize_query('select *\n  where {\n\t?s <http://x/a b>   "two  spaces" }\n'))
+
+    def test_select_is_cached(self):
+        session = sparql_session(b'cpt1,score\nhttp://x/1,2.5\n')
+        client = SparqlClient(SPARQL, session=session, timeout=10,
+                              cache=LRUCache())
+        rows = client.select('select ?cpt1 ?score where { ?cpt1 ?p ?score }')
+        self.assertEqual([('http://x/1', '2.5')], rows)
+        again = client.select('select ?cpt1 ?score\n  where {\n ?cpt1 ?p ?score }',
+                              timeout=3)
+        self.assertEqual(rows, again)
+        self.assertEqual([('GET', '/sparql', {'query': 'select ?cpt1 ?score where { ?cpt1 ?p ?score }'},
+                           None)], session.calls)
+        self.assertEqual(('text/csv', 10), (session.kwargs[0]['headers']['Accept'],
+                                            session.kwargs[0]['timeout']))
+        client.invalidate()
+        client.select('select ?cpt1 ?score where { ?cpt1 ?p ?score }', timeout=3)
+        self.assertEqual(3, session.kwargs[-1]['timeout'])
+
+    def test_query_returns_terms(self):
+        session = sparql_session(json.dumps({
+            'head': {'vars': ['s', 'label']},
+            'results': {'bindings': [{
+                's': {'type': 'uri', 'value': 'http://x/1'},
+                'label': {'type': 'literal', 'value': 'Wien', 'xml:lang': 'de'},
+            }]}
+        }).encode('utf-8'))
+        client = SparqlClient(SPARQL, session=session)
+        self.assertEqual(
+            [(rdflib.URIRef('http://x/1'), rdflib.Literal('Wien', lang='de'))],
+            client.query('select ?s ?label where { ?s ?p ?label }'))
+
+    def test_select_only(self):
+        self.assertEqual('SELECT', query_form(
+            '# scores\nPREFIX ppcm: <http://x/ppcm#>\nselect * where { ?s ?p ?o }'))
+        self.assertEqual('ASK', query_form('BASE <http://x/> ask { ?s ?p ?o }'))
+        self.assertIsNone(query_form('WITH <http://x/g> DELETE { } WHERE { }'))
+        client = SparqlClient(SPARQL, session=sparql_session(b''))
+        with self.assertRaisesRegex(ValueError, 'query_sparql_endpoint'):
+            client.query('construct { ?s ?p ?o } where { ?s ?p ?o }')
+        self.assertEqual([], client.session.calls)
+
+
+class FakeShardClient:
+    """
+    `SparqlClient` answering hash shards with the hash buckets of their
+    filter, and offset shards with the numbers of their page.
+    """
+
+    def __init__(self, failures=None, n_rows=0):
+        """
+        :param failures: dict text in the query -> number of attempts of
+            the matching queries that fail
+        :param n_rows: number of rows of the offset queries
+        """
+        self.failures = failures or {}
+        self.n_rows = n_rows
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def select(self, query, **kwargs):
+        with self.lock:
+            attempt = self.attempts[query] = self.attempts.get(query, 0) + 1
+        for text, n_failures in self.failures.items():
+            if text in query and attempt <= n_failures:
+                raise IOError('shard down')
+        match = re.search(r'LIMIT (\d+) OFFSET (\d+)', query)
+        if match:
+            limit, offset = map(int, match.groups())
+            return [(i,) for i in range(offset, min(offset + limit, self.n_rows))]
+        return [(bucket,) for bucket in re.findall(r'"([0-9a-f]+)"', query)]
+
+
+class TestShardedExecutor(unittest.TestCase):
+    def test_hash_shards_cover_all_buckets_once(self):
+        executor = ShardedExecutor(client=None, n_shards=40)
+        queries = executor.hash_shard_queries(
+            'select ?s where { ?s ?p ?o {shard_filter} }', 's')
+        self.assertEqual(40, len(queries))
+        buckets = []
+        for query in queries:
+            self.assertIn('MD5(STR(?s)), 1, 2', query)
+            buckets += re.findall(r'"([0-9a-f]{2})"', query)
+        self.assertEqual(sorted('{:02x}'.format(b) for b in range(256)),
+                         sorted(buckets))
+
+    def test_failed_shard_is_retried(self):
+        client = FakeShardClient(failures={'"0"': 2})
+        executor = ShardedExecutor(client, n_shards=4, retries=2, backoff=0)
+        rows = executor.select('select ?s where { ?s ?p ?o }', shard_var='s')
+        self.assertEqual(sorted('{:x}'.format(b) for b in range(16)),
+                         sorted(bucket for bucket, in rows))
+        # The shard of bucket 0 was asked three times, the others once
+        attempts = sorted(client.attempts.values())
+        self.assertEqual([1, 1, 1, 3], attempts)
+
+    def test_failing_shard_raises(self):
+        client = FakeShardClient(failures={'"0"': 3})
+        executor = ShardedExecutor(client, n_shards=4, retries=2, backoff=0)
+        with self.assertRaisesRegex(IOError, 'shard down'):
+            executor.select('select ?s where { ?s ?p ?o }', shard_var='s')
+        self.assertEqual(3, max(client.attempts.values()))
+
+    def test_offset_pages(self):
+        client = FakeShardClient(n_rows=25)
+        executor = ShardedExecutor(client, mode='offset', page_size=10,
+                                   max_workers=2, backoff=0)
+        rows = executor.select('select ?s where { ?s ?p ?o {shard_filter} }',
+                               columns=('s',))
+        self.assertEqual([(i,) for i in range(25)], rows)
+        for query in client.attempts:
+            self.assertIn('where { ?s ?p ?o  }\nORDER BY ?s LIMIT 10 OFFSET ', query)
+        offsets = sorted(int(q.rsplit(' ', 1)[1]) for q in client.attempts)
+        # The short page ends paging; at most one more page was prefetched
+        self.assertEqual([0, 10, 20, 30][:len(offsets)], offsets)
+        self.assertLessEqual(3, len(offsets))
+        with self.assertRaises(ValueError):
+            executor.select('select ?s where { ?s ?p ?o }')
+
+    def test_filter_without_placeholder(self):
+        query = ShardedExecutor._with_filter('select ?s where { ?s ?p ?o }',
+                                             'FILTER (?s != <http://x/1>)')
+        self.assertEqual('select ?s where { ?s ?p ?o FILTER (?s != <http://x/1>)\n}',
+                         query)
+
+
+
+class TestCorpusZscores(unittest.TestCase):
+    zscores = {('a', 'b'): 4, ('b', 'c'): 16, ('c', 'a'): 2,
+               # With a term that is not asked for
+               ('a', 'x'): 64}
+
+    def cooccurrences(self, params):
+        """
+        CSV results of the cooccurrence query, for the uris of its VALUES
+        blocks.
+        """
+        blocks = dict(re.findall(r'VALUES \?(uri[12]) \{([^}]*)\}', params['query']))
+        uris1, uris2 = (set(re.findall(r'<http://x/(\w+)>', blocks.get(var, '')))
+                        for var in ('uri1', 'uri2'))
+        rows = ['uri1,uri2,score']
+        for (a, b), score in self.zscores.items():
+            for uri1, uri2 in ((a, b), (b, a)):
+                if uri1 in uris1 and (not uris2 or uri2 in uris2):
+                    rows.append('http://x/{},http://x/{},{}'.format(uri1, uri2, score))
+        return '\n'.join(rows).encode('utf-8')
+
+    def test_chunks(self):
+        uris = ['http://x/' + t for t in 'abcde']
+        for chunk_size in (2, 10):
+            session = sparql_session(self.cooccurrences)
+            similarity = get_corpus_zscores(uris, 'cooc-graph', session=session,
+                                            sparql_endpoint=SPARQL,
+                                            chunk_size=chunk_size, max_workers=2)
+            self.assertEqual(3 if chunk_size == 2 else 1, len(session.calls))
+            for _, _, params, _ in session.calls:
+                self.assertEqual('cooc-graph', params['default-graph-uri'])
+            # log2 of the zscores, over the largest one among the terms
+            for (a, b), score in ((('a', 'b'), 0.5), (('b', 'c'), 1.),
+                                  (('c', 'a'), 0.25)):
+                a, b = 'http://x/' + a, 'http://x/' + b
+                self.assertAlmostEqual(score, similarity(a, b), msg=chunk_size)
+                self.assertAlmostEqual(score, similarity(b, a), msg=chunk_size)
+            self.assertEqual(1, similarity('http://x/d', 'http://x/d'))
+            self.assertEqual(0, similarity('http://x/d', 'http://x/e'))
+            self.assertEqual(0, similarity('http://x/a', 'http://x/x'))
+
+    def test_no_cooccurrences(self):
+        similarity = get_corpus_zscores(['http://x/d', 'http://x/e'], 'cooc-graph',
+                                        sparql_endpoint=SPARQL,
+                                        session=sparql_session(self.cooccurrences))
+        self.assertEqual(0, similarity('http://x/d', 'http://x/e'))
+        self.assertEqual(1, similarity('http://x/e', 'http://x/e'))
+
+
+if __name__ == '__main__':
+    unittest.main()
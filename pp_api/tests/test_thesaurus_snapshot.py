@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pp_api.thesaurus_snapshot import ThesaurusSnapshot
+
+
+TTL = """
+@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+@prefix dcterms: <http://purl.org/dc/terms/> .
+@prefix t: <http://localhost:8082/test/> .
+
+t:scheme a skos:ConceptScheme; dcterms:title "Geography"@en;
+    skos:hasTopConcept t:europe .
+t:europe a skos:Concept; skos:topConceptOf t:scheme;
+    skos:prefLabel "Europe"@en, "Europa"@de;
+    skos:narrower t:austria .
+t:austria a skos:Concept; skos:prefLabel "Austria"@en, "Österreich"@de;
+    skos:altLabel "Republic of Austria"@en;
+    skos:broader t:europe .
+t:vienna a skos:Concept; skos:prefLabel "Vienna"@en, "Wien"@de;
+    skos:altLabel "Vindobona"@en;
+    skos:broader t:austria .
+t:vorarlberg a skos:Concept; skos:prefLabel "Vorarlberg"@en;
+    skos:broader t:austria .
+"""
+
+T = 'http://localhost:8082/test/'
+
+
+class TestThesaurusSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = ThesaurusSnapshot.from_export(TTL, pid='geo',
+                                                      format='turtle')
+
+    def check_queries(self, snapshot):
+        self.assertEqual(4, len(snapshot))
+        self.assertIn(T + 'vienna', snapshot)
+        self.assertNotIn(T + 'paris', snapshot)
+        self.assertEqual([T + 'austria'], snapshot.get_broaders(T + 'vienna'))
+        self.assertEqual([T + 'austria', T + 'europe'],
+                         snapshot.get_broaders(T + 'vienna', transitive=True))
+        self.assertEqual([T + 'vienna', T + 'vorarlberg'],
+                         sorted(snapshot.get_narrowers(T + 'europe', transitive=True)[1:]))
+        self.assertEqual(['Wien', 'Vorarlberg'],
+                         snapshot.get_pref_labels([T + 'vienna', T + 'vorarlberg'],
+                                                  lang='de'))
+        self.assertEqual(
+            [(T + 'scheme', 'Geography'), (T + 'europe', 'Europe'),
+             (T + 'austria', 'Austria'), (T + 'vienna', 'Vienna')],
+            snapshot.get_cpt_path(T + 'vienna'))
+        self.assertEqual([('Vienna', T + 'vienna'), ('Vorarlberg', T + 'vorarlberg')],
+                         snapshot.get_autocomplete('Vi') + snapshot.get_autocomplete('vor'))
+        self.assertEqual([('Austria', T + 'austria')],
+                         snapshot.get_autocomplete('republic'))
+        self.assertEqual([('Österreich', T + 'austria')],
+                         snapshot.get_autocomplete('öst', lang='de'))
+        with self.assertRaises(KeyError):
+            snapshot.get_broaders(T + 'paris')
+
+    def test_queries(self):
+        self.check_queries(self.snapshot)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'snapshot.pack'
+            self.snapshot.save(path)
+            loaded = ThesaurusSnapshot.load(path)
+            self.assertEqual('geo', loaded.pid)
+            self.check_queries(loaded)
+            del loaded
+
+    def test_invalidate_uris(self):
+        self.snapshot.invalidate_uris('other', [T + 'vienna'])
+        self.assertEqual(set(), self.snapshot.stale_uris)
+        self.snapshot.invalidate_uris('geo', [T + 'vienna'])
+        self.assertEqual({T + 'vienna'}, self.snapshot.stale_uris)
+
+
+if __name__ == '__main__':
+    unittest.main()
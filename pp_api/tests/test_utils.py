@@ -0,0 +1,173 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from pp_api import sparql_calls
+from pp_api.pp_calls import PoolParty
+from pp_api.utils import TransportConfig, get_session, map_bounded
+
+
+class TestMapBounded(unittest.TestCase):
+    def test_results_in_input_order(self):
+        def slow_for_small(x):
+            time.sleep(0.002 * (10 - x))
+            return x * x
+
+        self.assertEqual([x * x for x in range(10)],
+                         list(map_bounded(slow_for_small, range(10), max_workers=5)))
+
+    def test_in_flight_bound(self):
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+        pulled = []
+
+        def items():
+            for x in range(20):
+                pulled.append(x)
+                yield x
+
+        def work(x):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.005)
+            with lock:
+                running[0] -= 1
+            return x
+
+        results = map_bounded(work, items(), max_workers=8, max_in_flight=3)
+        self.assertEqual(0, next(results))
+        # The input is consumed lazily
+        self.assertLessEqual(len(pulled), 3)
+        self.assertEqual(list(range(1, 20)), list(results))
+        self.assertLessEqual(max_running[0], 3)
+
+    def test_exceptions_in_place(self):
+        def work(x):
+            if x % 3 == 1:
+                raise ValueError(x)
+            return x
+
+        results = list(map_bounded(work, range(6), max_workers=2))
+        self.assertEqual([0, 2, 3, 5], [results[i] for i in (0, 2, 3, 5)])
+        for i in (1, 4):
+            self.assertIsInstance(results[i], ValueError)
+            self.assertEqual((i,), results[i].args)
+
+    def test_exceptions_raised(self):
+        started = []
+
+        def work(x):
+            started.append(x)
+            if x == 2:
+                raise ValueError(x)
+            return x
+
+        results = map_bounded(work, range(100), max_workers=2,
+                              return_exceptions=False)
+        self.assertEqual([0, 1], [next(results), next(results)])
+        with self.assertRaises(ValueError):
+            next(results)
+        # The remaining items are not processed
+        self.assertLess(len(started), 10)
+
+    def test_early_close_cancels_queued(self):
+        started = []
+
+        def work(x):
+            started.append(x)
+            time.sleep(0.01)
+            return x
+
+        results = map_bounded(work, range(100), max_workers=1, max_in_flight=4)
+        self.assertEqual(0, next(results))
+        results.close()
+        self.assertLessEqual(len(started), 5)
+
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.client_address,
+                                     dict(self.headers)))
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTransportConfig(unittest.TestCase):
+    def test_shared_adapter(self):
+        transport = TransportConfig(pool_maxsize=5, pool_block=True,
+                                    max_retries=2)
+        sessions = [transport.new_session(('u', 'p')),
+                    get_session(requests.session(), ('v', 'q'), transport)]
+        for session in sessions:
+            for prefix in ('http://', 'https://'):
+                self.assertIs(transport.adapter, session.get_adapter(prefix + 'pp/x'))
+        self.assertEqual([('u', 'p'), ('v', 'q')], [s.auth for s in sessions])
+        self.assertEqual(5, transport.adapter._pool_maxsize)
+        self.assertTrue(transport.adapter._pool_block)
+        self.assertEqual(2, transport.adapter.max_retries.total)
+        self.assertEqual('gzip, deflate', sessions[0].headers['Accept-Encoding'])
+        self.assertEqual('keep-alive', sessions[0].headers['Connection'])
+
+    def test_retries_keep_the_pools(self):
+        transport = TransportConfig(pool_maxsize=5, pool_block=True)
+        pp = PoolParty('http://pp', auth_data=('u', 'p'), max_retries=3,
+                       transport=transport)
+        adapter = pp.session.get_adapter('http://pp/PoolParty/api/projects')
+        self.assertIsNot(transport.adapter, adapter)
+        self.assertEqual(3, adapter.max_retries.total)
+        self.assertEqual(5, adapter._pool_maxsize)
+        self.assertTrue(adapter._pool_block)
+        self.assertIs(transport.adapter.poolmanager, adapter.poolmanager)
+        # Other hosts keep the retry policy of the transport
+        self.assertIs(transport.adapter, pp.session.get_adapter('http://gs/x'))
+        self.assertEqual(0, transport.adapter.max_retries.total)
+
+    def test_sparql_session(self):
+        session = requests.session()
+        self.assertIs(session, sparql_calls.get_sparql_session(session))
+        default = sparql_calls.get_sparql_session()
+        self.assertIs(default, sparql_calls.get_sparql_session())
+        self.assertIsInstance(default.get_adapter('http://sparql'), requests.adapters.HTTPAdapter)
+        self.assertEqual('keep-alive', default.headers['Connection'])
+
+    def test_keep_alive_and_compression(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+        server.requests = []
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        for keep_alive, compression in ((True, True), (False, False)):
+            server.requests.clear()
+            session = TransportConfig(keep_alive=keep_alive,
+                                      compression=compression).new_session()
+            with session:
+                for _ in range(3):
+                    self.assertEqual('ok', session.get(url, timeout=5).text)
+            clients = {address for address, _ in server.requests}
+            # One connection for all requests, or one per request
+            self.assertEqual(1 if keep_alive else 3, len(clients))
+            headers = server.requests[0][1]
+            self.assertEqual('gzip, deflate' if compression else 'identity',
+                             headers['Accept-Encoding'])
+            self.assertEqual('keep-alive' if keep_alive else 'close',
+                             headers['Connection'])
+
+
+if __name__ == '__main__':
+    unittest.main()
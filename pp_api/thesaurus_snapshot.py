@@ -0,0 +1,345 @@
+"""
+Read-only snapshot of a thesaurus, answering hierarchy, label and
+autocomplete queries locally instead of with PoolParty API calls.
+
+Concepts are numbered by the order of their uris; the hierarchy is kept in
+CSR arrays (see `pp_api.cooccurrence`) and, once saved, the strings in
+`pp_api.packed.StringTable`s, so a snapshot file can be memory-mapped and
+shared between processes.
+"""
+import bisect
+from collections import defaultdict
+
+import numpy as np
+import rdflib
+from rdflib.namespace import RDF, SKOS, DCTERMS
+
+from pp_api.packed import read_packed, write_packed
+
+
+def _csr(pairs, n):
+    """
+    :param pairs: iterable of (row, col) ids
+    :param n: number of rows
+    :return: (indptr, indices) with the columns of every row sorted
+    """
+    rows = defaultdict(set)
+    for row, col in pairs:
+        rows[row].add(col)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indices = []
+    for i in range(n):
+        cols = sorted(rows.get(i, ()))
+        indices.extend(cols)
+        indptr[i + 1] = len(indices)
+    return indptr, np.array(indices, dtype=np.int32)
+
+
+class ThesaurusSnapshot:
+    """
+    Snapshot of the concepts, hierarchy and labels of a project.
+
+        snapshot = ThesaurusSnapshot.from_pp(pp, pid)
+        snapshot.get_cpt_path(uri)
+        snapshot.get_autocomplete('vien', lang='en')
+        snapshot.save('thesaurus.pack')   # later: ThesaurusSnapshot.load(...)
+
+    The methods mirror the corresponding `PoolParty` calls. Labels without
+    language tag are stored under the language ''.
+    """
+
+    ARRAYS = ('broader_indptr', 'broader_indices',
+              'narrower_indptr', 'narrower_indices',
+              'scheme_indptr', 'scheme_indices')
+
+    def __init__(self, uris, arrays, scheme_uris, scheme_titles,
+                 pref_labels, label_keys, label_ids, pid=None, lang='en'):
+        """
+        Use `from_graph()`, `from_export()`, `from_pp()` or `load()`.
+
+        :param uris: sorted sequence of concept uris, indexed by id
+        :param arrays: dict with the CSR arrays of `ARRAYS`
+        :param scheme_uris: sequence of the concept scheme uris
+        :param scheme_titles: sequence of their titles
+        :param pref_labels: dict lang -> sequence of the prefLabel of every
+            concept ('' if none)
+        :param label_keys: dict lang -> sorted sequence of lowercased labels
+        :param label_ids: dict lang -> int array of the concepts of
+            `label_keys`
+        :param pid: id of the project
+        :param lang: default language
+        """
+        self.uris = uris
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.scheme_uris = scheme_uris
+        self.scheme_titles = scheme_titles
+        self.pref_labels = pref_labels
+        self.label_keys = label_keys
+        self.label_ids = label_ids
+        self.pid = pid
+        self.lang = lang
+        self.stale_uris = set()
+
+    @classmethod
+    def from_graph(cls, graph, pid=None, lang='en'):
+        """
+        :param graph: rdflib.Graph with the SKOS data of the project
+        """
+        uris = sorted(str(x) for x in set(graph.subjects(RDF.type, SKOS.Concept)))
+        index = {uri: i for i, uri in enumerate(uris)}
+
+        def ids(pairs):
+            for a, b in pairs:
+                a, b = index.get(str(a)), index.get(str(b))
+                if a is not None and b is not None and a != b:
+                    yield a, b
+
+        broader = set(ids(graph.subject_objects(SKOS.broader)))
+        broader |= {(b, a) for a, b in ids(graph.subject_objects(SKOS.narrower))}
+        arrays = dict()
+        arrays['broader_indptr'], arrays['broader_indices'] = _csr(broader, len(uris))
+        arrays['narrower_indptr'], arrays['narrower_indices'] = _csr(
+            ((b, a) for a, b in broader), len(uris))
+
+        schemes = set(graph.subjects(RDF.type, SKOS.ConceptScheme))
+        cpt_schemes = set()
+        for prop in (SKOS.inScheme, SKOS.topConceptOf):
+            for cpt, scheme in graph.subject_objects(prop):
+                cpt_schemes.add((str(cpt), scheme))
+        for scheme, cpt in graph.subject_objects(SKOS.hasTopConcept):
+            cpt_schemes.add((str(cpt), scheme))
+        schemes |= {scheme for _, scheme in cpt_schemes}
+        scheme_uris = sorted(str(x) for x in schemes)
+        scheme_index = {uri: i for i, uri in enumerate(scheme_uris)}
+        scheme_titles = [
+            str(graph.value(rdflib.URIRef(uri), DCTERMS.title)
+                or graph.value(rdflib.URIRef(uri), SKOS.prefLabel) or '')
+            for uri in scheme_uris
+        ]
+        arrays['scheme_indptr'], arrays['scheme_indices'] = _csr(
+            ((index[cpt], scheme_index[str(scheme)])
+             for cpt, scheme in cpt_schemes if cpt in index),
+            len(uris))
+
+        pref_labels = defaultdict(lambda: [''] * len(uris))
+        labels = defaultdict(set)  # lang -> {(lowercased label, id)}
+        for prop in (SKOS.prefLabel, SKOS.altLabel, SKOS.hiddenLabel):
+            for cpt, label in graph.subject_objects(prop):
+                i = index.get(str(cpt))
+                if i is None:
+                    continue
+                lang_ = getattr(label, 'language', None) or ''
+                labels[lang_].add((str(label).lower(), i))
+                if prop == SKOS.prefLabel:
+                    pref_labels[lang_][i] = str(label)
+        label_keys, label_ids = dict(), dict()
+        for lang_, entries in labels.items():
+            entries = sorted(entries)
+            label_keys[lang_] = [key for key, _ in entries]
+            label_ids[lang_] = np.array([i for _, i in entries], dtype=np.int32)
+        return cls(uris, arrays, scheme_uris, scheme_titles,
+                   dict(pref_labels), label_keys, label_ids, pid=pid, lang=lang)
+
+    @classmethod
+    def from_export(cls, data, pid=None, lang='en', format='n3'):
+        """
+        :param data: project export as returned by `PoolParty.export_project()`
+        :param format: rdflib format of `data`
+        """
+        graph = rdflib.Graph()
+        graph.parse(data=data, format=format)
+        return cls.from_graph(graph, pid=pid, lang=lang)
+
+    @classmethod
+    def from_pp(cls, pp, pid, lang=None):
+        """
+        Export the project `pid` and build a snapshot from it.
+        """
+        lang = pp.lang if lang is None else lang
+        return cls.from_export(pp.export_project(pid), pid=pid, lang=lang)
+
+    def __len__(self):
+        return len(self.uris)
+
+    def __contains__(self, uri):
+        return self.get_id(uri) is not None
+
+    def get_id(self, uri):
+        """
+        :return: id of the concept `uri`, None if unknown
+        """
+        uri = str(uri)
+        i = bisect.bisect_left(self.uris, uri)
+        if i < len(self.uris) and self.uris[i] == uri:
+            return i
+        return None
+
+    def _get_id(self, uri):
+        i = self.get_id(uri)
+        if i is None:
+            raise KeyError(uri)
+        return i
+
+    @staticmethod
+    def _neighbours(indptr, indices, i):
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def _walk(self, indptr, indices, i, transitive):
+        if not transitive:
+            return [int(x) for x in self._neighbours(indptr, indices, i)]
+        seen = {i}
+        found = []
+        stack = [i]
+        while stack:
+            for x in self._neighbours(indptr, indices, stack.pop()):
+                x = int(x)
+                if x not in seen:
+                    seen.add(x)
+                    found.append(x)
+                    stack.append(x)
+        return found
+
+    def get_broaders(self, uri, transitive=False):
+        """
+        :return: list of the uris of the broader concepts of `uri`
+        """
+        ids = self._walk(self.broader_indptr, self.broader_indices,
+                         self._get_id(uri), transitive)
+        return [self.uris[x] for x in ids]
+
+    def get_narrowers(self, uri, transitive=False):
+        """
+        :return: list of the uris of the narrower concepts of `uri`
+        """
+        ids = self._walk(self.narrower_indptr, self.narrower_indices,
+                         self._get_id(uri), transitive)
+        return [self.uris[x] for x in ids]
+
+    def _pref_label(self, i, lang):
+        labels = self.pref_labels.get(lang)
+        label = labels[i] if labels is not None else ''
+        if not label:
+            for other in self.pref_labels.values():
+                label = other[i]
+                if label:
+                    break
+        return label
+
+    def get_pref_label(self, uri, lang=None):
+        """
+        :return: prefLabel of `uri` in `lang`, or in another language if
+            there is none
+        """
+        lang = self.lang if lang is None else lang
+        return self._pref_label(self._get_id(uri), lang)
+
+    def get_pref_labels(self, uris, lang=None):
+        """
+        Like `PoolParty.get_pref_labels()`.
+
+        :return: list of prefLabels
+        """
+        lang = self.lang if lang is None else lang
+        return [self._pref_label(self._get_id(uri), lang) for uri in uris]
+
+    def get_cpt_path(self, uri, lang=None):
+        """
+        Like `PoolParty.get_cpt_path()`: one path from the concept scheme
+        through the broaders (from the top down) to the concept. Of several
+        broaders, the one with the smallest uri is followed.
+
+        :return: list: [(uri, label)] of cpt scheme and broaders
+        """
+        lang = self.lang if lang is None else lang
+        i = self._get_id(uri)
+        path = [i]
+        while True:
+            broaders = self._neighbours(self.broader_indptr,
+                                        self.broader_indices, path[-1])
+            broaders = [int(x) for x in broaders if int(x) not in path]
+            if not broaders:
+                break
+            path.append(broaders[0])
+        path.reverse()
+        schemes = self._neighbours(self.scheme_indptr, self.scheme_indices, path[0])
+        if not len(schemes):
+            schemes = self._neighbours(self.scheme_indptr, self.scheme_indices, i)
+        result = []
+        if len(schemes):
+            scheme = int(schemes[0])
+            result.append((self.scheme_uris[scheme], self.scheme_titles[scheme]))
+        result += [(self.uris[x], self._pref_label(x, lang)) for x in path]
+        return result
+
+    def get_autocomplete(self, query_str, lang=None, limit=10):
+        """
+        Like `PoolParty.get_autocomplete()`: concepts with a label (pref,
+        alt or hidden) starting with `query_str`, case-insensitively.
+
+        :return: list of up to `limit` (prefLabel, uri)
+        """
+        lang = self.lang if lang is None else lang
+        keys = self.label_keys.get(lang)
+        if keys is None:
+            return []
+        ids = self.label_ids[lang]
+        prefix = query_str.lower()
+        found = []
+        seen = set()
+        pos = bisect.bisect_left(keys, prefix)
+        while pos < len(keys) and len(found) < limit:
+            if not keys[pos].startswith(prefix):
+                break
+            i = int(ids[pos])
+            if i not in seen:
+                seen.add(i)
+                found.append((self._pref_label(i, lang), self.uris[i]))
+            pos += 1
+        return found
+
+    def invalidate_uris(self, pid, uris=None):
+        """
+        Record changes made after the snapshot was taken, e.g. by a
+        `pp_api.history.HistoryInvalidator`. A snapshot is read-only:
+        rebuild it when `stale_uris` is not empty.
+        """
+        if self.pid is not None and pid != self.pid:
+            return
+        self.stale_uris |= set(self.uris if uris is None else uris)
+
+    def save(self, path):
+        """
+        Write the snapshot to the packed file `path`, see `pp_api.packed`.
+        """
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays['uris'] = self.uris
+        arrays['scheme_uris'] = self.scheme_uris
+        arrays['scheme_titles'] = self.scheme_titles
+        langs = sorted(set(self.pref_labels) | set(self.label_keys))
+        for n, lang in enumerate(langs):
+            arrays['pref_labels.{}'.format(n)] = self.pref_labels.get(
+                lang, [''] * len(self.uris))
+            arrays['label_keys.{}'.format(n)] = self.label_keys.get(lang, [])
+            arrays['label_ids.{}'.format(n)] = np.asarray(self.label_ids.get(
+                lang, np.zeros(0, dtype=np.int32)))
+        write_packed(path, arrays,
+                     meta={'pid': self.pid, 'lang': self.lang, 'langs': langs})
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        :param path: file written by `save()`
+        :param mmap: If true, map the file into memory instead of reading
+            it, so that processes loading the same snapshot share it.
+        """
+        arrays, meta = read_packed(path, mmap=mmap)
+        pref_labels, label_keys, label_ids = dict(), dict(), dict()
+        for n, lang in enumerate(meta['langs']):
+            pref_labels[lang] = arrays['pref_labels.{}'.format(n)]
+            label_keys[lang] = arrays['label_keys.{}'.format(n)]
+            label_ids[lang] = arrays['label_ids.{}'.format(n)]
+        return cls(arrays['uris'], {name: arrays[name] for name in cls.ARRAYS},
+                   arrays['scheme_uris'], arrays['scheme_titles'],
+                   pref_labels, label_keys, label_ids,
+                   pid=meta['pid'], lang=meta['lang'])
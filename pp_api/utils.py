@@ -1,20 +1,134 @@
 import requests
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
 
 import simplejson
 
 from decouple import config
 from oauthlib.oauth2 import LegacyApplicationClient
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth2Session
+from urllib3.util import Retry
 from time import time
 
 saved_token = None
 
-def get_session(session, auth_data):
+
+class TransportConfig:
+    """
+    Connection settings to share between clients, e.g.
+
+        transport = TransportConfig(pool_maxsize=64, max_retries=3)
+        pp = PoolParty(server, transport=transport)
+        gs = GraphSearch(server, transport=transport)
+        get_pp_terms(graph, session=transport.new_session())
+
+    All sessions made by one TransportConfig use the same HTTPAdapter, so
+    they draw from one pool of keep-alive connections per host, while each
+    session keeps its own credentials.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=32, pool_block=False,
+                 max_retries=0, backoff_factor=0.3,
+                 status_forcelist=(500, 502, 503, 504),
+                 retry_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                 compression=True, keep_alive=True):
+        """
+        :param pool_connections: number of hosts to keep connection pools for
+        :param pool_maxsize: maximum number of kept connections per host;
+            set it to the number of threads making requests
+        :param pool_block: If true, wait for a free connection instead of
+            opening (and then discarding) extra ones.
+        :param max_retries: number of retries of failed requests
+        :param backoff_factor: the n-th retry waits backoff_factor * 2^(n-1)
+            seconds
+        :param status_forcelist: status codes to retry on
+        :param retry_methods: HTTP methods to retry (by default the
+            idempotent ones, which excludes POST)
+        :param compression: If true, accept compressed responses.
+        :param keep_alive: If false, close connections after every request.
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.retry_methods = retry_methods
+        self.compression = compression
+        self.keep_alive = keep_alive
+        self._adapter = None
+        self._lock = threading.Lock()
+
+    def _new_adapter(self, max_retries):
+        retries = Retry(total=max_retries,
+                        backoff_factor=self.backoff_factor,
+                        status_forcelist=self.status_forcelist,
+                        allowed_methods=self.retry_methods,
+                        raise_on_status=False)
+        return HTTPAdapter(pool_connections=self.pool_connections,
+                           pool_maxsize=self.pool_maxsize,
+                           pool_block=self.pool_block,
+                           max_retries=retries)
+
+    @property
+    def adapter(self):
+        with self._lock:
+            if self._adapter is None:
+                self._adapter = self._new_adapter(self.max_retries)
+            return self._adapter
+
+    def retry_adapter(self, max_retries):
+        """
+        Adapter with another number of retries that still draws from the
+        shared connection pools.
+
+        :param max_retries: number of retries of failed requests
+        :return: `requests.adapters.HTTPAdapter`
+        """
+        adapter = self._new_adapter(max_retries)
+        adapter.poolmanager = self.adapter.poolmanager
+        return adapter
+
+    def configure(self, session):
+        """
+        Mount the shared adapter on `session` and set its headers.
+
+        :return: `session`
+        """
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        session.headers['Accept-Encoding'] = (
+            'gzip, deflate' if self.compression else 'identity')
+        session.headers['Connection'] = (
+            'keep-alive' if self.keep_alive else 'close')
+        return session
+
+    def new_session(self, auth_data=None):
+        session = self.configure(requests.session())
+        if auth_data is not None:
+            session.auth = auth_data
+        return session
+
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        with self._lock:
+            if self._adapter is not None:
+                self._adapter.close()
+                self._adapter = None
+
+
+def get_session(session, auth_data, transport=None):
     if session is None:
         if auth_data is None:
             auth_data = get_auth_data()
         session = requests.session()
+    if transport is not None:
+        transport.configure(session)
     if auth_data is not None:
         session.auth = auth_data
     return session
@@ -77,37 +191,83 @@ def subdict(fromdict, fields, default=None,  force=False):
     return { k: fromdict.get(k, default) for k in fields if k in fromdict or force }
 
 
-def check_status_and_raise(response, logger=None, data=None, log_text=False):
+def map_bounded(func, items, max_workers=8, max_in_flight=None,
+                return_exceptions=True):
     """
-    Call the raise_for_status() method of the response, which will
-    raise an HTTPError if an error response was received.
-    But enrich it with information from our API, and also log
-    the call parameters to module_logger.
+    Apply `func` to every element of `items` in a thread pool and yield the
+    results in input order.
 
-    :param response: `requests` response object
-    :param data: dictionary of call parameters, to include in log
-    :param log_text: If true, add the content of `response.text` to the log
-    :return: None
+    At most `max_in_flight` calls are submitted at any time, so `items` may
+    be a (long) generator and the server never sees more than that many
+    concurrent requests from us.
+
+    :param func: callable taking one element of `items`
+    :param items: iterable of arguments
+    :param max_workers: size of the thread pool
+    :param max_in_flight: maximum number of submitted but not yet consumed
+        calls. Defaults to `max_workers`.
+    :param return_exceptions: If true, an exception raised by `func` is
+        yielded in place of the result and the remaining items are still
+        processed. Otherwise the exception is re-raised.
+    :return: generator of results (or exceptions)
     """
+    if max_in_flight is None:
+        max_in_flight = max_workers
+    max_in_flight = max(1, max_in_flight)
+    items = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_in_flight:
+                yield _future_result(pending.popleft(), return_exceptions)
+        while pending:
+            yield _future_result(pending.popleft(), return_exceptions)
+    finally:
+        # The consumer may stop early: do not start what is still queued
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
 
-    # Nothing to do on success
-    if response.status_code < 299:
-        return None
 
-    method = response.request.method
-    target_url = response.request.url
+def _future_result(future, return_exceptions):
+    if not return_exceptions:
+        return future.result()
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def parse_error_content(text):
+    """
+    Parse the body of an error response into a dictionary.
 
+    :param text: response body as a string
+    :return: dict
+    """
     # json() chokes on empty response text, so bypass it
-    if response.text:
-        try:
-            content = response.json()
-        except simplejson.errors.JSONDecodeError:
-            # Sometimes the error message is not json at all, but html;
-            # just wrap it for the benefit of later code
-            content = { "errorMessage": response.text }
-    else:
-        content = {}
+    if not text:
+        return {}
+    try:
+        content = simplejson.loads(text)
+    except simplejson.errors.JSONDecodeError:
+        content = None
+    if not isinstance(content, dict):
+        # Sometimes the error message is not json at all, but html;
+        # just wrap it for the benefit of later code
+        content = { "errorMessage": text }
+    return content
+
 
+def api_error_extra(content):
+    """
+    Find the error message in the parsed body of an error response.
+
+    :param content: dict as returned by `parse_error_content()`
+    :return: a string to append to the exception message, or None
+    """
     # Our JSON error messages are labelled inconsistently:
     # "errorMessage" for Extractor bad arguments?
     # "message" for add_custom_relation failure
@@ -119,23 +279,59 @@ def check_status_and_raise(response, logger=None, data=None, log_text=False):
     # response.reason seems to be already included in the exception
 
     if message:
-        extra = "API error message: {}\n".format(message)
-    else:
-        extra = None
+        return "API error message: {}\n".format(message)
+    return None
 
-    # Log the error
+
+def failed_request_log(method, target_url, data=None, text=None, extra=None):
+    """
+    Compose the log message for a failed request.
+
+    :param method: HTTP method
+    :param target_url: URL of the request
+    :param data: dictionary of call parameters
+    :param text: response text, if it should be logged
+    :param extra: error details as returned by `api_error_extra()`
+    :return: str
+    """
     logged = 'URL of the failed {} request: {}\n'.format(method, target_url)
 
     if data:
         logged += 'JSON data of the failed {} request: {}\n'.format(method, data)
 
     # GraphSearch logging includes the `text` field:
-    if log_text and getattr(response, "text"):
-        logged += 'Response text: {}'.format(response.text)
+    if text:
+        logged += 'Response text: {}'.format(text)
 
     # Add error details from json envelope, if we found any
     if extra:
         logged += extra
+    return logged
+
+
+def check_status_and_raise(response, logger=None, data=None, log_text=False):
+    """
+    Call the raise_for_status() method of the response, which will
+    raise an HTTPError if an error response was received.
+    But enrich it with information from our API, and also log
+    the call parameters to module_logger.
+
+    :param response: `requests` response object
+    :param data: dictionary of call parameters, to include in log
+    :param log_text: If true, add the content of `response.text` to the log
+    :return: None
+    """
+
+    # Nothing to do on success
+    if response.status_code < 299:
+        return None
+
+    content = parse_error_content(response.text)
+    extra = api_error_extra(content)
+    logged = failed_request_log(
+        response.request.method, response.request.url, data=data,
+        text=(response.text if log_text else None), extra=extra
+    )
 
     # Log it all
     if logger:
@@ -18,4 +18,7 @@ setup(
     license='MIT',
     dependency_links=dependencies,
     install_requires=requirements,
+    extras_require={
+        'async': ['aiohttp'],
+    },
 )